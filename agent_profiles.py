@@ -0,0 +1,291 @@
+"""
+Bulk import/export of agent profiles as JSONL, with dry-run diffs.
+
+One profile per line. Exports are the full documents; imports may be partial:
+
+    {"id": "6f1c...", "backstory_file": "profiles/backend.md"}
+    {"role": "QA Validation Agent", "goal": "Catch integration bugs before users do"}
+    {"role": "Docs Writer", "goal": "...", "backstory": "...", "allow_delegation": false}
+
+A line is matched to an existing agent by `id`, else by `role` (case
+insensitive, when exactly one agent has it); only the fields that differ are
+updated. Unmatched lines with a role become new agents. `<field>_file` keys
+load that field from a file next to the JSONL, so long backstories can live in
+Markdown instead of inline strings.
+
+Importing is a dry run by default: plan_import() compares the lines with the
+current profiles and format_change() renders per-field diffs. Applying makes
+one round-trip whatever the number of profiles: a single bulk_write on
+MongoDB, a single locked journal append on the JSON store (agent_store.py).
+
+Usage:
+    python agent_profiles.py export profiles.jsonl                 # agents.json store
+    python agent_profiles.py import profiles.jsonl                 # dry run: show diffs
+    python agent_profiles.py import profiles.jsonl --apply
+    python agent_profiles.py import profiles.jsonl --apply --mongo # MONGODB_URI, database ai_factory
+
+This module has no Streamlit dependency so scripts can import it directly.
+"""
+
+import argparse
+import difflib
+import json
+import os
+import sys
+from pathlib import Path
+from typing import IO, Any, Dict, Iterable, Iterator, List, Optional
+from uuid import uuid4
+
+FILE_SUFFIX = "_file"
+
+
+def iter_profiles(stream: IO[str], base_dir: Optional[Path] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Parse JSONL profiles one line at a time (blank and # lines skipped).
+    `<field>_file` keys are read relative to `base_dir`; without one they are an error.
+    """
+    for line_no, line in enumerate(stream, 1):
+        if not line.strip() or line.lstrip().startswith("#"):
+            continue
+        try:
+            profile = json.loads(line)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"line {line_no}: invalid JSON ({e.msg})") from None
+        if not isinstance(profile, dict):
+            raise ValueError(f"line {line_no}: expected a JSON object")
+        for key in [k for k in profile if k.endswith(FILE_SUFFIX)]:
+            if base_dir is None:
+                raise ValueError(f"line {line_no}: '{key}' needs the command-line tool (files are read from disk)")
+            path = Path(base_dir) / profile.pop(key)
+            profile[key[:-len(FILE_SUFFIX)]] = path.read_text(encoding="utf-8").strip()
+        profile.pop("_id", None)
+        yield profile
+
+
+def write_profiles(agents: Iterable[Dict[str, Any]], stream: IO[str]) -> int:
+    """Write agents as JSONL, one at a time. Returns the number written."""
+    count = 0
+    for agent in agents:
+        stream.write(json.dumps({k: v for k, v in agent.items() if k != "_id"}, ensure_ascii=False) + "\n")
+        count += 1
+    return count
+
+
+def profiles_jsonl(agents: Iterable[Dict[str, Any]]) -> str:
+    """Agents as a JSONL string (for download buttons)."""
+    return "".join(json.dumps({k: v for k, v in a.items() if k != "_id"}, ensure_ascii=False) + "\n" for a in agents)
+
+
+# ------------------------------------------------------------------------------
+# Planning
+# ------------------------------------------------------------------------------
+def plan_import(current: List[Dict[str, Any]], profiles: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Compare incoming profiles with the current agents. Each change is
+    {'op': 'insert' | 'update' | 'unchanged' | 'skip', 'id', 'role',
+     'fields' (values to set), 'before' (their current values), 'reason' (skips)}.
+    """
+    by_id = {agent["id"]: agent for agent in current if agent.get("id")}
+    by_role: Dict[str, List[Dict[str, Any]]] = {}
+    for agent in current:
+        by_role.setdefault(str(agent.get("role", "")).strip().lower(), []).append(agent)
+
+    plan = []
+    for profile in profiles:
+        role = str(profile.get("role", "")).strip()
+        target = by_id.get(profile.get("id"))
+        if target is None and not profile.get("id"):
+            matches = by_role.get(role.lower(), [])
+            if len(matches) > 1:
+                plan.append({"op": "skip", "id": None, "role": role, "fields": {}, "before": {},
+                             "reason": f"{len(matches)} agents have this role; add an id"})
+                continue
+            target = matches[0] if matches else None
+            if target is not None and not target.get("id"):
+                plan.append({"op": "skip", "id": None, "role": role, "fields": {}, "before": {},
+                             "reason": "the matching agent has no id"})
+                continue
+
+        if target is None:
+            if not role:
+                plan.append({"op": "skip", "id": profile.get("id"), "role": "", "fields": {}, "before": {},
+                             "reason": "new agents need a role"})
+                continue
+            agent = {"id": profile.get("id") or str(uuid4()), "role": role, "goal": "", "backstory": "",
+                     "allow_delegation": False, **{k: v for k, v in profile.items() if k not in ("id", "role")}}
+            plan.append({"op": "insert", "id": agent["id"], "role": role, "fields": agent, "before": {}})
+            continue
+
+        fields = {k: v for k, v in profile.items() if k != "id" and target.get(k) != v}
+        if not profile.get("id") and "role" in fields:
+            fields.pop("role")  # matched on it, up to case
+        plan.append({
+            "op": "update" if fields else "unchanged",
+            "id": target["id"],
+            "role": target.get("role", ""),
+            "fields": fields,
+            "before": {k: target.get(k) for k in fields},
+        })
+    return plan
+
+
+def summarize(plan: List[Dict[str, Any]]) -> Dict[str, int]:
+    counts = {"insert": 0, "update": 0, "unchanged": 0, "skip": 0}
+    for change in plan:
+        counts[change["op"]] += 1
+    return counts
+
+
+def _lines(value: Any) -> List[str]:
+    if value is None:
+        return []
+    text = value if isinstance(value, str) else json.dumps(value, indent=2, ensure_ascii=False)
+    return text.splitlines()
+
+
+def format_change(change: Dict[str, Any]) -> str:
+    """Unified diff of the fields an insert or update would write."""
+    out = []
+    for field, value in change["fields"].items():
+        if field == "id":
+            continue
+        out.extend(difflib.unified_diff(
+            _lines(change["before"].get(field)), _lines(value),
+            fromfile=f"{field} (current)", tofile=f"{field} (import)", lineterm="",
+        ))
+    return "\n".join(out)
+
+
+# ------------------------------------------------------------------------------
+# Targets
+# ------------------------------------------------------------------------------
+class StoreProfileTarget:
+    """The JSON agent store: every change goes into one journal append."""
+
+    name = "json"
+
+    def __init__(self, store: Any):
+        self.store = store
+
+    def load(self) -> List[Dict[str, Any]]:
+        return self.store.all()
+
+    def apply(self, plan: List[Dict[str, Any]]) -> Dict[str, int]:
+        current = {agent.get("id"): agent for agent in self.store.all()}
+        documents: Dict[str, Dict[str, Any]] = {}
+        for change in plan:
+            if change["op"] == "insert":
+                documents[change["id"]] = dict(change["fields"])
+            elif change["op"] == "update":
+                base = documents.get(change["id"]) or current.get(change["id"], {"id": change["id"]})
+                documents[change["id"]] = {**base, **change["fields"]}
+        self.store.put_many(list(documents.values()))
+        return summarize(plan)
+
+
+class MongoProfileTarget:
+    """A MongoDB agents collection: every change goes into one unordered bulk_write."""
+
+    name = "mongo"
+
+    def __init__(self, collection: Any):
+        self.collection = collection
+        self._filters: Dict[str, Dict[str, Any]] = {}
+
+    def load(self) -> List[Dict[str, Any]]:
+        agents = []
+        for agent in self.collection.find({}):
+            object_id = agent.pop("_id", None)
+            if "id" not in agent:
+                # Agents inserted without an id are addressed by _id, as load_agents() shows them
+                agent["id"] = str(object_id)
+                self._filters[agent["id"]] = {"_id": object_id}
+            agents.append(agent)
+        return agents
+
+    def apply(self, plan: List[Dict[str, Any]]) -> Dict[str, int]:
+        from pymongo import InsertOne, UpdateOne
+
+        operations = []
+        for change in plan:
+            if change["op"] == "insert":
+                operations.append(InsertOne(dict(change["fields"])))
+            elif change["op"] == "update":
+                selector = self._filters.get(change["id"], {"id": change["id"]})
+                operations.append(UpdateOne(selector, {"$set": change["fields"]}))
+        if operations:
+            self.collection.bulk_write(operations, ordered=False)
+        return summarize(plan)
+
+
+def import_profiles(target: Any, profiles: Iterable[Dict[str, Any]], apply: bool = False) -> Dict[str, Any]:
+    """
+    Plan an import against the target's current profiles and, with `apply`,
+    write it. Returns {'plan', 'summary', 'applied' (bool)}.
+    """
+    plan = plan_import(target.load(), profiles)
+    summary = summarize(plan)
+    applied = bool(apply and (summary["insert"] or summary["update"]))
+    if applied:
+        target.apply(plan)
+    return {"plan": plan, "summary": summary, "applied": applied}
+
+
+# ------------------------------------------------------------------------------
+# CLI
+# ------------------------------------------------------------------------------
+def open_target(args: argparse.Namespace) -> Any:
+    if args.mongo:
+        from pymongo import MongoClient
+
+        uri = args.mongo_uri or os.getenv("MONGODB_URI")
+        if not uri:
+            raise SystemExit("--mongo needs MONGODB_URI (or --mongo-uri)")
+        return MongoProfileTarget(MongoClient(uri)[args.db]["agents"])
+    from agent_store import JsonAgentStore
+
+    return StoreProfileTarget(JsonAgentStore(args.agents))
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Bulk import/export agent profiles as JSONL.")
+    parser.add_argument("command", choices=["export", "import"])
+    parser.add_argument("path", help="JSONL file to write (export) or read (import); '-' for stdout/stdin")
+    parser.add_argument("--apply", action="store_true", help="Write the import (default: dry run with diffs)")
+    parser.add_argument("--mongo", action="store_true", help="Use MongoDB instead of the JSON agent store")
+    parser.add_argument("--mongo-uri", help="MongoDB connection string (default: MONGODB_URI)")
+    parser.add_argument("--db", default="ai_factory", help="MongoDB database (default: ai_factory)")
+    parser.add_argument("--agents", default="agents.json", help="JSON agent store (default: agents.json)")
+    parser.add_argument("--quiet", action="store_true", help="Summary only, no diffs")
+    args = parser.parse_args(argv)
+
+    target = open_target(args)
+    if args.command == "export":
+        if args.path == "-":
+            count = write_profiles(target.load(), sys.stdout)
+        else:
+            with open(args.path, "w", encoding="utf-8") as out:
+                count = write_profiles(target.load(), out)
+        print(f"Exported {count} profile(s) from {target.name}", file=sys.stderr)
+        return 0
+
+    if args.path == "-":
+        result = import_profiles(target, iter_profiles(sys.stdin, Path.cwd()), apply=args.apply)
+    else:
+        with open(args.path, encoding="utf-8") as source:
+            result = import_profiles(target, iter_profiles(source, Path(args.path).parent), apply=args.apply)
+    for change in result["plan"]:
+        if change["op"] == "unchanged":
+            continue
+        label = change.get("reason") or ", ".join(f for f in change["fields"] if f != "id")
+        print(f"{change['op'].upper():7} {change['role'] or change['id'] or '(no role)'}  ({label})")
+        if not args.quiet and change["op"] in ("insert", "update"):
+            print(format_change(change))
+    summary = result["summary"]
+    print(f"{summary['insert']} new, {summary['update']} updated, {summary['unchanged']} unchanged, "
+          f"{summary['skip']} skipped on {target.name}" + ("" if args.apply else " (dry run: add --apply to write)"))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,179 @@
+"""
+Full-text search over agent profiles (role, goal, backstory) for the JSON store.
+
+MongoDB deployments search with a text index (see migrations.py). Without
+MongoDB, AgentSearchIndex keeps an inverted index in memory and ranks with
+BM25, counting a term in the role more than in the goal, and in the goal more
+than in the backstory (FIELD_WEIGHTS):
+
+- postings map each term to {agent id: weighted term frequency}, so a query
+  only touches the agents that contain its terms;
+- the index follows a JsonAgentStore through its change notifications: a put
+  or delete reindexes one agent, and only a full reload of the store (another
+  process compacted it) rebuilds everything;
+- a query term with no exact match expands to the indexed terms it prefixes,
+  so "orchestr" finds "orchestrator" as the user types.
+
+This module has no Streamlit dependency so scripts can import it directly.
+"""
+
+import bisect
+import heapq
+import math
+import re
+import threading
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+FIELD_WEIGHTS = {"role": 3.0, "goal": 2.0, "backstory": 1.0}
+K1 = 1.2
+B = 0.75
+MAX_PREFIX_EXPANSION = 50
+
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the this to was were will with you your"
+    .split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in re.findall(r"[a-z0-9]+", str(text or "").lower()) if (len(t) > 1 or t.isdigit()) and t not in _STOPWORDS]
+
+
+class AgentSearchIndex:
+    """BM25 over weighted role/goal/backstory fields, updated one agent at a time."""
+
+    def __init__(self, field_weights: Optional[Dict[str, float]] = None):
+        self.field_weights = dict(field_weights or FIELD_WEIGHTS)
+        self._lock = threading.Lock()
+        self._postings: Dict[str, Dict[str, float]] = {}
+        self._terms: Dict[str, List[str]] = {}  # agent id -> its distinct terms, for removal
+        self._lengths: Dict[str, float] = {}
+        self._total_length = 0.0
+        self._vocabulary: Optional[List[str]] = None  # sorted terms for prefix lookups, rebuilt lazily
+
+    @classmethod
+    def from_agents(cls, agents: List[Dict[str, Any]]) -> "AgentSearchIndex":
+        index = cls()
+        index.reset(agents)
+        return index
+
+    def __len__(self) -> int:
+        return len(self._lengths)
+
+    # -- updates ---------------------------------------------------------------
+
+    def _remove_locked(self, agent_id: str) -> None:
+        for term in self._terms.pop(agent_id, []):
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(agent_id, None)
+                if not postings:
+                    del self._postings[term]
+                    self._vocabulary = None
+        self._total_length -= self._lengths.pop(agent_id, 0.0)
+
+    def _add_locked(self, agent: Dict[str, Any]) -> None:
+        agent_id = agent.get("id")
+        if not agent_id:
+            return
+        self._remove_locked(agent_id)
+        frequencies: Dict[str, float] = {}
+        length = 0.0
+        for field, weight in self.field_weights.items():
+            tokens = tokenize(agent.get(field, ""))
+            length += weight * len(tokens)
+            for token, count in Counter(tokens).items():
+                frequencies[token] = frequencies.get(token, 0.0) + weight * count
+        postings, vocabulary_size = self._postings, len(self._postings)
+        for term, frequency in frequencies.items():
+            entry = postings.get(term)
+            if entry is None:
+                entry = postings[term] = {}
+            entry[agent_id] = frequency
+        if len(postings) != vocabulary_size:
+            self._vocabulary = None
+        self._terms[agent_id] = list(frequencies)
+        self._lengths[agent_id] = length
+        self._total_length += length
+
+    def add(self, agent: Dict[str, Any]) -> None:
+        """Index (or reindex) one agent by its `id`."""
+        with self._lock:
+            self._add_locked(agent)
+
+    def remove(self, agent_id: str) -> None:
+        with self._lock:
+            self._remove_locked(agent_id)
+
+    def reset(self, agents: List[Dict[str, Any]]) -> None:
+        with self._lock:
+            self._postings, self._terms, self._lengths = {}, {}, {}
+            self._total_length, self._vocabulary = 0.0, None
+            for agent in agents:
+                self._add_locked(agent)
+
+    def on_store_change(self, event: str, payload: Any) -> None:
+        """JsonAgentStore.subscribe() listener."""
+        if event == "put":
+            self.add(payload)
+        elif event == "delete":
+            self.remove(payload)
+        elif event == "reset":
+            self.reset(payload)
+
+    # -- queries ---------------------------------------------------------------
+
+    def _expand(self, term: str) -> List[str]:
+        if term in self._postings:
+            return [term]
+        if self._vocabulary is None:
+            self._vocabulary = sorted(self._postings)
+        start = bisect.bisect_left(self._vocabulary, term)
+        matches = []
+        for candidate in self._vocabulary[start:start + MAX_PREFIX_EXPANSION]:
+            if not candidate.startswith(term):
+                break
+            matches.append(candidate)
+        return matches
+
+    def search(self, query: str, limit: int = 20) -> List[Tuple[str, float]]:
+        """Best-matching agent ids with their BM25 scores, highest first."""
+        with self._lock:
+            count = len(self._lengths)
+            if not count:
+                return []
+            average = (self._total_length / count) or 1.0
+            scores: Dict[str, float] = {}
+            for term in dict.fromkeys(tokenize(query)):
+                for match in self._expand(term):
+                    postings = self._postings[match]
+                    idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+                    for agent_id, frequency in postings.items():
+                        norm = K1 * (1 - B + B * self._lengths[agent_id] / average)
+                        scores[agent_id] = scores.get(agent_id, 0.0) + idf * frequency * (K1 + 1) / (frequency + norm)
+            best = heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+        return [(agent_id, round(score, 4)) for agent_id, score in best]
+
+
+_INDEXES: Dict[str, AgentSearchIndex] = {}
+_INDEXES_LOCK = threading.Lock()
+
+
+def get_store_index(store: Any) -> AgentSearchIndex:
+    """Process-wide index for a JsonAgentStore, subscribed to its changes once."""
+    key = str(Path(store.path).resolve())
+    with _INDEXES_LOCK:
+        if key not in _INDEXES:
+            index = AgentSearchIndex()
+            store.subscribe(index.on_store_change)
+            _INDEXES[key] = index
+        return _INDEXES[key]
+
+
+def search_store(store: Any, query: str, limit: int = 20) -> List[Tuple[str, float]]:
+    """Search a JsonAgentStore, after picking up other sessions' and processes' writes."""
+    index = get_store_index(store)
+    store.sync()
+    return index.search(query, limit)
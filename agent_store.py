@@ -0,0 +1,292 @@
+"""
+Concurrency-safe JSON agent store: snapshot + append-only journal.
+
+The JSON fallback used to rewrite the whole `agents.json` on every add or
+delete after re-reading it, so two sessions saving at once could lose an
+update and a crash mid-write left a truncated file. Now:
+
+- `agents.json` is a compacted snapshot (same list format as before, so the
+  file stays readable by hand and by batch_runner.py);
+- every add/update/delete appends one JSON line to `agents.json.journal`
+  and fsyncs it: O(1) per write, whatever the number of agents;
+- writers hold an exclusive lock on `agents.json.lock` (fcntl / msvcrt), so
+  sessions and processes serialize their appends;
+- past COMPACT_EVERY journal entries the snapshot is rewritten atomically
+  (temp file + os.replace) and the journal truncated. Journal ops are
+  idempotent (put by id, delete by id), so a crash between the two steps
+  just replays them again;
+- readers keep the parsed agents in memory and, on each call, stat the two
+  files: an unchanged store costs two stat() calls, a grown journal is read
+  from the last offset, and a replaced snapshot triggers a full reload.
+
+A torn final journal line (crash mid-append) is ignored.
+
+This module has no Streamlit dependency so scripts can import it directly.
+"""
+
+import json
+import os
+import threading
+from contextlib import contextmanager
+from itertools import islice
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+COMPACT_EVERY = 200
+
+
+@contextmanager
+def _file_lock(path: Path) -> Iterator[None]:
+    """Exclusive advisory lock on `path` (created if missing), across processes."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "a+b") as handle:
+        if fcntl is not None:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX)
+        else:
+            handle.seek(0)
+            msvcrt.locking(handle.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+            else:
+                handle.seek(0)
+                msvcrt.locking(handle.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def _signature(path: Path) -> Optional[Tuple[int, int, int]]:
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return None
+    return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+
+class JsonAgentStore:
+    """Agent profiles in a JSON snapshot plus an append-only journal, keyed by `id`."""
+
+    def __init__(self, path: str = "agents.json", compact_every: int = COMPACT_EVERY):
+        self.path = Path(path)
+        self.journal_path = self.path.with_name(self.path.name + ".journal")
+        self.lock_path = self.path.with_name(self.path.name + ".lock")
+        self.compact_every = max(1, int(compact_every))
+        self._lock = threading.RLock()
+        self._agents: Dict[str, Dict[str, Any]] = {}
+        self._snapshot_sig: Optional[Tuple[int, int, int]] = None
+        self._journal_ino: Optional[int] = None
+        self._journal_offset = 0
+        self._journal_entries = 0
+        self._loaded = False
+        self._loading = False
+        self._listeners: List[Callable[[str, Any], None]] = []
+        self._stats = {"full_loads": 0, "journal_reads": 0, "appends": 0, "compactions": 0}
+
+    # -- reading ---------------------------------------------------------------
+
+    def _notify(self, event: str, payload: Any) -> None:
+        for listener in self._listeners:
+            listener(event, payload)
+
+    def _apply(self, entry: Dict[str, Any]) -> None:
+        if entry.get("op") == "put":
+            agent = entry["agent"]
+            self._agents[agent["id"]] = agent  # an update keeps the agent's position
+            if not self._loading:
+                self._notify("put", agent)
+        elif entry.get("op") == "delete":
+            self._agents.pop(entry["id"], None)
+            if not self._loading:
+                self._notify("delete", entry["id"])
+
+    def _read_journal(self) -> None:
+        """Apply journal lines past the current offset; a torn last line is left for later."""
+        try:
+            with open(self.journal_path, "rb") as handle:
+                self._journal_ino = os.fstat(handle.fileno()).st_ino
+                handle.seek(self._journal_offset)
+                data = handle.read()
+        except FileNotFoundError:
+            self._journal_ino, self._journal_offset, self._journal_entries = None, 0, 0
+            return
+        self._stats["journal_reads"] += 1
+        consumed = 0
+        for line in data.splitlines(keepends=True):
+            if not line.endswith(b"\n"):
+                break  # still being written, or torn by a crash
+            consumed += len(line)
+            try:
+                self._apply(json.loads(line))
+            except (ValueError, KeyError, TypeError):
+                continue
+            self._journal_entries += 1
+        self._journal_offset += consumed
+
+    def _full_load(self) -> None:
+        self._stats["full_loads"] += 1
+        self._loading = True
+        self._agents = {}
+        self._snapshot_sig = _signature(self.path)
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            data = []
+        for index, agent in enumerate(data if isinstance(data, list) else []):
+            if isinstance(agent, dict):
+                self._agents[str(agent.get("id") or f"legacy-{index}")] = agent
+        self._journal_offset, self._journal_entries = 0, 0
+        try:
+            self._read_journal()
+        finally:
+            self._loading = False
+        self._loaded = True
+        self._notify("reset", list(self._agents.values()))
+
+    def _refresh(self) -> None:
+        if not self._loaded or _signature(self.path) != self._snapshot_sig:
+            self._full_load()
+            return
+        journal = _signature(self.journal_path)
+        if journal is None:
+            if self._journal_offset:
+                self._full_load()  # journal removed under us
+        elif journal[0] != self._journal_ino or journal[2] < self._journal_offset:
+            self._full_load()  # truncated or replaced by another process's compaction
+        elif journal[2] > self._journal_offset:
+            self._read_journal()
+
+    def sync(self) -> None:
+        """Pick up writes from other sessions or processes (listeners hear about them)."""
+        with self._lock:
+            self._refresh()
+
+    def subscribe(self, listener: Callable[[str, Any], None]) -> None:
+        """
+        Call `listener(event, payload)` on every change: ("put", agent),
+        ("delete", agent_id), or ("reset", all agents) after a full reload.
+        It is called once with "reset" right away.
+        """
+        with self._lock:
+            self._refresh()
+            self._listeners.append(listener)
+            listener("reset", list(self._agents.values()))
+
+    def all(self) -> List[Dict[str, Any]]:
+        """Every agent, in insertion order (copies, safe to modify)."""
+        with self._lock:
+            self._refresh()
+            return [dict(agent) for agent in self._agents.values()]
+
+    def page(self, offset: int, limit: int, fields: Optional[Iterable[str]] = None) -> Tuple[List[Dict[str, Any]], int]:
+        """One page of agents, in insertion order, with only `fields` if given; plus the total count."""
+        with self._lock:
+            self._refresh()
+            agents = list(islice(self._agents.values(), max(0, offset), max(0, offset) + max(0, limit)))
+            total = len(self._agents)
+        if fields is None:
+            return [dict(agent) for agent in agents], total
+        fields = tuple(fields)
+        return [{k: agent[k] for k in fields if k in agent} for agent in agents], total
+
+    def get(self, agent_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            self._refresh()
+            agent = self._agents.get(agent_id)
+            return dict(agent) if agent is not None else None
+
+    # -- writing ---------------------------------------------------------------
+
+    def _append(self, *entries: Dict[str, Any]) -> None:
+        data = b"".join((json.dumps(entry, ensure_ascii=False) + "\n").encode("utf-8") for entry in entries)
+        with self._lock, _file_lock(self.lock_path):
+            # Catch up with other writers first so the offset stays in step
+            self._refresh()
+            with open(self.journal_path, "ab") as handle:
+                if handle.tell() > self._journal_offset:
+                    handle.truncate(self._journal_offset)  # drop a torn line left by a crashed writer
+                handle.write(data)
+                handle.flush()
+                os.fsync(handle.fileno())
+            for entry in entries:
+                self._apply(entry)
+            self._journal_offset += len(data)
+            self._journal_entries += len(entries)
+            self._journal_ino = _signature(self.journal_path)[0]
+            self._stats["appends"] += 1
+            if self._journal_entries >= self.compact_every:
+                self._compact_locked()
+
+    def put(self, agent: Dict[str, Any]) -> Dict[str, Any]:
+        """Add or replace an agent (by its `id`)."""
+        if not agent.get("id"):
+            raise ValueError("agent needs an 'id'")
+        self._append({"op": "put", "agent": agent})
+        return agent
+
+    def put_many(self, agents: List[Dict[str, Any]]) -> None:
+        """Add or replace several agents in one locked, fsynced journal write."""
+        if any(not agent.get("id") for agent in agents):
+            raise ValueError("every agent needs an 'id'")
+        if agents:
+            self._append(*({"op": "put", "agent": agent} for agent in agents))
+
+    def delete(self, agent_id: str) -> None:
+        self._append({"op": "delete", "id": agent_id})
+
+    def _write_snapshot(self, agents: List[Dict[str, Any]]) -> None:
+        tmp = self.path.with_name(f"{self.path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp, "w", encoding="utf-8") as handle:
+            handle.write(json.dumps(agents, indent=2))
+            handle.flush()
+            os.fsync(handle.fileno())
+        os.replace(tmp, self.path)
+
+    def _compact_locked(self) -> None:
+        # Snapshot first, then truncate: if we die in between, replaying the journal is harmless
+        self._write_snapshot(list(self._agents.values()))
+        with open(self.journal_path, "wb") as handle:
+            handle.flush()
+            os.fsync(handle.fileno())
+        self._snapshot_sig = _signature(self.path)
+        self._journal_ino = _signature(self.journal_path)[0]
+        self._journal_offset, self._journal_entries = 0, 0
+        self._stats["compactions"] += 1
+
+    def compact(self) -> None:
+        """Fold the journal into the snapshot now."""
+        with self._lock, _file_lock(self.lock_path):
+            self._refresh()
+            self._compact_locked()
+
+    def replace_all(self, agents: List[Dict[str, Any]]) -> None:
+        """Replace every agent at once (written as a new snapshot, not journaled)."""
+        with self._lock, _file_lock(self.lock_path):
+            self._refresh()
+            self._agents = {}
+            for index, agent in enumerate(agents):
+                self._agents[str(agent.get("id") or f"legacy-{index}")] = dict(agent)
+            self._compact_locked()
+            self._notify("reset", list(self._agents.values()))
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"agents": len(self._agents), "journal_entries": self._journal_entries, **self._stats}
+
+
+_STORES: Dict[str, JsonAgentStore] = {}
+_STORES_LOCK = threading.Lock()
+
+
+def get_agent_store(path: str = "agents.json") -> JsonAgentStore:
+    """Process-wide store per file, so every session shares one in-memory copy."""
+    key = str(Path(path).resolve())
+    with _STORES_LOCK:
+        if key not in _STORES:
+            _STORES[key] = JsonAgentStore(path, compact_every=int(os.getenv("AGENT_JOURNAL_COMPACT_EVERY", COMPACT_EVERY)))
+        return _STORES[key]
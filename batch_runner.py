@@ -0,0 +1,199 @@
+"""
+Headless batch runner: build many projects from a JSONL of specs, no browser.
+
+Each line of the specs file is one project (see pipeline.py):
+
+    {"name": "habits", "idea": "A habit tracker with streaks",
+     "package": "Package A: React + Flask + PostgreSQL",
+     "additional_features": "Email reminders", "special_requirements": "",
+     "config": "SENDGRID_API_KEY=...", "files": ["refs/scoring.py", "refs/schema.sql"],
+     "build_mode": "fanout"}
+
+`files` are paths (relative to the specs file) parsed like uploads in the app.
+Projects run concurrently on `--workers` threads; every kickoff shares one
+process-wide rate limiter, LLM backend, telemetry store and trace log.
+
+Usage:
+    python batch_runner.py specs.jsonl --out runs/ --workers 4
+    python batch_runner.py specs.jsonl --out runs/ --backend fake            # offline dry run
+    python batch_runner.py specs.jsonl --out runs/ --rpm 500 --tpm 200000 --concurrency 8
+
+Output, per project: runs/<name>/deployment_kit.md, files/, project.zip, metrics.json;
+plus runs/summary.json for the batch.
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from uuid import uuid4
+
+_print_lock = threading.Lock()
+
+
+def log(message: str) -> None:
+    with _print_lock:
+        print(message, flush=True)
+
+
+def load_specs(path: Path) -> List[Dict[str, Any]]:
+    specs = []
+    with path.open(encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            if not line.strip() or line.lstrip().startswith("#"):
+                continue
+            try:
+                spec = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise SystemExit(f"{path}:{line_no}: invalid JSON ({e})")
+            if not spec.get("idea") or not spec.get("package"):
+                raise SystemExit(f"{path}:{line_no}: a spec needs 'idea' and 'package'")
+            specs.append(spec)
+    return specs
+
+
+def project_slug(spec: Dict[str, Any], index: int) -> str:
+    base = spec.get("name") or spec["idea"][:40]
+    slug = re.sub(r"[^a-z0-9]+", "-", base.lower()).strip("-") or "project"
+    return f"{index:03d}-{slug}"
+
+
+@lru_cache(maxsize=256)
+def _parse_file(path: str, mtime: float) -> Dict[str, Any]:
+    """Parsed reference file, cached so specs sharing files parse them once."""
+    from pipeline import LocalUpload, parse_uploaded_file
+    return parse_uploaded_file(LocalUpload(path))
+
+
+def resolve_files(spec: Dict[str, Any], base_dir: Path) -> List[Dict[str, Any]]:
+    files_data = []
+    for entry in spec.get("files") or []:
+        path = (base_dir / entry).resolve()
+        if not path.is_file():
+            raise FileNotFoundError(f"Reference file not found: {entry}")
+        files_data.append(_parse_file(str(path), path.stat().st_mtime))
+    return files_data
+
+
+def run_one(spec: Dict[str, Any], index: int, agents: List[Dict[str, Any]], base_dir: Path,
+            out_dir: Path) -> Dict[str, Any]:
+    from pipeline import create_project_zip, run_project, write_files_to_directory
+
+    slug = project_slug(spec, index)
+    project_dir = out_dir / slug
+    project_dir.mkdir(parents=True, exist_ok=True)
+    run_id = uuid4().hex
+
+    def on_event(event: str, data: Dict[str, Any]) -> None:
+        if event == "phase_done":
+            log(f"[{slug}] {data['phase']} {data.get('outcome', '')}")
+
+    log(f"[{slug}] started (run {run_id[:8]})")
+    try:
+        report = run_project({**spec, "files": resolve_files(spec, base_dir)}, agents, run_id=run_id, on_event=on_event)
+    except Exception as e:
+        report = {"run_id": run_id, "status": "error", "error": str(e), "output": "", "phase_results": {},
+                  "phase_metrics": [], "elapsed_time": 0, "files": {}}
+
+    if report["output"]:
+        (project_dir / "deployment_kit.md").write_text(report["output"], encoding="utf-8")
+    if report["files"]:
+        write_files_to_directory(report["files"], str(project_dir / "files"))
+        (project_dir / "project.zip").write_bytes(create_project_zip(report["files"], slug))
+    for phase, text in report["phase_results"].items():
+        (project_dir / f"{phase}.md").write_text(text, encoding="utf-8")
+
+    metrics = {
+        "name": slug,
+        "run_id": report["run_id"],
+        "status": report["status"],
+        "error": report["error"],
+        "idea": spec["idea"],
+        "package": spec["package"],
+        "elapsed_time": report["elapsed_time"],
+        "files": len(report["files"]),
+        "output_chars": len(report["output"]),
+        "cost": round(sum(m.get("cost") or 0 for m in report["phase_metrics"]), 5),
+        "tokens": sum((m.get("prompt_tokens") or 0) + (m.get("completion_tokens") or 0) for m in report["phase_metrics"]),
+        "queue_wait": round(sum(m.get("queue_wait") or 0 for m in report["phase_metrics"]), 2),
+        "phase_metrics": report["phase_metrics"],
+    }
+    (project_dir / "metrics.json").write_text(json.dumps(metrics, indent=2), encoding="utf-8")
+    log(f"[{slug}] {report['status']} in {report['elapsed_time']}s, {metrics['files']} files, ${metrics['cost']:.4f}"
+        + (f" — {report['error']}" if report["error"] else ""))
+    return metrics
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Build many AI Factory projects from a JSONL of specs.")
+    parser.add_argument("specs", help="JSONL file, one project spec per line")
+    parser.add_argument("--out", default="runs", help="Output directory (default: runs/)")
+    parser.add_argument("--workers", type=int, default=2, help="Projects built concurrently")
+    parser.add_argument("--agents", default="agents.json", help="Agent profiles JSON (as saved by the app)")
+    parser.add_argument("--backend", choices=["live", "fake", "record", "replay"],
+                        help="LLM backend (default: AI_FACTORY_LLM_BACKEND or live)")
+    parser.add_argument("--rpm", type=float, help="Shared requests-per-minute budget")
+    parser.add_argument("--tpm", type=float, help="Shared tokens-per-minute budget")
+    parser.add_argument("--concurrency", type=int, help="Max concurrent LLM calls across all workers")
+    args = parser.parse_args(argv)
+
+    # Backend and limiter are process-wide singletons: configure before the first kickoff
+    if args.backend:
+        os.environ["AI_FACTORY_LLM_BACKEND"] = args.backend
+    from llm_backend import get_llm_backend
+    from rate_limiter import get_rate_limiter
+    limiter = get_rate_limiter(requests_per_minute=args.rpm, tokens_per_minute=args.tpm,
+                               max_concurrency=args.concurrency)
+    backend = get_llm_backend()
+    if backend.name == "live" and not os.getenv("OPENAI_API_KEY"):
+        log("⚠️ OPENAI_API_KEY is not set; live kickoffs will fail.")
+
+    specs_path = Path(args.specs)
+    specs = load_specs(specs_path)
+    agents_path = Path(args.agents)
+    if not agents_path.exists():
+        raise SystemExit(f"Agents file not found: {agents_path} (export it from Agent Management or the app's agents.json)")
+    # Through the store so edits still in the app's journal are included
+    from agent_store import JsonAgentStore
+    agents = JsonAgentStore(str(agents_path)).all()
+    out_dir = Path(args.out)
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    log(f"Building {len(specs)} project(s) with {args.workers} worker(s), backend '{backend.name}', "
+        f"up to {limiter.snapshot()['concurrency_limit']:g} concurrent LLM calls")
+    started = time.time()
+    results: List[Dict[str, Any]] = []
+    with ThreadPoolExecutor(max_workers=max(1, args.workers), thread_name_prefix="build") as pool:
+        futures = [pool.submit(run_one, spec, index, agents, specs_path.parent, out_dir)
+                   for index, spec in enumerate(specs, 1)]
+        for future in as_completed(futures):
+            results.append(future.result())
+
+    results.sort(key=lambda r: r["name"])
+    summary = {
+        "started": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(started)),
+        "wall_s": round(time.time() - started, 2),
+        "workers": args.workers,
+        "backend": backend.name,
+        "projects": len(results),
+        "ok": sum(r["status"] == "ok" for r in results),
+        "qa_failed": sum(r["status"] == "qa_failed" for r in results),
+        "errors": sum(r["status"] == "error" for r in results),
+        "cost": round(sum(r["cost"] for r in results), 5),
+        "results": [{k: v for k, v in r.items() if k != "phase_metrics"} for r in results],
+    }
+    (out_dir / "summary.json").write_text(json.dumps(summary, indent=2), encoding="utf-8")
+    log(f"\nDone in {summary['wall_s']}s: {summary['ok']} ok, {summary['qa_failed']} QA failed, "
+        f"{summary['errors']} error(s), ${summary['cost']:.4f}. Summary: {out_dir / 'summary.json'}")
+    return 1 if summary["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,272 @@
+"""
+Offline end-to-end benchmark of the AI Factory pipeline.
+
+Drives idea → strategy → package selection → build (all phases) → complete
+through Streamlit's AppTest with the simulated LLM backend (or a recorded
+cassette, see cassettes.py), and reports
+per-stage app-side CPU time, peak Python memory and rerun latency, plus the
+per-phase build breakdown from the trace with simulated LLM latency removed.
+
+Usage:
+    python benchmarks/bench_pipeline.py                       # 1 run, default kit
+    python benchmarks/bench_pipeline.py --runs 3 --kit-files 60 --kit-lines 200
+    python benchmarks/bench_pipeline.py --latency '{"build": {"dist": "fixed", "value": 2}}'
+    python benchmarks/bench_pipeline.py --build-mode fanout --latency '{"build_files": {"dist": "fixed", "value": 1}}'
+    python benchmarks/bench_pipeline.py --compare benchmarks/results/old.json
+    python benchmarks/bench_pipeline.py --cassette cassettes/<run_id>.jsonl.gz --cassette-mode lenient
+
+Results are written to benchmarks/results/<timestamp>-<commit>.json (or --output).
+"""
+
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+APP_PATH = REPO_ROOT / "app.py"
+RESULTS_DIR = REPO_ROOT / "benchmarks" / "results"
+
+# One agent per pipeline role so every phase runs
+BENCH_AGENTS = [
+    ("Orchestrator Agent", "Lead the build"),
+    ("Strategy Consultant", "Propose solution packages"),
+    ("Code Extractor", "Extract patterns from uploads"),
+    ("Solutions Architect", "Design the architecture"),
+    ("Backend Coder", "Write the backend"),
+    ("Frontend Coder", "Write the frontend"),
+    ("Integration Coordinator", "Validate integration"),
+    ("Quality Assurance Validator", "Validate quality"),
+    ("Code Supervisor", "Plan targeted fixes"),
+    ("Documentation Specialist", "Write documentation"),
+]
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def prepare_workdir(workdir: Path) -> None:
+    """Isolated cwd: bench agents, and telemetry/trace files that never touch the repo."""
+    agents = [
+        {"id": f"bench-{i}", "role": role, "goal": goal, "backstory": "Benchmark agent.", "allow_delegation": True}
+        for i, (role, goal) in enumerate(BENCH_AGENTS)
+    ]
+    (workdir / "agents.json").write_text(json.dumps(agents, indent=2), encoding="utf-8")
+
+
+def measure(label: str, step, use_tracemalloc: bool) -> Dict[str, Any]:
+    """Run one AppTest step and capture wall, CPU and peak traced memory."""
+    if use_tracemalloc:
+        tracemalloc.reset_peak()
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    step()
+    stats = {
+        "stage": label,
+        "wall_s": round(time.perf_counter() - wall_start, 4),
+        "cpu_s": round(time.process_time() - cpu_start, 4),
+    }
+    if use_tracemalloc:
+        stats["peak_mem_mb"] = round(tracemalloc.get_traced_memory()[1] / 1e6, 2)
+    return stats
+
+
+def run_once(args: argparse.Namespace) -> Dict[str, Any]:
+    from streamlit.testing.v1 import AppTest
+    import llm_backend
+    import tracing
+
+    if args.cassette:
+        from cassettes import ReplayBackend
+        backend = ReplayBackend(args.cassette, strict=args.cassette_mode == "strict")
+    else:
+        backend = llm_backend.FakeBackend(
+            seed=args.seed, kit_files=args.kit_files, kit_lines=args.kit_lines,
+            latency=json.loads(args.latency) if args.latency else None,
+            placeholders=args.placeholders,
+        )
+    llm_backend.set_llm_backend(backend)
+
+    at = AppTest.from_file(str(APP_PATH), default_timeout=args.timeout)
+    at.secrets["OPENAI_API_KEY"] = "sk-bench"
+
+    def expect_phase(phase: str) -> None:
+        if at.exception:
+            raise RuntimeError(f"App raised: {[e.value for e in at.exception]}")
+        actual = at.session_state["phase"] if "phase" in at.session_state else None
+        if actual != phase:
+            errors = [e.value for e in at.error]
+            raise RuntimeError(f"Expected phase {phase!r}, app is in {actual!r}. App errors: {errors}")
+
+    def idea_step():
+        at.text_area(key="project_idea_input").set_value(args.idea).run()
+        at.button(key="plan_strategy_btn").click().run()
+
+    # First script run pays for imports (CrewAI is heavy) on the first run only
+    stages = [measure("first_render", at.run, args.tracemalloc)]
+    stages.append(measure("idea_to_strategy", idea_step, args.tracemalloc))
+    expect_phase("strategy_selection")
+    def selection_step():
+        at.radio(key="build_mode_input").set_value(args.build_mode)
+        at.button(key="continue_from_strategy_btn").click().run()
+
+    stages.append(measure("strategy_selection", selection_step, args.tracemalloc))
+    expect_phase("info_gathering")
+    stages.append(measure("build", lambda: at.button(key="skip_config_btn").click().run(), args.tracemalloc))
+    expect_phase("complete")
+    stages.append(measure("complete_rerender", lambda: at.run(), args.tracemalloc))
+    expect_phase("complete")
+
+    # Per-phase build breakdown: phase and kickoff span wall time minus simulated LLM latency
+    simulated: Dict[str, float] = {}
+    for call in backend.calls:
+        simulated[call["phase"]] = simulated.get(call["phase"], 0.0) + call["latency"]
+    # Spans that repeat (fan-out file groups) are summed per name
+    wall: Dict[str, float] = {}
+    for span in tracing.get_trace(at.session_state["run_id"]):
+        if span["kind"] not in ("phase", "agent") or span["duration"] is None:
+            continue
+        wall[span["name"]] = wall.get(span["name"], 0.0) + span["duration"]
+    phases = []
+    for name, duration in wall.items():
+        phase = name.split(".", 1)[-1]
+        phases.append({
+            "phase": name,
+            "wall_s": round(duration, 4),
+            "simulated_llm_s": round(simulated.get(phase, 0.0), 4),
+            "app_overhead_s": round(duration - simulated.get(phase, 0.0), 4),
+        })
+    return {
+        "stages": stages,
+        "phases": phases,
+        "llm_calls": len(backend.calls),
+        "kit_chars": len(at.session_state["artifacts"].get("execution_result") or ""),
+    }
+
+
+def aggregate(runs: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Median of each numeric metric across runs, keyed by stage / phase name."""
+    def median_by(key: str, name_field: str) -> Dict[str, Dict[str, float]]:
+        grouped: Dict[str, Dict[str, List[float]]] = {}
+        for run in runs:
+            for row in run[key]:
+                metrics = grouped.setdefault(row[name_field], {})
+                for metric, value in row.items():
+                    if metric != name_field:
+                        metrics.setdefault(metric, []).append(value)
+        return {name: {m: round(statistics.median(v), 4) for m, v in metrics.items()} for name, metrics in grouped.items()}
+
+    return {"stages": median_by("stages", "stage"), "phases": median_by("phases", "phase")}
+
+
+def compare(current: Dict[str, Any], baseline_path: str) -> None:
+    baseline = json.loads(Path(baseline_path).read_text(encoding="utf-8"))
+    print(f"\nCompared with {baseline.get('commit')} ({baseline_path}):")
+    for section in ("stages", "phases"):
+        for name, metrics in current["summary"][section].items():
+            old = baseline.get("summary", {}).get(section, {}).get(name)
+            if not old:
+                continue
+            deltas = []
+            for metric in ("cpu_s", "wall_s", "peak_mem_mb", "app_overhead_s"):
+                if metric in metrics and old.get(metric):
+                    change = (metrics[metric] - old[metric]) / old[metric] * 100
+                    deltas.append(f"{metric} {old[metric]:.3f} → {metrics[metric]:.3f} ({change:+.0f}%)")
+            if deltas:
+                print(f"  {section[:-1]} {name}: " + ", ".join(deltas))
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Offline AppTest benchmark of the AI Factory pipeline.")
+    parser.add_argument("--runs", type=int, default=1)
+    parser.add_argument("--kit-files", type=int, default=24, help="Files in the simulated deployment kit")
+    parser.add_argument("--kit-lines", type=int, default=80, help="Lines per simulated source file")
+    parser.add_argument("--latency", help="JSON latency spec per phase (see llm_backend.py)")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--placeholders", type=int, default=0,
+                        help="Kit files left with a TODO stub, to exercise the surgical retry")
+    parser.add_argument("--build-mode", choices=["crew", "fanout"], default="crew",
+                        help="Single build crew, or manifest + parallel file groups")
+    parser.add_argument("--cassette", help="Replay a recorded cassette instead of the simulated LLM")
+    parser.add_argument("--cassette-mode", choices=["strict", "lenient"], default="lenient")
+    parser.add_argument("--idea", default="A task manager web app with user accounts and Stripe subscriptions")
+    parser.add_argument("--timeout", type=float, default=300)
+    parser.add_argument("--no-tracemalloc", dest="tracemalloc", action="store_false",
+                        help="Skip peak-memory tracking (lower overhead)")
+    parser.add_argument("--output", help="Result JSON path (default: benchmarks/results/<time>-<commit>.json)")
+    parser.add_argument("--compare", help="Previous result JSON to diff against")
+    args = parser.parse_args(argv)
+
+    if args.cassette:
+        args.cassette = str(Path(args.cassette).resolve())
+    workdir = Path(tempfile.mkdtemp(prefix="ai-factory-bench-"))
+    prepare_workdir(workdir)
+    os.environ.update({
+        "TELEMETRY_DB": str(workdir / "telemetry.db"),
+        "TRACE_LOG": str(workdir / "logs" / "trace.jsonl"),
+        "CREWAI_DISABLE_TELEMETRY": "true",
+        "OTEL_SDK_DISABLED": "true",
+    })
+    os.environ.pop("MONGODB_URI", None)
+    sys.path.insert(0, str(REPO_ROOT))
+    os.chdir(workdir)
+
+    if args.tracemalloc:
+        tracemalloc.start()
+    try:
+        runs = []
+        for index in range(args.runs):
+            run = run_once(args)
+            runs.append(run)
+            build = next(s for s in run["stages"] if s["stage"] == "build")
+            print(f"run {index + 1}/{args.runs}: build wall {build['wall_s']:.2f}s, cpu {build['cpu_s']:.2f}s")
+    finally:
+        if args.tracemalloc:
+            tracemalloc.stop()
+        os.chdir(REPO_ROOT)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    commit = git_commit()
+    result = {
+        "commit": commit,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": sys.version.split()[0],
+        "config": {k: v for k, v in vars(args).items() if k not in ("output", "compare")},
+        "summary": aggregate(runs),
+        "runs": runs,
+    }
+
+    output = Path(args.output) if args.output else RESULTS_DIR / f"{time.strftime('%Y%m%d-%H%M%S')}-{commit}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(result, indent=2), encoding="utf-8")
+
+    print(f"\n{'stage':<28}{'wall_s':>10}{'cpu_s':>10}{'peak_mb':>10}")
+    for name, m in result["summary"]["stages"].items():
+        print(f"{name:<28}{m['wall_s']:>10.3f}{m['cpu_s']:>10.3f}{m.get('peak_mem_mb', 0):>10.1f}")
+    print(f"\n{'phase':<28}{'wall_s':>10}{'llm_s':>10}{'app_s':>10}")
+    for name, m in result["summary"]["phases"].items():
+        print(f"{name:<28}{m['wall_s']:>10.3f}{m['simulated_llm_s']:>10.3f}{m['app_overhead_s']:>10.3f}")
+    print(f"\nSaved {output}")
+
+    if args.compare:
+        compare(result, args.compare)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,351 @@
+"""
+Content-addressed blob store for large session artifacts.
+
+A build leaves several multi-MB strings per session: the deployment kit, the
+retry context (which embeds the original code again), the extracted files and
+each phase report. Keeping them as plain values in st.session_state holds a
+copy per key for as long as the browser tab lives. Instead:
+
+- every artifact is stored once, keyed by the SHA-256 of its content, so the
+  same text under two keys (or in two sessions) costs one copy;
+- blobs are zlib-compressed; a blob that is still over BLOB_SPILL_KB after
+  compression goes straight to disk, and once memory holds more than
+  BLOB_MEMORY_MB the least recently used blobs follow it. Each process spills
+  into its own subdirectory of BLOB_DIR, so processes sharing the directory
+  never delete each other's files; a subdirectory untouched for twice the TTL
+  belongs to a process that is gone and is removed;
+- sessions hold only hashes (ArtifactMap) and reference-count what they hold;
+  a session not seen for BLOB_TTL_SECONDS has its references dropped, and
+  unreferenced blobs are deleted. Blobs a session marks with `keep()` (the
+  delivered kit) outlive that, up to BLOB_KEEP_TTL_SECONDS of inactivity, so
+  a finished build left open in a tab is still there when the user returns.
+
+A value whose blob was evicted reads as absent, like a missing key.
+
+This module has no Streamlit dependency so scripts can import it directly.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+import zlib
+from collections import Counter, OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Iterator, MutableMapping, Optional, Tuple, Union
+from uuid import uuid4
+
+DEFAULT_BLOB_DIR = "blobs"
+DEFAULT_SPILL_KB = 256
+DEFAULT_MEMORY_MB = 64
+DEFAULT_TTL_SECONDS = 2 * 3600
+DEFAULT_KEEP_TTL_SECONDS = 24 * 3600
+EVICT_INTERVAL_SECONDS = 60.0
+
+TEXT = "text"
+JSON = "json"
+
+
+def content_hash(data: Union[str, bytes]) -> str:
+    """SHA-256 hex digest of a text or bytes value (text is hashed as UTF-8)."""
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    return hashlib.sha256(data).hexdigest()
+
+
+class BlobStore:
+    """Deduplicated, compressed blobs in memory with LRU spill to disk."""
+
+    def __init__(
+        self,
+        directory: Union[str, Path] = DEFAULT_BLOB_DIR,
+        spill_bytes: int = DEFAULT_SPILL_KB * 1024,
+        memory_limit: int = DEFAULT_MEMORY_MB * 1024 * 1024,
+        ttl_seconds: float = DEFAULT_TTL_SECONDS,
+        keep_ttl_seconds: float = DEFAULT_KEEP_TTL_SECONDS,
+        level: int = 6,
+    ):
+        self.directory = Path(directory)
+        # This store's own spill files; other processes using `directory` have their own
+        self.spill_dir = self.directory / f"{os.getpid()}-{uuid4().hex[:8]}"
+        self.spill_bytes = max(0, int(spill_bytes))
+        self.memory_limit = max(0, int(memory_limit))
+        self.ttl_seconds = float(ttl_seconds)
+        self.keep_ttl_seconds = max(float(keep_ttl_seconds), self.ttl_seconds)
+        self.level = level
+        self._lock = threading.Lock()
+        self._memory: "OrderedDict[str, bytes]" = OrderedDict()  # digest -> compressed, LRU first
+        self._memory_bytes = 0
+        self._on_disk: Dict[str, int] = {}  # digest -> compressed size
+        self._raw_sizes: Dict[str, int] = {}
+        self._refs: Dict[str, Counter] = {}
+        self._kept: Dict[str, set] = {}  # owner -> digests that outlive the idle TTL
+        self._seen: Dict[str, float] = {}
+        self._last_evict = 0.0
+        self._stats = {"puts": 0, "dedup_hits": 0, "spilled": 0, "evicted": 0}
+
+    # -- storage ---------------------------------------------------------------
+
+    def _path(self, digest: str) -> Path:
+        return self.spill_dir / digest[:2] / f"{digest}.z"
+
+    def _spill(self, digest: str, compressed: bytes) -> None:
+        path = self._path(digest)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp.write_bytes(compressed)
+        os.replace(tmp, path)
+        self._on_disk[digest] = len(compressed)
+        self._stats["spilled"] += 1
+
+    def _shrink(self) -> None:
+        """Move least recently used blobs to disk until memory is under the limit."""
+        while self._memory_bytes > self.memory_limit and self._memory:
+            digest, compressed = self._memory.popitem(last=False)
+            self._memory_bytes -= len(compressed)
+            self._spill(digest, compressed)
+
+    def put(self, data: Union[str, bytes], owner: Optional[str] = None) -> str:
+        """
+        Store a value once and return its content hash. With `owner`, the
+        reference is attached atomically so eviction cannot race the caller.
+        """
+        raw = data.encode("utf-8") if isinstance(data, str) else data
+        digest = content_hash(raw)
+        with self._lock:
+            self._stats["puts"] += 1
+            if owner is not None:
+                self._refs.setdefault(owner, Counter())[digest] += 1
+                self._seen[owner] = time.monotonic()
+            if digest in self._memory:
+                self._memory.move_to_end(digest)
+                self._stats["dedup_hits"] += 1
+                return digest
+            if digest in self._on_disk and self._path(digest).exists():
+                self._stats["dedup_hits"] += 1
+                return digest
+            compressed = zlib.compress(raw, self.level)
+            self._raw_sizes[digest] = len(raw)
+            if len(compressed) >= self.spill_bytes:
+                self._spill(digest, compressed)
+            else:
+                self._memory[digest] = compressed
+                self._memory_bytes += len(compressed)
+                self._shrink()
+        return digest
+
+    def get(self, digest: str) -> Optional[bytes]:
+        """The stored bytes, or None if the blob is unknown or was evicted."""
+        with self._lock:
+            compressed = self._memory.get(digest)
+            if compressed is not None:
+                self._memory.move_to_end(digest)
+            elif digest in self._on_disk:
+                try:
+                    compressed = self._path(digest).read_bytes()
+                except OSError:
+                    self._on_disk.pop(digest, None)
+                    return None
+        return zlib.decompress(compressed) if compressed is not None else None
+
+    def get_text(self, digest: str) -> Optional[str]:
+        raw = self.get(digest)
+        return raw.decode("utf-8") if raw is not None else None
+
+    def __contains__(self, digest: str) -> bool:
+        with self._lock:
+            return digest in self._memory or digest in self._on_disk
+
+    # -- references and eviction -----------------------------------------------
+
+    def attach(self, owner: str, digest: str) -> None:
+        """Record that `owner` (a session) holds `digest`; counted, so the same blob may be held twice."""
+        with self._lock:
+            self._refs.setdefault(owner, Counter())[digest] += 1
+            self._seen[owner] = time.monotonic()
+
+    def detach(self, owner: str, digest: str) -> None:
+        with self._lock:
+            refs = self._refs.get(owner)
+            if refs and refs[digest] > 0:
+                refs[digest] -= 1
+                if refs[digest] == 0:
+                    del refs[digest]
+                    self._kept.get(owner, set()).discard(digest)
+
+    def keep(self, owner: str, digest: str) -> None:
+        """Let a blob `owner` holds survive the idle TTL (up to the keep TTL) while the owner still holds it."""
+        with self._lock:
+            if self._refs.get(owner, {}).get(digest):
+                self._kept.setdefault(owner, set()).add(digest)
+
+    def touch(self, owner: str) -> None:
+        """Mark a session as active so its blobs survive the idle TTL."""
+        with self._lock:
+            self._seen[owner] = time.monotonic()
+
+    def release_owner(self, owner: str) -> None:
+        """Drop every reference held by `owner`; its blobs go at the next eviction."""
+        with self._lock:
+            self._refs.pop(owner, None)
+            self._kept.pop(owner, None)
+            self._seen.pop(owner, None)
+
+    def _delete(self, digest: str) -> None:
+        compressed = self._memory.pop(digest, None)
+        if compressed is not None:
+            self._memory_bytes -= len(compressed)
+        if self._on_disk.pop(digest, None) is not None:
+            try:
+                self._path(digest).unlink()
+            except OSError:
+                pass
+        self._raw_sizes.pop(digest, None)
+        self._stats["evicted"] += 1
+
+    def evict_idle(self, force: bool = False) -> int:
+        """
+        Drop sessions idle for longer than the TTL, then delete blobs no session
+        references. Also marks this store's spill directory as in use and
+        removes the spill directories of processes gone for twice the TTL. Runs
+        at most once a minute unless `force`. Returns the number of blobs deleted.
+        """
+        now = time.monotonic()
+        with self._lock:
+            if not force and now - self._last_evict < EVICT_INTERVAL_SECONDS:
+                return 0
+            self._last_evict = now
+            for owner, seen in list(self._seen.items()):
+                idle = now - seen
+                if idle <= self.ttl_seconds:
+                    continue
+                kept = self._kept.get(owner)
+                if kept and idle <= self.keep_ttl_seconds:
+                    # Idle but holding a kept blob: drop everything else
+                    refs = self._refs.get(owner, Counter())
+                    self._refs[owner] = Counter({d: n for d, n in refs.items() if d in kept})
+                    continue
+                self._refs.pop(owner, None)
+                self._kept.pop(owner, None)
+                del self._seen[owner]
+            live = set()
+            for refs in self._refs.values():
+                live.update(refs)
+            dead = [d for d in list(self._memory) + list(self._on_disk) if d not in live]
+            for digest in dead:
+                self._delete(digest)
+        if self.directory.is_dir():
+            if self.spill_dir.is_dir():
+                os.utime(self.spill_dir)
+            cutoff = time.time() - 2 * self.ttl_seconds
+            for path in self.directory.iterdir():
+                try:
+                    if path.is_dir() and path != self.spill_dir and path.stat().st_mtime < cutoff:
+                        shutil.rmtree(path, ignore_errors=True)
+                except OSError:
+                    pass
+        return len(dead)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Current store state for display."""
+        with self._lock:
+            return {
+                "blobs": len(self._memory) + len(self._on_disk),
+                "memory_mb": round(self._memory_bytes / 1e6, 2),
+                "disk_mb": round(sum(self._on_disk.values()) / 1e6, 2),
+                "raw_mb": round(sum(self._raw_sizes.values()) / 1e6, 2),
+                "sessions": len(self._seen),
+                **self._stats,
+            }
+
+
+class ArtifactMap(MutableMapping):
+    """
+    Dict-like view of one session's artifacts: values are stored in the
+    BlobStore and only (hash, kind) pairs are kept here. Text is stored as
+    is; other values as JSON. An evicted value reads as a missing key.
+    """
+
+    def __init__(self, store: BlobStore, owner: str, initial: Optional[Dict[str, Any]] = None):
+        self._store = store
+        self._owner = owner
+        self._entries: Dict[str, Tuple[str, str]] = {}
+        if initial:
+            self.update(initial)
+
+    def __getitem__(self, key: str) -> Any:
+        digest, kind = self._entries[key]
+        raw = self._store.get(digest)
+        if raw is None:
+            del self._entries[key]
+            raise KeyError(key)
+        text = raw.decode("utf-8")
+        return text if kind == TEXT else json.loads(text)
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        kind = TEXT if isinstance(value, str) else JSON
+        digest = self._store.put(value if kind == TEXT else json.dumps(value), owner=self._owner)
+        old = self._entries.get(key)
+        self._entries[key] = (digest, kind)
+        if old is not None:
+            self._store.detach(self._owner, old[0])
+
+    def __delitem__(self, key: str) -> None:
+        digest, _ = self._entries.pop(key)
+        self._store.detach(self._owner, digest)
+
+    def __contains__(self, key: object) -> bool:
+        entry = self._entries.get(key)  # type: ignore[arg-type]
+        return entry is not None and entry[0] in self._store
+
+    def __iter__(self) -> Iterator[str]:
+        return iter([key for key in list(self._entries) if key in self])
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def clear(self) -> None:
+        for digest, _ in self._entries.values():
+            self._store.detach(self._owner, digest)
+        self._entries.clear()
+
+    def keep(self, key: str) -> None:
+        """Keep this artifact past the session idle TTL (see BlobStore.keep)."""
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._store.keep(self._owner, entry[0])
+
+    def digest(self, key: str) -> Optional[str]:
+        """Content hash of an artifact, usable as a cheap cache key."""
+        entry = self._entries.get(key)
+        return entry[0] if entry is not None else None
+
+    def __repr__(self) -> str:
+        return f"ArtifactMap({ {key: digest[:12] for key, (digest, _) in self._entries.items()} })"
+
+
+_STORE: Optional[BlobStore] = None
+_STORE_LOCK = threading.Lock()
+
+
+def get_blob_store(**config: Any) -> BlobStore:
+    """
+    Process-wide blob store singleton. The first caller's config wins; unset
+    values fall back to BLOB_DIR / BLOB_SPILL_KB / BLOB_MEMORY_MB /
+    BLOB_TTL_SECONDS / BLOB_KEEP_TTL_SECONDS environment variables, then to the defaults.
+    """
+    global _STORE
+    with _STORE_LOCK:
+        if _STORE is None:
+            _STORE = BlobStore(
+                directory=config.get("directory") or os.getenv("BLOB_DIR", DEFAULT_BLOB_DIR),
+                spill_bytes=int(float(config.get("spill_kb") or os.getenv("BLOB_SPILL_KB", DEFAULT_SPILL_KB)) * 1024),
+                memory_limit=int(float(config.get("memory_mb") or os.getenv("BLOB_MEMORY_MB", DEFAULT_MEMORY_MB))
+                                 * 1024 * 1024),
+                ttl_seconds=float(config.get("ttl_seconds") or os.getenv("BLOB_TTL_SECONDS", DEFAULT_TTL_SECONDS)),
+                keep_ttl_seconds=float(config.get("keep_ttl_seconds")
+                                       or os.getenv("BLOB_KEEP_TTL_SECONDS", DEFAULT_KEEP_TTL_SECONDS)),
+            )
+        return _STORE
@@ -0,0 +1,294 @@
+"""
+Admission control for builds across Streamlit sessions.
+
+All sessions share one process, so without a gate every "Build" click starts
+another crew thread and its post-phases. The scheduler admits at most
+MAX_CONCURRENT_BUILDS builds at once and queues the rest:
+
+- fair queuing: waiting builds are interleaved round-robin by owner (a user,
+  or a browser session when users are anonymous), so one user queueing
+  several builds cannot starve the others;
+- priority: interactive work (strategy sessions) is always dispatched before
+  queued builds and has INTERACTIVE_SLOTS of extra capacity, so it never
+  waits behind a long build;
+- overload: past BUILD_QUEUE_LIMIT waiting builds, `submit()` raises
+  BuildQueueFull instead of piling up threads and memory;
+- every waiting ticket gets a queue position and an ETA from the recent
+  build durations.
+
+Tickets are polled, not blocked on, to fit Streamlit reruns: a session
+submits (idempotently, keeping its place), polls until granted, heartbeats
+while running, and releases when done. Tickets whose holder stops polling or
+heartbeating (closed tab) are reclaimed after a lease.
+
+This module has no Streamlit dependency so scripts can import it directly.
+"""
+
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional
+from uuid import uuid4
+
+DEFAULT_MAX_CONCURRENT_BUILDS = 2
+DEFAULT_INTERACTIVE_SLOTS = 2
+DEFAULT_QUEUE_LIMIT = 20
+DEFAULT_BUILD_SECONDS = 180.0
+DEFAULT_INTERACTIVE_SECONDS = 30.0
+
+BUILD = "build"
+INTERACTIVE = "interactive"
+
+
+class BuildQueueFull(Exception):
+    """The build queue is at its limit; try again later."""
+
+
+class BuildTicket:
+    """One unit of admitted (or waiting) work."""
+
+    def __init__(self, owner: str, kind: str, label: str = "", key: Optional[str] = None):
+        self.id = uuid4().hex
+        self.key = key
+        self.owner = owner
+        self.kind = kind
+        self.label = label
+        self.submitted = time.time()
+        self.granted_at: Optional[float] = None
+        self.seen = time.monotonic()
+
+    @property
+    def granted(self) -> bool:
+        return self.granted_at is not None
+
+
+class BuildScheduler:
+    """Bounded, fair, priority-aware admission for builds and interactive calls."""
+
+    def __init__(
+        self,
+        max_builds: int = DEFAULT_MAX_CONCURRENT_BUILDS,
+        interactive_slots: int = DEFAULT_INTERACTIVE_SLOTS,
+        queue_limit: int = DEFAULT_QUEUE_LIMIT,
+        lease_seconds: float = 900.0,
+        abandon_seconds: float = 60.0,
+    ):
+        self.max_builds = max(1, int(max_builds))
+        self.interactive_slots = max(0, int(interactive_slots))
+        self.queue_limit = max(1, int(queue_limit))
+        self.lease_seconds = lease_seconds
+        self.abandon_seconds = abandon_seconds
+        self._lock = threading.Lock()
+        self._waiting: List[BuildTicket] = []
+        self._running: Dict[str, BuildTicket] = {}
+        self._last_grant: Dict[str, float] = {}
+        self._durations: Dict[str, Deque[float]] = {BUILD: deque(maxlen=20), INTERACTIVE: deque(maxlen=20)}
+        self._stats = {"admitted": 0, "rejected": 0, "reclaimed": 0}
+
+    # -- queue order -----------------------------------------------------------
+
+    def _running_count(self, kind: Optional[str] = None, owner: Optional[str] = None) -> int:
+        return sum(
+            1 for t in self._running.values()
+            if (kind is None or t.kind == kind) and (owner is None or t.owner == owner)
+        )
+
+    def _ordered(self, kind: str) -> List[BuildTicket]:
+        """
+        Dispatch order for waiting tickets of `kind`. Builds are round-robin
+        by owner: an owner's n-th waiting build (counting the ones already
+        running) ranks behind every other owner's earlier ones.
+        """
+        tickets = sorted((t for t in self._waiting if t.kind == kind), key=lambda t: t.submitted)
+        if kind != BUILD:
+            return tickets
+        ranks: Dict[str, int] = {}
+        keyed = []
+        for t in tickets:
+            rank = ranks.get(t.owner, self._running_count(BUILD, t.owner))
+            ranks[t.owner] = rank + 1
+            keyed.append(((rank, self._last_grant.get(t.owner, 0.0), t.submitted), t))
+        return [t for _, t in sorted(keyed, key=lambda item: item[0])]
+
+    def _expected_seconds(self, kind: str) -> float:
+        recent = self._durations[kind]
+        if recent:
+            return sum(recent) / len(recent)
+        return DEFAULT_BUILD_SECONDS if kind == BUILD else DEFAULT_INTERACTIVE_SECONDS
+
+    # -- dispatch --------------------------------------------------------------
+
+    def _reclaim(self) -> None:
+        now = time.monotonic()
+        for ticket in list(self._running.values()):
+            if now - ticket.seen > self.lease_seconds:
+                del self._running[ticket.id]
+                self._stats["reclaimed"] += 1
+        stale = [t for t in self._waiting if now - t.seen > self.abandon_seconds]
+        for ticket in stale:
+            self._waiting.remove(ticket)
+            self._stats["reclaimed"] += 1
+
+    def _grant(self, ticket: BuildTicket) -> None:
+        self._waiting.remove(ticket)
+        ticket.granted_at = time.time()
+        ticket.seen = time.monotonic()
+        self._running[ticket.id] = ticket
+        self._last_grant[ticket.owner] = ticket.granted_at
+        self._stats["admitted"] += 1
+
+    def _dispatch(self) -> None:
+        """Admit waiting tickets while there is capacity: interactive first, then fair builds."""
+        self._reclaim()
+        capacity = self.max_builds + self.interactive_slots
+        for ticket in self._ordered(INTERACTIVE):
+            if len(self._running) >= capacity:
+                break
+            self._grant(ticket)
+        while self._running_count(BUILD) < self.max_builds and len(self._running) < capacity:
+            queue = self._ordered(BUILD)
+            if not queue:
+                break
+            self._grant(queue[0])
+
+    # -- public API ------------------------------------------------------------
+
+    def submit(self, owner: str, kind: str = BUILD, label: str = "", key: Optional[str] = None) -> BuildTicket:
+        """
+        Queue work for `owner` (the unit of fairness, e.g. a user). With a
+        `key` (e.g. a browser session), resubmitting while that key's ticket
+        of the same kind is waiting or running returns it, so reruns keep
+        their place. Raises BuildQueueFull when too many builds are waiting.
+        """
+        with self._lock:
+            if key is not None:
+                for ticket in list(self._running.values()) + self._waiting:
+                    if ticket.key == key and ticket.kind == kind:
+                        ticket.seen = time.monotonic()
+                        return ticket
+            self._reclaim()
+            if kind == BUILD and sum(1 for t in self._waiting if t.kind == BUILD) >= self.queue_limit:
+                self._stats["rejected"] += 1
+                raise BuildQueueFull(
+                    f"{self.queue_limit} builds are already waiting; please try again in a few minutes."
+                )
+            ticket = BuildTicket(owner, kind, label, key)
+            self._waiting.append(ticket)
+            self._dispatch()
+            return ticket
+
+    def poll(self, ticket: BuildTicket) -> Dict[str, Any]:
+        """
+        Heartbeat and status for a ticket:
+        {'granted', 'position' (0 = next), 'eta' (seconds until admission), 'running', 'lost'}.
+        `lost` means the ticket was reclaimed or released and must be resubmitted.
+        """
+        with self._lock:
+            ticket.seen = time.monotonic()
+            self._dispatch()
+            if ticket.id in self._running:
+                return {"granted": True, "position": 0, "eta": 0.0, "running": len(self._running), "lost": False}
+            if ticket not in self._waiting:
+                return {"granted": False, "position": 0, "eta": 0.0, "running": len(self._running), "lost": True}
+
+            queue = self._ordered(ticket.kind)
+            position = queue.index(ticket)
+            expected = self._expected_seconds(ticket.kind)
+            slots = self.max_builds if ticket.kind == BUILD else self.max_builds + self.interactive_slots
+            # Simulate slots freeing up: each running ticket needs `expected` minus its elapsed time
+            now = time.time()
+            free_at = sorted(
+                max(0.0, expected - (now - t.granted_at))
+                for t in self._running.values() if ticket.kind != BUILD or t.kind == BUILD
+            )[:slots]
+            free_at += [0.0] * (slots - len(free_at))
+            start = 0.0
+            for _ in range(position + 1):
+                free_at.sort()
+                start = free_at[0]
+                free_at[0] = start + expected
+            return {"granted": False, "position": position, "eta": round(start, 1),
+                    "running": len(self._running), "lost": False}
+
+    def heartbeat(self, ticket: Optional[BuildTicket]) -> None:
+        """Keep a running ticket's lease alive during long work."""
+        if ticket is None:
+            return
+        with self._lock:
+            ticket.seen = time.monotonic()
+
+    def release(self, ticket: Optional[BuildTicket]) -> None:
+        """Finish (or abandon) a ticket and admit the next waiter. Safe to call twice."""
+        if ticket is None:
+            return
+        with self._lock:
+            if self._running.pop(ticket.id, None) is not None and ticket.granted_at:
+                self._durations[ticket.kind].append(time.time() - ticket.granted_at)
+            elif ticket in self._waiting:
+                self._waiting.remove(ticket)
+            self._dispatch()
+
+    @contextmanager
+    def slot(self, owner: str, kind: str = BUILD, label: str = "", key: Optional[str] = None,
+             on_wait: Optional[Callable[[Dict[str, Any]], None]] = None,
+             poll_interval: float = 0.5) -> Iterator[BuildTicket]:
+        """
+        Blocking form for code that can wait in place: submit, wait for
+        admission, release on exit. `on_wait(status)` gets each poll result.
+        """
+        ticket = self.submit(owner, kind, label, key)
+        try:
+            while True:
+                status = self.poll(ticket)
+                if status["granted"]:
+                    break
+                if status["lost"]:
+                    ticket = self.submit(owner, kind, label, key)
+                    continue
+                if on_wait is not None:
+                    on_wait(status)
+                time.sleep(poll_interval)
+            yield ticket
+        finally:
+            self.release(ticket)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Current scheduler state for display."""
+        with self._lock:
+            self._dispatch()
+            return {
+                "running_builds": self._running_count(BUILD),
+                "running_interactive": self._running_count(INTERACTIVE),
+                "max_builds": self.max_builds,
+                "queued_builds": sum(1 for t in self._waiting if t.kind == BUILD),
+                "queued_interactive": sum(1 for t in self._waiting if t.kind == INTERACTIVE),
+                "queue_limit": self.queue_limit,
+                "avg_build_s": round(self._expected_seconds(BUILD), 1),
+                **self._stats,
+            }
+
+
+_SCHEDULER: Optional[BuildScheduler] = None
+_SCHEDULER_LOCK = threading.Lock()
+
+
+def get_build_scheduler(**config: Any) -> BuildScheduler:
+    """
+    Process-wide scheduler singleton. The first caller's config wins; unset
+    values fall back to MAX_CONCURRENT_BUILDS / INTERACTIVE_SLOTS /
+    BUILD_QUEUE_LIMIT environment variables, then to the defaults.
+    """
+    global _SCHEDULER
+    with _SCHEDULER_LOCK:
+        if _SCHEDULER is None:
+            _SCHEDULER = BuildScheduler(
+                max_builds=int(config.get("max_builds")
+                               or os.getenv("MAX_CONCURRENT_BUILDS", DEFAULT_MAX_CONCURRENT_BUILDS)),
+                interactive_slots=int(config.get("interactive_slots")
+                                      or os.getenv("INTERACTIVE_SLOTS", DEFAULT_INTERACTIVE_SLOTS)),
+                queue_limit=int(config.get("queue_limit")
+                                or os.getenv("BUILD_QUEUE_LIMIT", DEFAULT_QUEUE_LIMIT)),
+            )
+        return _SCHEDULER
@@ -0,0 +1,183 @@
+"""
+Record/replay "cassettes" of LLM kickoffs.
+
+A cassette is a gzip-compressed JSONL file (one per run, `cassettes/<run_id>.jsonl.gz`):
+a header line, then one entry per kickoff:
+
+    {"hash", "phase", "model", "prompt_chars", "raw", "usage": {...}, "latency", "recorded_at"}
+
+Requests are matched by a SHA-256 over phase, model and the full prompt.
+Replay modes:
+- strict: every kickoff must match a recorded hash, otherwise CassetteMiss;
+- lenient: on a hash miss, serve the next unused recording for the same phase
+  (prompts that embed timestamps or edited context still replay).
+
+Enable through the kickoff backend seam (see llm_backend.py):
+
+    AI_FACTORY_LLM_BACKEND=record   CASSETTE_DIR=cassettes
+    AI_FACTORY_LLM_BACKEND=replay   LLM_CASSETTE=cassettes/<run_id>.jsonl.gz  LLM_CASSETTE_MODE=lenient
+
+Recording happens at kickoff granularity: the hierarchical build crew is one
+entry holding its final output, which is what every later phase consumes.
+
+This module has no Streamlit dependency so scripts can import it directly.
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from pathlib import Path
+from typing import Any, Deque, Dict, List, Optional
+
+from llm_backend import CrewResult, LiveBackend, UsageMetrics
+
+CASSETTE_VERSION = 1
+CASSETTE_DIR = os.getenv("CASSETTE_DIR", "cassettes")
+
+
+class CassetteMiss(Exception):
+    """Replay found no recording for a request (strict mode, or phase exhausted)."""
+
+
+def request_hash(phase: str, model: Optional[str], prompt_text: str) -> str:
+    payload = json.dumps({"phase": phase, "model": model or "", "prompt": prompt_text}, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def cassette_path(run_id: str, directory: Optional[str] = None) -> Path:
+    return Path(directory or CASSETTE_DIR) / f"{run_id}.jsonl.gz"
+
+
+def read_cassette(path: str | Path) -> List[Dict[str, Any]]:
+    """Entries of a cassette, in recording order (header skipped)."""
+    entries = []
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if "cassette_version" not in record:
+                entries.append(record)
+    return entries
+
+
+def _usage_dict(result: Any) -> Dict[str, int]:
+    usage = getattr(result, "token_usage", None)
+    return {
+        key: int(getattr(usage, key, 0) or 0)
+        for key in ("prompt_tokens", "completion_tokens", "cached_prompt_tokens")
+    }
+
+
+def _raw_text(result: Any) -> str:
+    tasks_output = getattr(result, "tasks_output", None)
+    if tasks_output:
+        first = tasks_output[0]
+        return str(getattr(first, "raw", first))
+    return str(getattr(result, "raw", result))
+
+
+class RecordingBackend:
+    """Passes kickoffs to `inner` and appends each request/response to the run's cassette."""
+
+    name = "record"
+
+    def __init__(self, inner: Any = None, directory: Optional[str] = None):
+        self.inner = inner or LiveBackend()
+        self.directory = directory or CASSETTE_DIR
+        self._lock = threading.Lock()
+
+    def path_for(self, run_id: Optional[str]) -> Path:
+        return cassette_path(run_id or "unassigned", self.directory)
+
+    def kickoff(self, crew: Any, settings: Dict[str, Any], prompt_text: str) -> Any:
+        started = time.time()
+        result = self.inner.kickoff(crew, settings, prompt_text)
+        phase = settings.get("phase", "default")
+        entry = {
+            "hash": request_hash(phase, settings.get("model"), prompt_text),
+            "phase": phase,
+            "model": settings.get("model"),
+            "prompt_chars": len(prompt_text),
+            "raw": _raw_text(result),
+            "usage": _usage_dict(result),
+            "latency": round(time.time() - started, 3),
+            "recorded_at": started,
+        }
+        path = self.path_for(settings.get("run_id"))
+        with self._lock:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            is_new = not path.exists()
+            # Each append is its own gzip member; gzip readers concatenate them
+            with gzip.open(path, "at", encoding="utf-8") as f:
+                if is_new:
+                    f.write(json.dumps({"cassette_version": CASSETTE_VERSION, "run_id": settings.get("run_id"),
+                                        "created": started}) + "\n")
+                f.write(json.dumps(entry) + "\n")
+        return result
+
+
+class ReplayBackend:
+    """Serves recorded responses instead of calling the LLM."""
+
+    name = "replay"
+
+    def __init__(self, path: str | Path, strict: bool = True, realtime: bool = False):
+        self.path = Path(path)
+        self.strict = strict
+        self.realtime = realtime
+        self._lock = threading.Lock()
+        self._by_hash: Dict[str, Deque[Dict[str, Any]]] = defaultdict(deque)
+        self._by_phase: Dict[str, Deque[Dict[str, Any]]] = defaultdict(deque)
+        for entry in read_cassette(self.path):
+            self._by_hash[entry["hash"]].append(entry)
+            self._by_phase[entry["phase"]].append(entry)
+        self.calls: List[Dict[str, Any]] = []
+
+    def _take(self, entry: Dict[str, Any]) -> None:
+        """Mark an entry used in both indexes."""
+        for index in (self._by_hash[entry["hash"]], self._by_phase[entry["phase"]]):
+            try:
+                index.remove(entry)
+            except ValueError:
+                pass
+
+    def kickoff(self, crew: Any, settings: Dict[str, Any], prompt_text: str) -> CrewResult:
+        phase = settings.get("phase", "default")
+        key = request_hash(phase, settings.get("model"), prompt_text)
+        with self._lock:
+            matched = bool(self._by_hash.get(key))
+            if matched:
+                entry = self._by_hash[key][0]
+            elif not self.strict and self._by_phase.get(phase):
+                entry = self._by_phase[phase][0]
+            else:
+                raise CassetteMiss(
+                    f"No recorded response for phase '{phase}' (hash {key[:12]}) in {self.path.name}"
+                    + ("" if self.strict else " — phase exhausted")
+                )
+            self._take(entry)
+            self.calls.append({"phase": phase, "latency": entry.get("latency", 0.0) if self.realtime else 0.0,
+                               "matched": "hash" if matched else "phase", "response_chars": len(entry["raw"])})
+        if self.realtime:
+            time.sleep(entry.get("latency", 0.0))
+        return CrewResult(entry["raw"], UsageMetrics(**entry.get("usage", {})))
+
+
+def backend_from_env() -> Any:
+    """Backend for AI_FACTORY_LLM_BACKEND=record|replay, configured from the environment."""
+    choice = os.getenv("AI_FACTORY_LLM_BACKEND", "").strip().lower()
+    if choice == "replay":
+        path = os.getenv("LLM_CASSETTE")
+        if not path:
+            raise ValueError("AI_FACTORY_LLM_BACKEND=replay needs LLM_CASSETTE=<path to .jsonl.gz>")
+        return ReplayBackend(
+            path,
+            strict=os.getenv("LLM_CASSETTE_MODE", "strict").strip().lower() != "lenient",
+            realtime=os.getenv("LLM_CASSETTE_REALTIME", "").strip().lower() in ("1", "true", "yes"),
+        )
+    return RecordingBackend()
@@ -9,19 +9,22 @@ print("\n" + "="*60)
 print("DIAGNOSTIC: Checking if Improvements Activated")
 print("="*60)
 
-# Check if session state has our keys
-if 'final_output' in st.session_state:
-    print("✅ final_output exists in session_state")
-    print(f"   Length: {len(st.session_state.final_output)} characters")
+# Large artifacts live in the blob store; session_state.artifacts maps names to hashes
+artifacts = st.session_state.get('artifacts', {})
+
+if 'final_output' in artifacts:
+    print("✅ final_output exists in session artifacts")
+    print(f"   Length: {len(artifacts['final_output'])} characters")
 else:
-    print("❌ final_output NOT in session_state (Improvement #1 failed)")
+    print("❌ final_output NOT in session artifacts (Improvement #1 failed)")
 
-if 'original_files' in st.session_state:
-    print("✅ original_files exists in session_state")
-    print(f"   Files extracted: {len(st.session_state.original_files)}")
-    print(f"   Files: {list(st.session_state.original_files.keys())}")
+if 'original_files' in artifacts:
+    original_files = artifacts['original_files']
+    print("✅ original_files exists in session artifacts")
+    print(f"   Files extracted: {len(original_files)}")
+    print(f"   Files: {list(original_files.keys())}")
 else:
-    print("❌ original_files NOT in session_state (extraction failed)")
+    print("❌ original_files NOT in session artifacts (extraction failed)")
 
 if 'files_to_fix' in st.session_state:
     print("✅ files_to_fix exists in session_state")
@@ -29,18 +32,19 @@ if 'files_to_fix' in st.session_state:
 else:
     print("❌ files_to_fix NOT in session_state")
 
-if 'retry_context' in st.session_state:
-    print("✅ retry_context exists in session_state")
-    if "SURGICAL FIX MODE" in st.session_state.retry_context:
+if 'retry_context' in artifacts:
+    retry_context = artifacts['retry_context']
+    print("✅ retry_context exists in session artifacts")
+    if "SURGICAL FIX MODE" in retry_context:
         print("   ✅ Contains 'SURGICAL FIX MODE'")
     else:
         print("   ❌ Does NOT contain 'SURGICAL FIX MODE'")
     
-    if "ORIGINAL CODE" in st.session_state.retry_context:
+    if "ORIGINAL CODE" in retry_context:
         print("   ✅ Contains 'ORIGINAL CODE'")
     else:
         print("   ❌ Does NOT contain 'ORIGINAL CODE'")
 else:
-    print("❌ retry_context NOT in session_state")
+    print("❌ retry_context NOT in session artifacts")
 
 print("="*60 + "\n")
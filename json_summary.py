@@ -0,0 +1,375 @@
+"""
+Streaming summary of large JSON uploads.
+
+parse_uploaded_file used to load every .json upload and re-dump it with
+indent=2, which multiplies a large dataset's size in every prompt it reaches.
+Uploads up to JSON_INLINE_BYTES are still shown whole. Above that,
+summarize_json() reads the document in chunks, without building it in memory,
+and produces a bounded summary:
+
+- an inferred schema, one line per path (`$.items[].price`): the types seen
+  with their counts, number ranges, array lengths, string examples and
+  distinct counts (up to DISTINCT_CAP);
+- objects with more than MAX_KEYS distinct keys (ids or dates used as
+  keys) have all their keys folded into one `.*` path;
+- the first SAMPLE_ITEMS elements of the outermost arrays, compacted.
+
+Parsing is incremental on top of the standard library: one regex matches
+each token, and strings with escapes go through json's C scanstring.
+
+This module has no Streamlit dependency so scripts can import it directly.
+"""
+
+import codecs
+import json
+import os
+import re
+from json.decoder import scanstring
+from typing import IO, Any, Dict, Iterator, List, Optional, Tuple
+
+DEFAULT_INLINE_BYTES = 20_000
+READ_CHUNK = 64 * 1024
+DISTINCT_CAP = 50
+MAX_KEYS = 50
+MAX_PATHS = 80
+SAMPLE_ITEMS = 3
+SAMPLE_ARRAYS = 3
+SAMPLE_CHARS = 1500
+SAMPLE_STRING_CHARS = 80
+SAMPLE_LIST_ITEMS = 5
+EXAMPLES = 3
+
+LOOKAHEAD = 64
+
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+_TOKEN = re.compile(
+    r'[ \t\n\r]*(?:(?P<sep>[,:])[ \t\n\r]*)?(?:(?P<punct>[{}\[\]])|"(?P<string>[^"\\]*)"'
+    r"|(?P<number>-?(?:0|[1-9]\d*)(?:\.\d+)?(?:[eE][-+]?\d+)?)|(?P<literal>true|false|null)|(?P<quote>\"))"
+)
+_IDENTIFIER = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+_LITERALS = {"true": True, "false": False, "null": None}
+
+
+def inline_limit() -> int:
+    """Uploads up to this many bytes are included whole (JSON_INLINE_BYTES)."""
+    return int(os.getenv("JSON_INLINE_BYTES", DEFAULT_INLINE_BYTES))
+
+
+# ------------------------------------------------------------------------------
+# Incremental parsing
+# ------------------------------------------------------------------------------
+def iter_events(stream: IO) -> Iterator[Tuple[str, Any]]:
+    """
+    Parse events in document order, reading a binary or text stream READ_CHUNK
+    at a time: ('start_map' | 'end_map' | 'start_array' | 'end_array', None),
+    ('key', name) and ('value', scalar).
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")("replace")
+    buffer, pos, eof = "", 0, False
+    stack: List[bool] = []  # True for objects
+
+    def refill() -> None:
+        nonlocal buffer, pos, eof
+        data = stream.read(READ_CHUNK)
+        if not data:
+            eof = True
+            text = decoder.decode(b"", final=True)
+        else:
+            text = decoder.decode(data) if isinstance(data, bytes) else data
+        buffer, pos = buffer[pos:] + text, 0
+
+    while True:
+        # Keep a margin so numbers and literals are never cut at the end of a chunk
+        if not eof and len(buffer) - pos < LOOKAHEAD:
+            refill()
+            continue
+        match = _TOKEN.match(buffer, pos)
+        if match is None:
+            rest = _WHITESPACE.match(buffer, pos).end()
+            if rest == len(buffer):
+                if eof:
+                    if stack:
+                        raise ValueError("Truncated JSON: unclosed object or array")
+                    return
+                pos = rest
+                continue
+            raise ValueError(f"Unexpected {buffer[rest]!r} in JSON")
+        kind = match.lastgroup
+        if kind == "quote":
+            # Escapes, or a string running past the buffer: the C scanner, refilling as needed
+            try:
+                value, end = scanstring(buffer, match.end())
+            except ValueError:
+                if eof:
+                    raise
+                refill()  # keeps the buffer from `pos`, so this token is matched again
+                continue
+            pos, kind = end, "string"
+        else:
+            pos = match.end()
+            value = match.group(kind)
+
+        if kind == "string":
+            # In an object, a string not preceded by ':' is a key
+            yield ("key" if stack and stack[-1] and match.group("sep") != ":" else "value", value)
+        elif kind == "number":
+            yield ("value", float(value) if "." in value or "e" in value or "E" in value else int(value))
+        elif kind == "literal":
+            yield ("value", _LITERALS[value])
+        elif value == "{":
+            stack.append(True)
+            yield ("start_map", None)
+        elif value == "[":
+            stack.append(False)
+            yield ("start_array", None)
+        else:
+            if not stack:
+                raise ValueError(f"Unbalanced {value!r} in JSON")
+            stack.pop()
+            yield ("end_map" if value == "}" else "end_array", None)
+
+
+# ------------------------------------------------------------------------------
+# Schema inference
+# ------------------------------------------------------------------------------
+_TYPE_NAMES = {type(None): "null", bool: "boolean", int: "integer", float: "number", str: "string"}
+
+
+class _PathStats:
+    __slots__ = ("types", "minimum", "maximum", "lengths", "examples", "distinct", "overflow", "folded")
+
+    def __init__(self):
+        self.types: Dict[str, int] = {}
+        self.minimum: Optional[float] = None
+        self.maximum: Optional[float] = None
+        self.lengths: Optional[List[int]] = None  # [min, max, total, arrays]
+        self.examples: List[str] = []
+        self.distinct: set = set()
+        self.overflow = False
+        self.folded = False
+
+    def scalar(self, value: Any) -> None:
+        kind = _TYPE_NAMES[type(value)]
+        self.types[kind] = self.types.get(kind, 0) + 1
+        if kind in ("integer", "number"):
+            self.minimum = value if self.minimum is None else min(self.minimum, value)
+            self.maximum = value if self.maximum is None else max(self.maximum, value)
+        elif kind == "string":
+            if len(self.examples) < EXAMPLES and value not in self.examples:
+                self.examples.append(value)
+            if not self.overflow:
+                self.distinct.add(value)
+                if len(self.distinct) > DISTINCT_CAP:
+                    self.overflow, self.distinct = True, set()
+
+    def container(self, kind: str) -> None:
+        self.types[kind] = self.types.get(kind, 0) + 1
+
+    def array_length(self, length: int) -> None:
+        if self.lengths is None:
+            self.lengths = [length, length, 0, 0]
+        self.lengths[0] = min(self.lengths[0], length)
+        self.lengths[1] = max(self.lengths[1], length)
+        self.lengths[2] += length
+        self.lengths[3] += 1
+
+    def merge(self, other: "_PathStats") -> None:
+        for kind, count in other.types.items():
+            self.types[kind] = self.types.get(kind, 0) + count
+        if other.minimum is not None:
+            self.minimum = other.minimum if self.minimum is None else min(self.minimum, other.minimum)
+            self.maximum = other.maximum if self.maximum is None else max(self.maximum, other.maximum)
+        if other.lengths:
+            if self.lengths is None:
+                self.lengths = list(other.lengths)
+            else:
+                self.lengths = [min(self.lengths[0], other.lengths[0]), max(self.lengths[1], other.lengths[1]),
+                                self.lengths[2] + other.lengths[2], self.lengths[3] + other.lengths[3]]
+        for example in other.examples:
+            if len(self.examples) < EXAMPLES and example not in self.examples:
+                self.examples.append(example)
+        if not self.overflow:
+            if other.overflow:
+                self.overflow, self.distinct = True, set()
+            else:
+                self.distinct |= other.distinct
+                if len(self.distinct) > DISTINCT_CAP:
+                    self.overflow, self.distinct = True, set()
+        self.folded = self.folded or other.folded
+
+    def describe(self) -> str:
+        parts = [" | ".join(f"{kind} ×{count:,}" for kind, count in self.types.items())]
+        if self.minimum is not None:
+            parts.append(f"{self.minimum:g}..{self.maximum:g}")
+        if self.lengths:
+            low, high, total, arrays = self.lengths
+            parts.append(f"length {low:,}" if low == high else f"length {low:,}..{high:,} (avg {total / arrays:.1f})")
+        if self.examples:
+            distinct = f"{DISTINCT_CAP}+" if self.overflow else f"{len(self.distinct):,}"
+            shown = ", ".join(json.dumps(e[:40] + ("…" if len(e) > 40 else ""), ensure_ascii=False)
+                              for e in self.examples)
+            parts.append(f"{distinct} distinct, e.g. {shown}")
+        if self.folded:
+            parts.append(f"more than {MAX_KEYS} distinct keys, folded into .*")
+        return "; ".join(parts)
+
+
+class _SampleBuilder:
+    """Rebuilds one array element from events, truncating long strings and lists."""
+
+    def __init__(self, target: str):
+        self.target = target  # path of the array being sampled
+        self.stack: List[Any] = []
+        self.keys: List[Optional[str]] = []
+        self.result: Any = None
+        self.done = False
+
+    def _add(self, value: Any) -> None:
+        if not self.stack:
+            self.result, self.done = value, True
+            return
+        parent = self.stack[-1]
+        if isinstance(parent, list):
+            if len(parent) < SAMPLE_LIST_ITEMS:
+                parent.append(value)
+            elif len(parent) == SAMPLE_LIST_ITEMS:
+                parent.append("…")
+        else:
+            parent[self.keys[-1]] = value
+
+    def event(self, kind: str, value: Any) -> None:
+        if kind in ("start_map", "start_array"):
+            self.stack.append({} if kind == "start_map" else [])
+            self.keys.append(None)
+        elif kind in ("end_map", "end_array"):
+            self.keys.pop()
+            self._add(self.stack.pop())
+        elif kind == "key":
+            self.keys[-1] = value
+        else:
+            if isinstance(value, str) and len(value) > SAMPLE_STRING_CHARS:
+                value = value[:SAMPLE_STRING_CHARS] + "…"
+            self._add(value)
+
+
+def _child(path: str, key: str) -> str:
+    return f"{path}.{key}" if key == "*" or _IDENTIFIER.match(key) else f"{path}[{json.dumps(key, ensure_ascii=False)}]"
+
+
+def _fold(stats: Dict[str, Any], samples: Dict[str, List[Any]], child_keys: Dict[str, set], parent: str) -> None:
+    """Merge what was recorded under each key of `parent` into `parent.*`."""
+    star = parent + ".*"
+    prefixes = [_child(parent, key) for key in child_keys.get(parent, ())]
+
+    def renamed(path: str) -> Optional[str]:
+        for prefix in prefixes:
+            if path == prefix or (path.startswith(prefix) and path[len(prefix)] in ".["):
+                return star + path[len(prefix):]
+        return None
+
+    for path in list(stats):
+        target = renamed(path)
+        if target is not None:
+            entry = stats.pop(path)
+            if target in stats:
+                stats[target].merge(entry)
+            else:
+                stats[target] = entry
+    for path in list(samples):
+        if renamed(path) is not None:
+            del samples[path]  # arrays under data keys are not sampled
+    for path in list(child_keys):
+        target = renamed(path)
+        if target is not None:
+            child_keys.setdefault(target, set()).update(child_keys.pop(path))
+    child_keys[parent] = {"*"}
+    stats[parent].folded = True
+
+
+def summarize_json(stream: IO, name: str = "", size: Optional[int] = None) -> str:
+    """Schema and samples of a JSON document, read from `stream` without loading it."""
+    stats: Dict[str, _PathStats] = {}
+    child_keys: Dict[str, set] = {}
+    # One frame per open container: [path, is array, element count, sampled, element path]
+    frames: List[List[Any]] = []
+    samples: Dict[str, List[Any]] = {}
+    child_paths: Dict[Tuple[str, str], str] = {}
+    builder: Optional[_SampleBuilder] = None
+    pending_path = "$"
+
+    for kind, value in iter_events(stream):
+        if builder is not None:
+            builder.event(kind, value)
+            if builder.done:
+                samples[builder.target].append(builder.result)
+                builder = None
+        if kind == "key":
+            parent = frames[-1][0]
+            keys = child_keys.setdefault(parent, set())
+            if stats[parent].folded:
+                value = "*"
+            elif value not in keys:
+                if len(keys) >= MAX_KEYS:
+                    # Keys are data (ids, dates), not a schema: fold them all, including those already seen
+                    _fold(stats, samples, child_keys, parent)
+                    child_paths.clear()
+                    value = "*"
+                else:
+                    keys.add(value)
+            pending_path = child_paths.get((parent, value))
+            if pending_path is None:
+                pending_path = child_paths[(parent, value)] = _child(parent, value)
+            continue
+        if kind == "end_map" or kind == "end_array":
+            frame = frames.pop()
+            if frame[1]:
+                stats[frame[0]].array_length(frame[2])
+            continue
+
+        # A value or a new container, in an array or under the last key
+        if frames and frames[-1][1]:
+            parent = frames[-1]
+            parent[2] += 1
+            path = parent[4]
+            if builder is None and parent[3] and len(samples[parent[0]]) < SAMPLE_ITEMS:
+                builder = _SampleBuilder(parent[0])
+                builder.event(kind, value)
+                if builder.done:
+                    samples[builder.target].append(builder.result)
+                    builder = None
+        else:
+            path = pending_path
+        entry = stats.get(path)
+        if entry is None:
+            entry = stats[path] = _PathStats()
+        if kind == "value":
+            entry.scalar(value)
+        elif kind == "start_map":
+            entry.container("object")
+            frames.append([path, False, 0, False, None])
+        else:
+            entry.container("array")
+            # Sample the outermost arrays only (not arrays inside array elements or folded keys)
+            sampled = ("[]" not in path and ".*" not in path
+                       and (path in samples or len(samples) < SAMPLE_ARRAYS))
+            if sampled:
+                samples.setdefault(path, [])
+            frames.append([path, True, 0, sampled, path + "[]"])
+
+    size_note = f"{size / 1_048_576:.2f} MB, " if size else ""
+    lines = [f"JSON summary of {name or 'upload'} ({size_note}streamed; too large to include whole)",
+             "Schema - path: types ×count; ranges, lengths, examples:"]
+    paths = list(stats)
+    for path in paths[:MAX_PATHS]:
+        lines.append(f"- `{path}`: {stats[path].describe()}")
+    if len(paths) > MAX_PATHS:
+        lines.append(f"- … {len(paths) - MAX_PATHS} more paths")
+    for path, items in samples.items():
+        if not items:
+            continue
+        total = stats[path].lengths[2] if stats[path].lengths else len(items)
+        text = json.dumps(items, ensure_ascii=False, separators=(",", ":"), default=str)
+        if len(text) > SAMPLE_CHARS:
+            text = text[:SAMPLE_CHARS] + " …(truncated)"
+        lines.append(f"\nSample of `{path}` (first {len(items)} of {total:,} elements):\n```json\n{text}\n```")
+    return "\n".join(lines)
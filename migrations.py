@@ -0,0 +1,284 @@
+"""
+Versioned, one-shot data migrations for the agent store.
+
+Each migration is a numbered function registered with @migration. Applied
+versions are recorded in a ledger, so every migration runs once per store,
+ever:
+
+- MongoDB: the "schema_migrations" collection, with a lease document in
+  "schema_locks" so that only one replica migrates at a time (the others wait
+  for the lease, then find the work done);
+- JSON store: a ledger file (MIGRATIONS_LEDGER, default `migrations.json`)
+  guarded by an exclusive lock file.
+
+migrate_once() also remembers, per process, which stores are up to date:
+Streamlit re-executes app.py on every interaction and the reruns do no
+migration I/O at all.
+
+This module has no Streamlit dependency so scripts can import it directly.
+"""
+
+import json
+import logging
+import os
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+from uuid import uuid4
+
+logger = logging.getLogger(__name__)
+
+LOCK_TTL_SECONDS = 120
+LOCK_POLL_SECONDS = 0.5
+
+MONGO = "mongo"
+JSON = "json"
+
+
+class Migration:
+    def __init__(self, version: int, name: str, fn: Callable[[Dict[str, Any]], Optional[str]],
+                 backends: Tuple[str, ...]):
+        self.version = version
+        self.name = name
+        self.fn = fn
+        self.backends = backends
+
+
+MIGRATIONS: List[Migration] = []
+
+
+def migration(version: int, name: str, backends: Tuple[str, ...] = (MONGO, JSON)):
+    """Register `fn(context) -> optional note` as migration `version` for the given backends."""
+    def register(fn: Callable[[Dict[str, Any]], Optional[str]]):
+        if any(m.version == version for m in MIGRATIONS):
+            raise ValueError(f"Duplicate migration version {version}")
+        MIGRATIONS.append(Migration(version, name, fn, backends))
+        MIGRATIONS.sort(key=lambda m: m.version)
+        return fn
+    return register
+
+
+def _lock_owner() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid4().hex[:8]}"
+
+
+# ------------------------------------------------------------------------------
+# Ledgers
+# ------------------------------------------------------------------------------
+class MongoLedger:
+    """Applied versions in "schema_migrations"; a TTL lease in "schema_locks" serializes replicas."""
+
+    backend = MONGO
+
+    def __init__(self, db: Any):
+        self.db = db
+        self._ledger = db.get_collection("schema_migrations")
+        self._locks = db.get_collection("schema_locks")
+
+    def applied(self) -> set:
+        return {doc["_id"] for doc in self._ledger.find({}, {"_id": 1})}
+
+    def record(self, entry: Dict[str, Any]) -> None:
+        self._ledger.replace_one({"_id": entry["version"]}, {"_id": entry["version"], **entry}, upsert=True)
+
+    @contextmanager
+    def lock(self, timeout: float = LOCK_TTL_SECONDS) -> Iterator[None]:
+        from pymongo.errors import DuplicateKeyError
+
+        owner = _lock_owner()
+        deadline = time.monotonic() + timeout
+        while True:
+            now = time.time()
+            try:
+                # Matches only a missing or expired lease; a live one makes the upsert collide on _id
+                self._locks.find_one_and_update(
+                    {"_id": "migrations", "expires_at": {"$lt": now}},
+                    {"$set": {"owner": owner, "expires_at": now + LOCK_TTL_SECONDS}},
+                    upsert=True,
+                )
+                break
+            except DuplicateKeyError:
+                if time.monotonic() > deadline:
+                    raise TimeoutError("Timed out waiting for another process's migrations")
+                time.sleep(LOCK_POLL_SECONDS)
+        try:
+            yield
+        finally:
+            self._locks.delete_one({"_id": "migrations", "owner": owner})
+
+
+class FileLedger:
+    """Applied versions in a JSON file, guarded by an exclusive `<ledger>.lock` file."""
+
+    backend = JSON
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self._lock_path = self.path.with_suffix(self.path.suffix + ".lock")
+
+    def _entries(self) -> List[Dict[str, Any]]:
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return []
+        return data if isinstance(data, list) else []
+
+    def applied(self) -> set:
+        return {entry["version"] for entry in self._entries()}
+
+    def record(self, entry: Dict[str, Any]) -> None:
+        entries = [e for e in self._entries() if e["version"] != entry["version"]] + [entry]
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(f".{os.getpid()}.tmp")
+        tmp.write_text(json.dumps(sorted(entries, key=lambda e: e["version"]), indent=2), encoding="utf-8")
+        os.replace(tmp, self.path)
+
+    @contextmanager
+    def lock(self, timeout: float = LOCK_TTL_SECONDS) -> Iterator[None]:
+        deadline = time.monotonic() + timeout
+        self._lock_path.parent.mkdir(parents=True, exist_ok=True)
+        while True:
+            try:
+                fd = os.open(self._lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                os.write(fd, _lock_owner().encode("utf-8"))
+                os.close(fd)
+                break
+            except FileExistsError:
+                try:
+                    # A lock left behind by a crashed process expires
+                    if time.time() - self._lock_path.stat().st_mtime > LOCK_TTL_SECONDS:
+                        self._lock_path.unlink()
+                        continue
+                except OSError:
+                    continue
+                if time.monotonic() > deadline:
+                    raise TimeoutError(f"Timed out waiting for {self._lock_path}")
+                time.sleep(LOCK_POLL_SECONDS)
+        try:
+            yield
+        finally:
+            try:
+                self._lock_path.unlink()
+            except OSError:
+                pass
+
+
+# ------------------------------------------------------------------------------
+# Runner
+# ------------------------------------------------------------------------------
+def pending_migrations(ledger: Any) -> List[Migration]:
+    applied = ledger.applied()
+    return [m for m in MIGRATIONS if ledger.backend in m.backends and m.version not in applied]
+
+
+def run_migrations(ledger: Any, context: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Apply every pending migration in version order under the ledger's lock,
+    recording each one as it completes. Returns the ledger entries written.
+    """
+    if not pending_migrations(ledger):
+        return []
+    done = []
+    with ledger.lock():
+        # Another process may have migrated while we waited for the lock
+        for m in pending_migrations(ledger):
+            started = time.perf_counter()
+            note = m.fn(context)
+            entry = {
+                "version": m.version,
+                "name": m.name,
+                "applied_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                "duration": round(time.perf_counter() - started, 3),
+                "note": note or "",
+            }
+            ledger.record(entry)
+            done.append(entry)
+    return done
+
+
+_MIGRATED: set = set()
+_GATE = threading.Lock()
+
+
+def migrate_once(key: str, ledger: Any, context: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    run_migrations() at most once per process for `key` (a store identity).
+    Later calls return [] without touching the store; a failed run is retried
+    by the next call.
+    """
+    if key in _MIGRATED:
+        return []
+    with _GATE:
+        if key in _MIGRATED:
+            return []
+        done = run_migrations(ledger, context)
+        _MIGRATED.add(key)
+    for entry in done:
+        logger.info("Migration %s (%s) applied in %ss. %s", entry["version"], entry["name"], entry["duration"], entry["note"])
+    return done
+
+
+# ------------------------------------------------------------------------------
+# Migrations. Context: {'db': pymongo database (mongo only), 'store': JsonAgentStore}
+# Never edit an applied migration; add a new version instead.
+# ------------------------------------------------------------------------------
+@migration(1, "import agents.json into an empty agents collection", backends=(MONGO,))
+def import_agents_file(context: Dict[str, Any]) -> str:
+    collection = context["db"].get_collection("agents")
+    if collection.count_documents({}, limit=1):
+        return "collection already populated"
+    agents = [{k: v for k, v in agent.items() if k != "_id"} for agent in context["store"].all()]
+    if agents:
+        collection.insert_many(agents)
+    return f"imported {len(agents)} agents"
+
+
+@migration(2, "index agents by id", backends=(MONGO,))
+def index_agent_ids(context: Dict[str, Any]) -> str:
+    from pymongo.errors import OperationFailure
+
+    collection = context["db"].get_collection("agents")
+    try:
+        collection.create_index("id", unique=True, name="agents_id")
+        return "unique index"
+    except OperationFailure:
+        # Older stores may hold duplicate ids; index them anyway
+        collection.create_index("id", name="agents_id")
+        return "non-unique index (duplicate ids present)"
+
+
+# Fields newer code expects on every profile (early agents were saved without them)
+PROFILE_DEFAULTS = {"allow_delegation": False}
+
+
+@migration(3, "backfill default profile fields")
+def backfill_profile_fields(context: Dict[str, Any]) -> str:
+    if context.get("db") is not None:
+        collection = context["db"].get_collection("agents")
+        updated = 0
+        for field, default in PROFILE_DEFAULTS.items():
+            updated += collection.update_many({field: {"$exists": False}}, {"$set": {field: default}}).modified_count
+        return f"{updated} field(s) set"
+    store = context["store"]
+    updated = 0
+    for agent in store.all():
+        missing = {field: default for field, default in PROFILE_DEFAULTS.items() if field not in agent}
+        if missing and agent.get("id"):
+            store.put({**agent, **missing})
+            updated += len(missing)
+    return f"{updated} field(s) set"
+
+
+@migration(4, "text index over agent profiles", backends=(MONGO,))
+def index_agent_text(context: Dict[str, Any]) -> str:
+    # Same field weighting as the JSON store's BM25 index (agent_search.FIELD_WEIGHTS)
+    context["db"].get_collection("agents").create_index(
+        [("role", "text"), ("goal", "text"), ("backstory", "text")],
+        weights={"role": 3, "goal": 2, "backstory": 1},
+        name="agents_text",
+    )
+    return "text index on role, goal, backstory"
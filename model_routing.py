@@ -0,0 +1,119 @@
+"""
+Per-agent and per-phase LLM routing for AI Factory.
+
+Every phase of the build declares the capability tier it needs. The resolver
+picks the cheapest catalog model that meets that tier, then applies any
+overrides stored on the agent document under `llm`:
+
+    {
+        "role": "Code Extractor",
+        ...
+        "llm": {
+            "model": "gpt-4o-mini",          # pin a model for every phase
+            "temperature": 0.1,
+            "max_tokens": 4000,
+            "timeout": 120,
+            "phases": {                      # or override a single phase
+                "qa_validation": {"tier": 3}
+            }
+        }
+    }
+
+This module has no Streamlit dependency so scripts can import it directly.
+"""
+
+from typing import Any, Dict, Optional
+
+# Capability tiers: 1 = fast/cheap, 2 = balanced, 3 = strongest reasoning.
+# Costs are USD per 1K tokens; cached input is prompt-prefix tokens served
+# from the provider's prompt cache.
+MODEL_CATALOG: Dict[str, Dict[str, Any]] = {
+    "gpt-4o-mini": {"tier": 1, "input_cost_per_1k": 0.00015, "cached_input_cost_per_1k": 0.000075,
+                    "output_cost_per_1k": 0.0006},
+    "gpt-4.1-mini": {"tier": 2, "input_cost_per_1k": 0.0004, "cached_input_cost_per_1k": 0.0001,
+                     "output_cost_per_1k": 0.0016},
+    "gpt-4.1": {"tier": 3, "input_cost_per_1k": 0.002, "cached_input_cost_per_1k": 0.0005,
+                "output_cost_per_1k": 0.008},
+    "gpt-4o": {"tier": 3, "input_cost_per_1k": 0.0025, "cached_input_cost_per_1k": 0.00125,
+               "output_cost_per_1k": 0.01},
+}
+
+# Default policy per build phase. High-volume phases (extraction, docs,
+# integration) stay on tier 1; the orchestrated build gets the strongest tier.
+PHASE_POLICIES: Dict[str, Dict[str, Any]] = {
+    "strategy": {"tier": 2, "temperature": 0.7, "max_tokens": 4000, "timeout": 180},
+    "code_extraction": {"tier": 1, "temperature": 0.1, "max_tokens": 8000, "timeout": 240},
+    "architecture": {"tier": 2, "temperature": 0.3, "max_tokens": 8000, "timeout": 300},
+    "build": {"tier": 3, "temperature": 0.2, "max_tokens": 16000, "timeout": 1800, "verbose": True},
+    "build_manifest": {"tier": 3, "temperature": 0.2, "max_tokens": 6000, "timeout": 300},
+    "build_files": {"tier": 3, "temperature": 0.2, "max_tokens": 12000, "timeout": 600},
+    "integration_check": {"tier": 1, "temperature": 0.1, "max_tokens": 4000, "timeout": 180},
+    "qa_validation": {"tier": 2, "temperature": 0.0, "max_tokens": 4000, "timeout": 240},
+    "code_supervision": {"tier": 2, "temperature": 0.1, "max_tokens": 6000, "timeout": 240},
+    "surgical_fix": {"tier": 3, "temperature": 0.0, "max_tokens": 4000, "timeout": 240},
+    "documentation": {"tier": 1, "temperature": 0.4, "max_tokens": 8000, "timeout": 240},
+}
+DEFAULT_PHASE_POLICY: Dict[str, Any] = {"tier": 1, "temperature": 0.3, "max_tokens": 4000, "timeout": 300}
+
+SETTING_KEYS = ("model", "temperature", "max_tokens", "timeout")
+
+
+def cheapest_model_for_tier(tier: int) -> str:
+    """Return the cheapest catalog model whose tier is at least `tier`."""
+    candidates = [
+        (info["input_cost_per_1k"] + info["output_cost_per_1k"], name)
+        for name, info in MODEL_CATALOG.items()
+        if info["tier"] >= tier
+    ]
+    if not candidates:
+        # Asked for more than the catalog offers: fall back to the strongest tier
+        top_tier = max(info["tier"] for info in MODEL_CATALOG.values())
+        return cheapest_model_for_tier(top_tier)
+    return min(candidates)[1]
+
+
+def resolve_llm_settings(profile: Dict[str, Any], phase: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Resolve model, temperature, max output tokens and timeout for one agent in one phase.
+
+    Precedence (lowest to highest): phase policy → profile `llm` → profile `llm.phases[phase]`.
+    A `tier` at any level re-selects the model unless a later level pins `model`.
+    """
+    policy = PHASE_POLICIES.get(phase, DEFAULT_PHASE_POLICY) if phase else DEFAULT_PHASE_POLICY
+    settings: Dict[str, Any] = {key: policy.get(key) for key in SETTING_KEYS if key != "model"}
+    tier = policy["tier"]
+    model = None
+
+    overrides = profile.get("llm") or {}
+    phase_overrides = (overrides.get("phases") or {}).get(phase or "", {})
+    for layer in (overrides, phase_overrides):
+        if layer.get("tier") is not None:
+            tier = int(layer["tier"])
+            model = None
+        if layer.get("model"):
+            model = layer["model"]
+        for key in ("temperature", "max_tokens", "timeout"):
+            if layer.get(key) is not None:
+                settings[key] = layer[key]
+
+    settings["model"] = model or cheapest_model_for_tier(tier)
+    settings["tier"] = MODEL_CATALOG.get(settings["model"], {}).get("tier", tier)
+    settings["phase"] = phase or "default"
+    settings["verbose"] = bool(policy.get("verbose", False))
+    return settings
+
+
+def estimate_cost(model: str, prompt_tokens: int, completion_tokens: int, cached_prompt_tokens: int = 0) -> float:
+    """
+    Estimate USD cost of a call; unknown models are priced at 0. The cached
+    part of the prompt (included in `prompt_tokens`) is billed at the cached rate.
+    """
+    info = MODEL_CATALOG.get(model)
+    if not info:
+        return 0.0
+    cached = min(max(cached_prompt_tokens, 0), prompt_tokens)
+    return (
+        (prompt_tokens - cached) / 1000 * info["input_cost_per_1k"]
+        + cached / 1000 * info.get("cached_input_cost_per_1k", info["input_cost_per_1k"])
+        + completion_tokens / 1000 * info["output_cost_per_1k"]
+    )
@@ -0,0 +1,383 @@
+"""
+MongoDB connection manager with a circuit breaker and a local mirror.
+
+Connecting used to happen on the first render (a blocking ping with a 5 s
+server-selection timeout), and a down cluster made every agent load or save
+stall again before falling back. Instead:
+
+- the client is created without connecting and a background thread pings the
+  cluster, so no script run ever waits for the database to come up;
+- a circuit breaker (closed → open → half-open) stops calls as soon as a
+  connection error is seen; while open, the background thread probes the
+  cluster every MONGO_BREAKER_RESET_SECONDS and closes the breaker when a ping
+  succeeds, running the on_connect callbacks (e.g. replaying offline writes);
+- callers go through `run(operation, fallback)`, which only touches MongoDB
+  while the breaker is closed and uses `fallback` otherwise; after a fallback
+  that did not trip the breaker, the next run() re-runs the callbacks first;
+- LocalMirror keeps a JSON copy of a collection's documents, refreshed after
+  every successful read, for reads (and queued writes) while MongoDB is down.
+
+Pool size and timeouts come from MONGO_MAX_POOL_SIZE, MONGO_MIN_POOL_SIZE,
+MONGO_CONNECT_TIMEOUT_MS, MONGO_SERVER_SELECTION_TIMEOUT_MS and
+MONGO_SOCKET_TIMEOUT_MS; the breaker from MONGO_BREAKER_FAILURES and
+MONGO_BREAKER_RESET_SECONDS.
+
+This module has no Streamlit dependency so scripts can import it directly.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from pymongo import MongoClient
+from pymongo.errors import ConnectionFailure, PyMongoError
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+DEFAULT_CLIENT_OPTIONS = {
+    "maxPoolSize": 20,
+    "minPoolSize": 0,
+    "connectTimeoutMS": 2000,
+    "serverSelectionTimeoutMS": 2000,
+    "socketTimeoutMS": 10000,
+}
+DEFAULT_FAILURE_THRESHOLD = 2
+DEFAULT_RESET_SECONDS = 30.0
+PROBE_INTERVAL_SECONDS = 1.0
+
+
+class CircuitBreaker:
+    """
+    Closed: calls go through, connection failures are counted. Open (after
+    `failure_threshold` consecutive failures): calls are refused until
+    `reset_timeout` has passed. Half-open: one trial is in flight; its
+    success closes the breaker, its failure opens it again.
+    """
+
+    def __init__(self, failure_threshold: int = DEFAULT_FAILURE_THRESHOLD,
+                 reset_timeout: float = DEFAULT_RESET_SECONDS):
+        self.failure_threshold = max(1, int(failure_threshold))
+        self.reset_timeout = float(reset_timeout)
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._stats = {"trips": 0, "refused": 0}
+        self.last_error: Optional[str] = None
+
+    @property
+    def state(self) -> str:
+        return self._state
+
+    def allow_request(self) -> bool:
+        with self._lock:
+            if self._state == CLOSED:
+                return True
+            self._stats["refused"] += 1
+            return False
+
+    def try_half_open(self) -> bool:
+        """Move an open breaker whose reset timeout has passed to half-open; True if it did."""
+        with self._lock:
+            if self._state == OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self._state = HALF_OPEN
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._state = CLOSED
+            self._failures = 0
+
+    def trip(self, error: Any = None) -> None:
+        """Open the breaker now (a failed ping is conclusive, no need to count)."""
+        with self._lock:
+            self.last_error = str(error) if error is not None else self.last_error
+            if self._state != OPEN:
+                self._stats["trips"] += 1
+            self._state = OPEN
+            self._opened_at = time.monotonic()
+
+    def record_failure(self, error: Any = None) -> None:
+        with self._lock:
+            self.last_error = str(error) if error is not None else self.last_error
+            self._failures += 1
+            if self._state == HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != OPEN:
+                    self._stats["trips"] += 1
+                self._state = OPEN
+                self._opened_at = time.monotonic()
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            retry_in = 0.0
+            if self._state == OPEN:
+                retry_in = max(0.0, self.reset_timeout - (time.monotonic() - self._opened_at))
+            return {"state": self._state, "failures": self._failures, "retry_in": round(retry_in, 1),
+                    "last_error": self.last_error, **self._stats}
+
+
+class MongoConnection:
+    """A lazily connected MongoClient behind a circuit breaker, probed from a background thread."""
+
+    def __init__(self, uri: str, db_name: str = "ai_factory",
+                 failure_threshold: int = DEFAULT_FAILURE_THRESHOLD,
+                 reset_timeout: float = DEFAULT_RESET_SECONDS, **client_options: Any):
+        self.uri = uri
+        self.db_name = db_name
+        self.options = {**DEFAULT_CLIENT_OPTIONS, **{k: v for k, v in client_options.items() if v is not None}}
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        # connect=False: no I/O here, the first ping happens on the background thread
+        self.client: Optional[MongoClient] = (
+            MongoClient(uri, connect=False, appname="ai-factory", retryWrites=True, retryReads=True, **self.options)
+            if uri else None
+        )
+        self._callbacks: Dict[str, Callable[[Any], None]] = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._connected = threading.Event()
+        self._probed = False
+        self._stop = threading.Event()
+        # Set when a connection error fell back while the breaker stayed closed:
+        # no reconnect will follow, so the next run() catches up instead
+        self._resync = threading.Event()
+
+    @property
+    def enabled(self) -> bool:
+        return self.client is not None
+
+    def on_connect(self, name: str, callback: Callable[[Any], None]) -> None:
+        """
+        Run `callback(database)` on the background thread every time the
+        connection (re)opens. Registering the same name again replaces the
+        callback (Streamlit reruns redefine it). Register before start().
+        """
+        with self._lock:
+            self._callbacks[name] = callback
+
+    def start(self) -> "MongoConnection":
+        """Start the background connect / probe loop (idempotent)."""
+        with self._lock:
+            if self.enabled and self._thread is None:
+                self._thread = threading.Thread(target=self._monitor, name="mongo-monitor", daemon=True)
+                self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _monitor(self) -> None:
+        while not self._stop.is_set():
+            if not self._probed or self.breaker.try_half_open():
+                self._probe()
+            self._stop.wait(PROBE_INTERVAL_SECONDS)
+
+    def _probe(self) -> None:
+        try:
+            self.client.admin.command("ping")
+        except PyMongoError as e:
+            self._connected.clear()
+            self.breaker.trip(e)
+        else:
+            self.breaker.record_success()
+            # Callbacks (e.g. replaying offline writes) finish before callers see the connection
+            self._resync.clear()
+            if not self._run_callbacks(self.client.get_database(self.db_name)):
+                self._resync.set()
+            self._connected.set()
+        finally:
+            self._probed = True
+
+    def _run_callbacks(self, database: Any) -> bool:
+        """Run every on_connect callback; False if any of them failed."""
+        ok = True
+        for name, callback in list(self._callbacks.items()):
+            try:
+                callback(database)
+            except Exception as e:
+                ok = False
+                logger.warning("MongoDB on_connect callback %r failed: %s", name, e)
+        return ok
+
+    def available(self) -> bool:
+        """True when MongoDB answered its last ping and the breaker is closed. Never blocks."""
+        return self.enabled and self._connected.is_set() and self.breaker.allow_request()
+
+    def wait(self, timeout: float) -> bool:
+        """Block up to `timeout` seconds for the first successful connection (for scripts, not the UI)."""
+        return self.enabled and self._connected.wait(timeout)
+
+    def database(self) -> Optional[Any]:
+        """The database handle while available, else None."""
+        return self.client.get_database(self.db_name) if self.available() else None
+
+    def run(self, operation: Callable[[Any], Any], fallback: Callable[[], Any]) -> Any:
+        """
+        `operation(database)` while MongoDB is available, `fallback()` otherwise.
+        A connection error counts against the breaker and also falls back;
+        other errors (bad queries, duplicate keys, ...) propagate.
+
+        A connection error below the breaker's threshold does not trip it, so
+        no reconnect (and no on_connect replay) follows. The next call re-runs
+        the on_connect callbacks before its operation, so writes the fallback
+        queued reach MongoDB in order.
+        """
+        database = self.database()
+        if database is None:
+            return fallback()
+        try:
+            if self._resync.is_set():
+                self._resync.clear()
+                if not self._run_callbacks(database):
+                    self._resync.set()
+            result = operation(database)
+        except ConnectionFailure as e:
+            self._resync.set()
+            self.breaker.record_failure(e)
+            if self.breaker.state == OPEN:
+                self._connected.clear()
+            return fallback()
+        self.breaker.record_success()
+        return result
+
+    def status(self) -> str:
+        """'disabled', 'connecting', 'up', 'down' or 'recovering'."""
+        if not self.enabled:
+            return "disabled"
+        if not self._probed:
+            return "connecting"
+        state = self.breaker.state
+        if state == CLOSED and self._connected.is_set():
+            return "up"
+        return "recovering" if state == HALF_OPEN else "down"
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"status": self.status(), "max_pool_size": self.options["maxPoolSize"], **self.breaker.snapshot()}
+
+
+class LocalMirror:
+    """
+    JSON copy of one collection's documents, plus the writes made while
+    MongoDB was unreachable (replayed in order once it is back).
+    """
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._state: Optional[Dict[str, Any]] = None
+
+    def _load(self) -> Dict[str, Any]:
+        if self._state is None:
+            try:
+                state = json.loads(self.path.read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                state = {}
+            self._state = {"documents": state.get("documents", []), "pending": state.get("pending", [])}
+        return self._state
+
+    def _save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp.write_text(json.dumps(self._state, indent=2), encoding="utf-8")
+        os.replace(tmp, self.path)
+
+    def exists(self) -> bool:
+        return self.path.exists()
+
+    def documents(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [dict(doc) for doc in self._load()["documents"]]
+
+    def refresh(self, documents: List[Dict[str, Any]]) -> None:
+        """Replace the mirrored documents with a fresh read (written only if they changed)."""
+        with self._lock:
+            state = self._load()
+            if state["pending"] or state["documents"] == documents:
+                # Unsynced offline writes win until they are replayed
+                return
+            state["documents"] = [dict(doc) for doc in documents]
+            self._save()
+
+    def queue(self, op: str, **fields: Any) -> None:
+        """
+        Apply a write to the mirror and keep it for replay. Ops: "insert"
+        (document=...), "delete" (id=...) and "replace_all" (documents=[...]).
+        """
+        with self._lock:
+            state = self._load()
+            entry = {"op": op, "ts": time.time(), **fields}
+            if op == "insert":
+                state["documents"].append(dict(fields["document"]))
+            elif op == "delete":
+                state["documents"] = [d for d in state["documents"] if d.get("id") != fields["id"]]
+            elif op == "replace_all":
+                state["documents"] = [dict(doc) for doc in fields["documents"]]
+                # Earlier pending writes are superseded by the full replacement
+                state["pending"] = []
+            else:
+                raise ValueError(f"Unknown mirror op: {op}")
+            state["pending"].append(entry)
+            self._save()
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._load()["pending"])
+
+    def replay(self, apply: Callable[[Dict[str, Any]], None]) -> int:
+        """
+        Hand each pending write to `apply` in order, dropping it once applied.
+        Stops at the first failure (the rest stay queued). Returns how many were applied.
+        """
+        applied = 0
+        with self._lock:
+            state = self._load()
+            try:
+                while state["pending"]:
+                    apply(state["pending"][0])
+                    state["pending"].pop(0)
+                    applied += 1
+            finally:
+                if applied:
+                    self._save()
+        return applied
+
+
+_CONNECTION: Optional[MongoConnection] = None
+_CONNECTION_LOCK = threading.Lock()
+
+
+def get_mongo_connection(uri: Optional[str] = None, **config: Any) -> MongoConnection:
+    """
+    Process-wide MongoDB connection manager (call start() once its on_connect
+    callbacks are registered). The first caller's config wins; unset values fall back to MONGODB_URI and the
+    MONGO_* environment variables, then to the defaults.
+    """
+    global _CONNECTION
+    with _CONNECTION_LOCK:
+        if _CONNECTION is None:
+            def setting(key: str, env: str, cast: Callable[[Any], Any]) -> Any:
+                value = config.get(key) or os.getenv(env)
+                return cast(value) if value not in (None, "") else None
+
+            _CONNECTION = MongoConnection(
+                uri if uri is not None else os.getenv("MONGODB_URI", ""),
+                db_name=config.get("db_name") or "ai_factory",
+                failure_threshold=setting("failure_threshold", "MONGO_BREAKER_FAILURES", int)
+                or DEFAULT_FAILURE_THRESHOLD,
+                reset_timeout=setting("reset_seconds", "MONGO_BREAKER_RESET_SECONDS", float)
+                or DEFAULT_RESET_SECONDS,
+                maxPoolSize=setting("max_pool_size", "MONGO_MAX_POOL_SIZE", int),
+                minPoolSize=setting("min_pool_size", "MONGO_MIN_POOL_SIZE", int),
+                connectTimeoutMS=setting("connect_timeout_ms", "MONGO_CONNECT_TIMEOUT_MS", int),
+                serverSelectionTimeoutMS=setting("server_selection_timeout_ms", "MONGO_SERVER_SELECTION_TIMEOUT_MS", int),
+                socketTimeoutMS=setting("socket_timeout_ms", "MONGO_SOCKET_TIMEOUT_MS", int),
+            )
+        return _CONNECTION
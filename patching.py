@@ -0,0 +1,194 @@
+"""
+Unified-diff parsing and fuzz-tolerant local patch application.
+
+Used by the surgical retry: agents return unified diffs for the files QA
+flagged, and the diffs are applied here instead of regenerating the kit.
+
+- Hunks are located near their stated line numbers first, then anywhere in
+  the file, first exactly, then ignoring trailing whitespace, then with up
+  to `fuzz` context lines dropped from each end (like `patch --fuzz`).
+- A hunk whose changed lines fall outside the file's allowed regions (the
+  flagged lines plus a margin) is rejected, so a fix cannot quietly rewrite
+  code QA did not complain about.
+
+This module has no Streamlit dependency so scripts can import it directly.
+"""
+
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+DEFAULT_FUZZ = 2
+DEFAULT_REGION_MARGIN = 10
+
+_FILE_HEADER = re.compile(r'^\+\+\+\s+(?:b/)?(\S+)')
+_HUNK_HEADER = re.compile(r'^@@\s+-(\d+)(?:,(\d+))?\s+\+(\d+)(?:,(\d+))?\s+@@')
+
+
+class Hunk:
+    """One `@@` section of a unified diff."""
+
+    def __init__(self, old_start: int, new_start: int, old_count: int = 1, new_count: int = 1):
+        self.old_start = old_start
+        self.new_start = new_start
+        self.old_count = old_count  # line counts from the @@ header
+        self.new_count = new_count
+        self.lines: List[Tuple[str, str]] = []  # (' ' | '-' | '+', text)
+
+    @property
+    def complete(self) -> bool:
+        """True once the body holds as many old and new lines as the header announced."""
+        return len(self.old_lines) >= self.old_count and len(self.new_lines) >= self.new_count
+
+    @property
+    def old_lines(self) -> List[str]:
+        return [text for op, text in self.lines if op != '+']
+
+    @property
+    def new_lines(self) -> List[str]:
+        return [text for op, text in self.lines if op != '-']
+
+    def changed_offsets(self) -> List[int]:
+        """Offsets (into old_lines) of removed lines and of the line each insertion lands before."""
+        offsets, position = [], 0
+        for op, _ in self.lines:
+            if op == '-':
+                offsets.append(position)
+                position += 1
+            elif op == '+':
+                offsets.append(position)
+            else:
+                position += 1
+        return offsets
+
+
+def parse_unified_diff(text: str) -> Dict[str, List[Hunk]]:
+    """Parse one or more file diffs (``` fences allowed) into {path: [Hunk]}."""
+    patches: Dict[str, List[Hunk]] = {}
+    path: Optional[str] = None
+    hunk: Optional[Hunk] = None
+    for raw in text.splitlines():
+        if raw.startswith('```'):
+            hunk = None
+            continue
+        # Inside an unfinished hunk, "--- x" is a removed "-- x" line (SQL/Lua comment), not a header
+        if hunk is None or hunk.complete:
+            file_match = _FILE_HEADER.match(raw)
+            if file_match:
+                path = file_match.group(1).strip()
+                path = path[2:] if path.startswith('./') else path
+                patches.setdefault(path, [])
+                hunk = None
+                continue
+            if raw.startswith('--- ') or raw.startswith('diff ') or raw.startswith('index '):
+                hunk = None
+                continue
+        hunk_match = _HUNK_HEADER.match(raw)
+        if hunk_match and path is not None:
+            old_count, new_count = hunk_match.group(2), hunk_match.group(4)
+            hunk = Hunk(int(hunk_match.group(1)), int(hunk_match.group(3)),
+                        1 if old_count is None else int(old_count), 1 if new_count is None else int(new_count))
+            patches[path].append(hunk)
+            continue
+        if hunk is None:
+            continue
+        if raw.startswith(('+', '-', ' ')):
+            hunk.lines.append((raw[0], raw[1:]))
+        elif raw == '':
+            # Blank context lines often lose their leading space in LLM output
+            hunk.lines.append((' ', ''))
+        elif raw.startswith('\\'):
+            continue  # "\ No newline at end of file"
+        else:
+            hunk = None
+    return {p: [h for h in hunks if h.lines] for p, hunks in patches.items()}
+
+
+def _matches(file_lines: List[str], at: int, block: List[str], loose: bool) -> bool:
+    if at < 0 or at + len(block) > len(file_lines):
+        return False
+    if loose:
+        return all(a.rstrip() == b.rstrip() for a, b in zip(file_lines[at:at + len(block)], block))
+    return file_lines[at:at + len(block)] == block
+
+
+def _locate(file_lines: List[str], block: List[str], expected: int) -> Optional[Tuple[int, bool]]:
+    """Nearest position of `block` to `expected` (exact first, then whitespace-loose)."""
+    if not block:
+        return (max(0, min(expected, len(file_lines))), False)
+    order = sorted(range(len(file_lines) - len(block) + 1), key=lambda i: abs(i - expected))
+    for loose in (False, True):
+        for at in order:
+            if _matches(file_lines, at, block, loose):
+                return at, loose
+    return None
+
+
+def _merge_ranges(ranges: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    merged: List[Tuple[int, int]] = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def allowed_regions(flagged_lines: List[int], margin: int = DEFAULT_REGION_MARGIN) -> Optional[List[Tuple[int, int]]]:
+    """1-based inclusive line ranges a patch may touch; None means the whole file."""
+    if not flagged_lines:
+        return None
+    return _merge_ranges([(max(1, line - margin), line + margin) for line in flagged_lines])
+
+
+def apply_patch(original: str, hunks: List[Hunk], regions: Optional[List[Tuple[int, int]]] = None,
+                fuzz: int = DEFAULT_FUZZ) -> Dict[str, Any]:
+    """
+    Apply hunks to `original`.
+
+    Returns: {
+        'text': patched text,
+        'applied': [{'hunk', 'line', 'fuzz', 'loose'}],
+        'rejected': [{'hunk', 'reason'}]
+    }
+    """
+    lines = original.split('\n')
+    applied, rejected = [], []
+    offset = 0  # lines added minus removed by earlier hunks
+    for index, hunk in enumerate(hunks, 1):
+        found = None
+        for trim in range(0, fuzz + 1):
+            ops = hunk.lines
+            # Drop up to `trim` context lines from each end (never changed lines)
+            lead = 0
+            while lead < trim and lead < len(ops) and ops[lead][0] == ' ':
+                lead += 1
+            tail = 0
+            while tail < trim and tail < len(ops) - lead and ops[len(ops) - 1 - tail][0] == ' ':
+                tail += 1
+            trimmed = Hunk(hunk.old_start + lead, hunk.new_start + lead)
+            trimmed.lines = ops[lead:len(ops) - tail]
+            location = _locate(lines, trimmed.old_lines, trimmed.old_start - 1 + offset)
+            if location is not None:
+                found = (trimmed, location, trim)
+                break
+        if found is None:
+            rejected.append({'hunk': index, 'reason': f"context not found near line {hunk.old_start}"})
+            continue
+
+        trimmed, (at, loose), trim = found
+        touched = [at + o + 1 - offset for o in trimmed.changed_offsets()]  # in original numbering
+        if regions is not None and any(not any(s <= line <= e for s, e in regions) for line in touched):
+            rejected.append({'hunk': index, 'reason': f"touches unflagged lines ({min(touched)}-{max(touched)})"})
+            continue
+
+        old_count = len(trimmed.old_lines)
+        lines[at:at + old_count] = trimmed.new_lines
+        offset += len(trimmed.new_lines) - old_count
+        applied.append({'hunk': index, 'line': at + 1, 'fuzz': trim, 'loose': loose})
+    return {'text': '\n'.join(lines), 'applied': applied, 'rejected': rejected}
+
+
+def with_line_numbers(text: str) -> str:
+    """Number lines (1-based) so agents can write accurate hunk headers."""
+    width = len(str(text.count('\n') + 1))
+    return '\n'.join(f"{n:>{width}} | {line}" for n, line in enumerate(text.split('\n'), 1))
@@ -0,0 +1,2530 @@
+"""
+Headless build pipeline for AI Factory.
+
+Everything the build needs that does not touch Streamlit lives here: agent
+lookup by role, upload parsing, the prompt for every phase, CrewAI agent
+construction, rate-limited kickoffs, the placeholder scan, kit file helpers,
+and `run_project()`, which runs a full project (extraction → architecture →
+build → integration → QA (with surgical retries) → documentation) from a plain spec dict:
+
+    {
+        "idea": "A habit tracker with streaks",
+        "package": "Package A: React + Flask + PostgreSQL",
+        "additional_features": "Email reminders",
+        "special_requirements": "",
+        "config": "SENDGRID_API_KEY=...",
+        "files": [<parsed file dicts, see parse_uploaded_file>],
+        "build_mode": "crew"            # or "fanout" (see BUILD_MODES)
+    }
+
+app.py drives the same functions interactively; batch_runner.py runs many
+specs concurrently. Shared state (rate limiter, LLM backend, telemetry,
+traces) is process-wide, so both share one budget.
+"""
+
+import contextvars
+import hashlib
+import io
+import json
+import logging
+import os
+import re
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+from uuid import uuid4
+
+from crewai import Agent, Task, Crew, Process, LLM
+
+import telemetry
+import tracing
+from json_summary import inline_limit as json_inline_limit, summarize_json
+from llm_backend import get_llm_backend
+from model_routing import resolve_llm_settings, estimate_cost
+from patching import allowed_regions, apply_patch, parse_unified_diff, with_line_numbers
+from rate_limiter import get_rate_limiter, limiter_scope
+from reference_index import get_reference_index, reference_budget
+from repo_archive import get_repo_archive, spool_upload
+
+logger = logging.getLogger(__name__)
+
+# ------------------------------------------------------------------------------
+# Agent lookup by role
+# ------------------------------------------------------------------------------
+def find_orchestrator(agents: List[Dict[str, Any]]) -> Dict[str, Any] | None:
+    """Find the orchestrator agent (by role containing 'orchestrator')."""
+    for a in agents:
+        if "orchestrator" in a.get("role", "").lower():
+            return a
+    return None
+
+def find_strategy_consultant(agents: List[Dict[str, Any]]) -> Dict[str, Any] | None:
+    """Find the strategy consultant agent (by role containing 'strategy consultant')."""
+    for a in agents:
+        if "strategy consultant" in a.get("role", "").lower():
+            return a
+    return None
+
+def find_agent_by_role(agents: List[Dict[str, Any]], role_keywords: str) -> Dict[str, Any] | None:
+    """Find an agent by role keywords (case-insensitive)."""
+    keywords_lower = role_keywords.lower()
+    for a in agents:
+        if keywords_lower in a.get("role", "").lower():
+            return a
+    return None
+
+def find_code_extractor(agents: List[Dict[str, Any]]) -> Dict[str, Any] | None:
+    """Find the code extractor agent."""
+    return find_agent_by_role(agents, "code extractor")
+
+def find_product_manager(agents: List[Dict[str, Any]]) -> Dict[str, Any] | None:
+    """Find the product manager agent."""
+    return find_agent_by_role(agents, "product manager")
+
+def find_solutions_architect(agents: List[Dict[str, Any]]) -> Dict[str, Any] | None:
+    """Find the solutions architect agent."""
+    return find_agent_by_role(agents, "solutions architect")
+
+def find_integration_coordinator(agents: List[Dict[str, Any]]) -> Dict[str, Any] | None:
+    """Find the integration coordinator agent."""
+    # Try multiple search terms to find the coordinator
+    coordinator = find_agent_by_role(agents, "integration coordinator")
+    if not coordinator:
+        coordinator = find_agent_by_role(agents, "system integration")
+    if not coordinator:
+        coordinator = find_agent_by_role(agents, "workflow coordinator")
+    return coordinator
+
+def find_qa_validation(agents: List[Dict[str, Any]]) -> Dict[str, Any] | None:
+    """Find the QA validation agent."""
+    return find_agent_by_role(agents, "quality assurance")
+
+def find_documentation_specialist(agents: List[Dict[str, Any]]) -> Dict[str, Any] | None:
+    """Find the documentation specialist agent."""
+    return find_agent_by_role(agents, "documentation specialist")
+
+def find_code_supervisor(agents: List[Dict[str, Any]]) -> Dict[str, Any] | None:
+    """Find the code supervisor agent."""
+    supervisor = find_agent_by_role(agents, "code supervisor")
+    if not supervisor:
+        supervisor = find_agent_by_role(agents, "implementation enforcer")
+    return supervisor
+
+# ------------------------------------------------------------------------------
+# Reference files
+# ------------------------------------------------------------------------------
+def parse_uploaded_file(uploaded_file) -> Dict[str, Any]:
+    """Parse uploaded file and extract content."""
+    file_name = uploaded_file.name
+    file_type = file_name.split('.')[-1].lower()
+    
+    try:
+        if file_type == 'ipynb':
+            # Parse Jupyter notebook
+            content = json.loads(uploaded_file.read().decode('utf-8'))
+            cells = content.get('cells', [])
+            text_content = []
+            for cell in cells:
+                cell_type = cell.get('cell_type', '')
+                source = ''.join(cell.get('source', []))
+                if cell_type == 'markdown':
+                    text_content.append(f"### Markdown Cell\n{source}\n")
+                elif cell_type == 'code':
+                    text_content.append(f"### Code Cell\n```python\n{source}\n```\n")
+            return {
+                'name': file_name,
+                'type': 'Jupyter Notebook',
+                'content': '\n'.join(text_content),
+                'icon': '📓'
+            }
+        
+        elif file_type in ['md', 'markdown']:
+            content = uploaded_file.read().decode('utf-8')
+            return {
+                'name': file_name,
+                'type': 'Markdown',
+                'content': content,
+                'icon': '📝'
+            }
+        
+        elif file_type == 'csv':
+            content = uploaded_file.read().decode('utf-8')
+            lines = content.split('\n')[:20]  # Preview first 20 lines
+            preview = '\n'.join(lines)
+            return {
+                'name': file_name,
+                'type': 'CSV Data',
+                'content': f"CSV File Preview (first 20 rows):\n```\n{preview}\n```\n\nNote: Full dataset available for analysis.",
+                'icon': '📊'
+            }
+        
+        elif file_type == 'txt':
+            content = uploaded_file.read().decode('utf-8')
+            return {
+                'name': file_name,
+                'type': 'Text File',
+                'content': content,
+                'icon': '📄'
+            }
+        
+        elif file_type == 'py':
+            content = uploaded_file.read().decode('utf-8')
+            return {
+                'name': file_name,
+                'type': 'Python Code',
+                'content': f"```python\n{content}\n```",
+                'icon': '🐍'
+            }
+        
+        elif file_type == 'json':
+            size = getattr(uploaded_file, 'size', None)
+            if size is None:
+                uploaded_file.seek(0, io.SEEK_END)
+                size = uploaded_file.tell()
+                uploaded_file.seek(0)
+            if size > json_inline_limit():
+                # Streamed into a schema + samples instead of loaded and pretty-printed
+                return {
+                    'name': file_name,
+                    'type': 'JSON Data (summary)',
+                    'content': summarize_json(uploaded_file, file_name, size),
+                    'icon': '📋'
+                }
+            content = json.loads(uploaded_file.read().decode('utf-8'))
+            formatted = json.dumps(content, indent=2)
+            return {
+                'name': file_name,
+                'type': 'JSON Data',
+                'content': f"```json\n{formatted}\n```",
+                'icon': '📋'
+            }
+        
+        elif file_type == 'zip':
+            # Indexed in place: tree, languages and outlines now, member contents when a phase retrieves them
+            archive = get_repo_archive(spool_upload(uploaded_file), file_name)
+            return {
+                'name': file_name,
+                'type': 'Repository (ZIP)',
+                'content': archive.overview(),
+                'icon': '🗂️',
+                'archive': archive.path,
+                'fingerprint': archive.fingerprint,
+            }
+        
+        else:
+            # Try to read as text
+            content = uploaded_file.read().decode('utf-8', errors='ignore')
+            return {
+                'name': file_name,
+                'type': 'File',
+                'content': content[:5000],  # Limit to 5000 chars
+                'icon': '📎'
+            }
+    
+    except Exception as e:
+        return {
+            'name': file_name,
+            'type': 'Error',
+            'content': f"Could not parse file: {str(e)}",
+            'icon': '⚠️'
+        }
+
+def build_context_from_files(files_data: List[Dict[str, Any]], query: str = "",
+                             budget_tokens: int | None = None) -> str:
+    """
+    Build context string from uploaded files. Files that fit the reference
+    budget go in whole; larger uploads contribute only the excerpts most
+    relevant to `query` (see reference_index.py), each marked with its chunk.
+    """
+    if not files_data:
+        return ""
+    budget = reference_budget() if budget_tokens is None else budget_tokens
+    index = get_reference_index(files_data)
+    selected = index.select(query, budget)
+    trimmed = len(selected) < len(index.chunks)
+    
+    context_parts = ["\n\n---\n## 🚨 MANDATORY IMPLEMENTATION INSTRUCTIONS FROM USER\n\n"]
+    context_parts.append("⚠️ **CRITICAL**: These are NOT just reference materials. These are IMPLEMENTATION TEMPLATES you MUST follow.\n\n")
+    context_parts.append("**Your Responsibilities:**\n")
+    context_parts.append("1. **READ CAREFULLY**: Extract code patterns, logic, and workflows from these files\n")
+    context_parts.append("2. **IMPLEMENT EXACTLY**: If files contain ML models, data cleaning steps, or API patterns → implement them\n")
+    context_parts.append("3. **USE THE CODE**: Don't create generic placeholders - use the actual code/logic from these files\n")
+    context_parts.append("4. **ADAPT INTELLIGENTLY**: Translate concepts to your chosen tech stack while preserving functionality\n\n")
+    context_parts.append("**Examples:**\n")
+    context_parts.append("- File has pandas data cleaning → Implement those exact cleaning steps ✅\n")
+    context_parts.append("- File has ML model training → Implement that model training logic ✅\n")
+    context_parts.append("- File has API endpoints → Create those exact endpoints ✅\n")
+    context_parts.append("- File has UI components → Build those components ✅\n\n")
+    context_parts.append("**DO NOT:**\n")
+    context_parts.append("- ❌ Treat these as 'background information only'\n")
+    context_parts.append("- ❌ Create generic code when specific examples are provided\n")
+    context_parts.append("- ❌ Ignore the implementation details in these files\n\n")
+    context_parts.append("---\n\n")
+    
+    for idx, file_data in enumerate(files_data, 1):
+        if not trimmed and not file_data.get('archive'):
+            context_parts.append(f"\n### 📋 IMPLEMENTATION FILE {idx}: {file_data['name']} ({file_data['type']})\n\n")
+            context_parts.append("**INSTRUCTION**: Study this file and implement its logic/patterns in your code.\n\n")
+            context_parts.append(file_data['content'])
+            context_parts.append("\n---\n")
+            continue
+        excerpts = [chunk for chunk in selected if chunk.file_index == idx]
+        total = sum(1 for chunk in index.chunks if chunk.file_index == idx)
+        if not excerpts:
+            continue
+        if file_data.get('archive'):
+            members = len({chunk.name for chunk in excerpts if chunk.name != file_data['name']})
+            # No member excerpts when the spooled archive is gone: the overview alone still goes in
+            scope = f" and of the {members} files most relevant to this task" if members else ""
+            context_parts.append(f"\n### 📋 IMPLEMENTATION FILE {idx}: {file_data['name']} ({file_data['type']}) "
+                                 f"- {len(excerpts)} excerpts of its overview{scope}\n\n")
+        else:
+            context_parts.append(f"\n### 📋 IMPLEMENTATION FILE {idx}: {file_data['name']} ({file_data['type']}) "
+                                 f"- {len(excerpts)} of {total} excerpts, the most relevant to this task\n\n")
+        context_parts.append("**INSTRUCTION**: Study these excerpts and implement their logic/patterns in your code.\n\n")
+        for chunk in excerpts:
+            context_parts.append(f"#### 📎 EXCERPT [{chunk.label}, lines {chunk.start_line}-{chunk.end_line}]\n")
+            context_parts.append(chunk.render())
+            context_parts.append("\n\n")
+        context_parts.append("---\n")
+    
+    context_parts.append("\n\n🎯 **FINAL REMINDER**: If the user provided implementation files, they expect you to USE them, not ignore them!\n")
+    
+    return ''.join(context_parts)
+
+def reference_query(project_idea: str, chosen_strategy: str = "", user_selections: Dict[str, Any] | None = None) -> str:
+    """What a phase retrieves reference excerpts for: the idea, the chosen stack and the user's requirements."""
+    selections = user_selections or {}
+    parts = [project_idea, chosen_strategy, selections.get('additional_features', ''),
+             selections.get('special_requirements', '')]
+    return "\n".join(str(part) for part in parts if part)
+
+class LocalUpload(io.BytesIO):
+    """File-like object with a `name`, so parse_uploaded_file works on paths."""
+
+    def __init__(self, path: str | Path):
+        path = Path(path)
+        super().__init__(path.read_bytes())
+        self.name = path.name
+
+# ------------------------------------------------------------------------------
+# Phase prompts
+# ------------------------------------------------------------------------------
+# Every prompt is a static prefix (role, rules, checklists, output format)
+# followed by the run's values (idea, package, architecture, code, ...). Repeat
+# calls of a phase then share a long identical prefix, which providers serve
+# from their prompt cache at lower latency and input cost.
+PROMPT_PREFIXES: Dict[str, str] = {}
+_PREFIX_DIGESTS: Dict[str, str] = {}
+
+def static_prefix(name: str, text: str) -> str:
+    """Register the static leading part of a phase prompt; returns `text` unchanged."""
+    PROMPT_PREFIXES[name] = text
+    _PREFIX_DIGESTS[name] = hashlib.sha256(text.encode('utf-8')).hexdigest()[:12]
+    return text
+
+def prompt_prefix_fingerprint(prompt_text: str) -> Dict[str, Any]:
+    """
+    Which registered static prefix a prompt starts with, for telemetry:
+    {'prompt_prefix': '<name>:<sha256[:12]>', 'prefix_chars'}, or None / 0
+    for a prompt that does not start with one.
+    """
+    matches = [name for name, prefix in PROMPT_PREFIXES.items() if prompt_text.startswith(prefix)]
+    if not matches:
+        return {'prompt_prefix': None, 'prefix_chars': 0}
+    name = max(matches, key=lambda n: len(PROMPT_PREFIXES[n]))
+    return {'prompt_prefix': f"{name}:{_PREFIX_DIGESTS[name]}", 'prefix_chars': len(PROMPT_PREFIXES[name])}
+
+EXTRACTION_EXPECTED_OUTPUT = "A comprehensive list of extracted code patterns with exact code snippets, organized by category (functions, models, components, etc.) with translation notes if needed."
+ARCHITECTURE_EXPECTED_OUTPUT = "A comprehensive Technical Design Document with system diagrams, database schemas, API specifications, and frontend architecture."
+INTEGRATION_EXPECTED_OUTPUT = "An integration report listing any issues found or confirming all components integrate correctly."
+QA_EXPECTED_OUTPUT = "A comprehensive QA report with pass/fail status, list of issues found (if any), and recommendations."
+DOCUMENTATION_EXPECTED_OUTPUT = "Enhanced documentation including improved README, deployment guide, API docs, and troubleshooting section."
+
+STRATEGY_EXPECTED_OUTPUT = (
+    "2-3 complete solution packages in the specified format, each including:\n"
+    "- Full technology stack (frontend, backend, database, deployment)\n"
+    "- Detailed pros and cons\n"
+    "- Best use case\n"
+    "- Time and cost estimates\n"
+    "Plus clear recommendations and a complete deliverables list."
+)
+
+STRATEGY_PROMPT_PREFIX = static_prefix("strategy", (
+    "You are the Strategy Consultant analyzing the user's project idea.\n\n"
+    "🎯 YOUR ROLE:\n"
+    "Analyze the project idea and generate 2-3 SOLUTION PACKAGES (technology stack options) "
+    "that the user can choose from.\n\n"
+    "⚠️ CRITICAL UNDERSTANDING:\n"
+    "- If user says 'app' or 'application' → They want a WEB APPLICATION (React, Vue, Next.js, Flask, Django, etc.)\n"
+    "- NOT notebooks, NOT Jupyter, NOT Google Colab unless specifically requested\n"
+    "- Focus on DEPLOYABLE, USER-FACING applications\n"
+    "- Think about the ENTIRE solution: frontend + backend + database + deployment\n\n"
+    "📋 PROVIDE EXACTLY THIS FORMAT:\n\n"
+    "## Solution Packages\n\n"
+    "### Package A: [Descriptive Name]\n"
+    "**Technology Stack:**\n"
+    "- Frontend: [e.g., React with TypeScript]\n"
+    "- Backend: [e.g., Node.js with Express]\n"
+    "- Database: [e.g., PostgreSQL]\n"
+    "- Deployment: [e.g., Vercel (frontend) + Railway (backend)]\n\n"
+    "**Pros:**\n"
+    "- [Benefit 1]\n"
+    "- [Benefit 2]\n"
+    "- [Benefit 3]\n\n"
+    "**Cons:**\n"
+    "- [Limitation 1]\n"
+    "- [Limitation 2]\n\n"
+    "**Best For:** [Ideal use case/scenario]\n"
+    "**Estimated Build Time:** [X weeks]\n"
+    "**Cost:** [Free tier available / $X per month]\n\n"
+    "---\n\n"
+    "(Repeat for Package B and Package C)\n\n"
+    "## Recommendations\n\n"
+    "**🏆 Best Overall:** Package [A/B/C] - [Brief reason]\n"
+    "**⚡ Fastest to Build:** Package [X] - [Brief reason]\n"
+    "**💰 Most Cost-Effective:** Package [Y] - [Brief reason]\n"
+    "**🚀 Most Scalable:** Package [Z] - [Brief reason]\n\n"
+    "## What You'll Get\n\n"
+    "Regardless of which package you choose, you'll receive:\n"
+    "- ✅ Complete source code files (frontend + backend)\n"
+    "- ✅ Database schema and models\n"
+    "- ✅ API endpoints and routing\n"
+    "- ✅ Configuration files (package.json, requirements.txt, etc.)\n"
+    "- ✅ .gitignore configured for your stack\n"
+    "- ✅ Git initialization commands\n"
+    "- ✅ GitHub repository setup guide\n"
+    "- ✅ Deployment instructions for your chosen platform\n"
+    "- ✅ README with setup, run, and deploy steps\n"
+    "- ✅ Environment variables template\n\n"
+    "⚠️ REMEMBER:\n"
+    "- Present 2-3 COMPLETE solution packages\n"
+    "- Each package should be a FULL-STACK solution (not just frontend or just backend)\n"
+    "- Be specific about technologies (don't just say 'JavaScript', say 'React with TypeScript')\n"
+    "- Consider the user's skill level and project complexity\n"
+    "- Keep it concise but informative - user needs to make a decision quickly\n"
+    "\n"
+))
+
+def strategy_task_prompt(idea: str, file_context: str) -> str:
+    """Strategy session: 2-3 full-stack solution packages for the idea."""
+    return STRATEGY_PROMPT_PREFIX + f"💡 USER'S PROJECT IDEA:\n{idea}\n{file_context}\n"
+
+EXTRACTION_PROMPT_PREFIX = static_prefix("code_extraction", """
+Analyze the implementation files provided by the user (at the end of this message) and extract ALL specific code patterns, algorithms, functions, and implementation details.
+
+## Your Task
+Extract and document:
+1. **Exact Code Patterns**: Copy function definitions, class structures, algorithm implementations
+2. **ML Models**: Note model types, parameters, hyperparameters, training procedures
+3. **Data Processing**: Extract pandas operations, data cleaning steps, transformations
+4. **UI Components**: Identify component structures, props, event handlers
+5. **API Endpoints**: Note route definitions, request/response formats
+6. **Dependencies**: List all libraries and packages needed
+
+## Output Format
+For each extracted pattern, provide:
+- **Pattern Name**: Descriptive title
+- **Type**: Function/Class/Component/Endpoint/Model
+- **Original Code**: The exact code snippet (if present)
+- **Purpose**: What it does
+- **Dependencies**: Required libraries
+- **Translation Notes**: If target stack differs, note how to translate
+
+**IMPORTANT**: Extract SPECIFIC code, not generic descriptions. We need actual implementations that can be copied directly into the project.
+""")
+
+def extraction_task_prompt(file_context_raw: str, chosen_strategy: str) -> str:
+    """Phase 1: pull concrete code patterns out of the user's files."""
+    return EXTRACTION_PROMPT_PREFIX + f"""
+## Target Technology Stack
+{chosen_strategy}
+
+{file_context_raw}
+"""
+
+ARCHITECTURE_PROMPT_PREFIX = static_prefix("architecture", """
+Based on the selected technology package and user requirements (at the end of this message), design the complete technical architecture for this project.
+
+## Your Task
+Design:
+1. **System Component Diagram**: Frontend, backend, database, external services
+2. **Database Schema**: Tables/collections, fields, relationships, indexes
+3. **API Contract**: All endpoints with request/response schemas
+4. **Frontend Architecture**: Component hierarchy, state management, routing
+5. **Integration Points**: How components communicate
+6. **Security Measures**: Authentication, validation, CORS
+7. **Performance Considerations**: Optimization strategies
+
+Output a Technical Design Document (TDD) in Markdown that developers can follow to implement the system.
+""")
+
+def architecture_task_prompt(project_idea: str, chosen_strategy: str, user_selections: Dict[str, Any],
+                             extracted_patterns: str) -> str:
+    """Phase 2: technical design document."""
+    return ARCHITECTURE_PROMPT_PREFIX + f"""
+## Chosen Technology Stack
+{chosen_strategy}
+
+## Project Idea
+{project_idea}
+
+## User Requirements
+{user_selections.get('additional_features', 'None specified')}
+{user_selections.get('special_requirements', 'None specified')}
+
+## Extracted Code Patterns
+{extracted_patterns if extracted_patterns else 'No code patterns extracted'}
+"""
+
+def orchestrator_file_context(files_data: List[Dict[str, Any]], extracted_patterns: str, query: str = "") -> str:
+    """Reference-file context for the build; extracted patterns come first with copy rules."""
+    file_context = build_context_from_files(files_data, query)
+    
+    # Add extracted patterns to context (replaces raw files)
+    if extracted_patterns:
+        file_context = f"""
+## 📋 EXTRACTED CODE PATTERNS FROM USER FILES - COPY THESE EXACTLY
+
+{extracted_patterns}
+
+### 🚨 MANDATORY PATTERN IMPLEMENTATION RULES
+
+**YOU MUST COPY PATTERNS EXACTLY - DO NOT MODIFY OR REINTERPRET**
+
+#### Rule 1: Copy Pattern Code Verbatim
+Each pattern above has a "Target File" and "Implementation" section. Your job:
+1. Create the target file specified
+2. Copy the implementation code EXACTLY as shown
+3. Do NOT simplify, generalize, or modify the pattern
+4. Pattern code = Production code
+
+#### Rule 2: Pattern IDs Are Your Checklist
+- Each pattern has an ID (e.g., Pattern 1.1, Pattern 2.1)
+- You must implement EVERY pattern listed above
+- Add a comment in your code: `// PATTERN X.Y: [name]` or `# PATTERN X.Y: [name]`
+- This helps QA verify you used the patterns
+
+#### Rule 3: Complete the Pattern, Don't Stub It
+❌ WRONG: def clean_dataset(df, target): pass  # Stub with no implementation
+✅ RIGHT: Copy the complete function from Pattern document with all logic
+
+#### Rule 4: All Pattern Dependencies Must Be Imported
+Each pattern lists dependencies. Add ALL of them to your file:
+- If pattern shows: `from sklearn.ensemble import RandomForestClassifier`
+- You must include that exact import
+- Check that all imports from patterns are in your requirements.txt/package.json
+
+#### Rule 5: Glue Code Must Connect Patterns
+Patterns are building blocks. You add glue code to connect them:
+- App initialization (Flask app, Express server, React App.js)
+- Route registration (connect Pattern X to endpoint Y)
+- Component composition (render Pattern components in parent)
+- But NEVER rewrite pattern logic itself
+
+**VALIDATION BEFORE DELIVERY:**
+- ✅ Every Pattern X.Y has corresponding comment in code
+- ✅ Pattern code matches extracted version (not modified)
+- ✅ All pattern dependencies are imported
+- ✅ Glue code is complete (no empty functions)
+- ✅ Zero placeholder comments exist
+- ✅ Code can run immediately after `npm install` / `pip install`
+
+{file_context}
+"""
+    
+    return file_context
+
+def format_config_context(raw_config: str) -> str:
+    """User-provided configuration/API keys, passed raw for the agents to parse."""
+    # Format configuration for agents - pass raw, let them parse
+    config_context = ""
+    if raw_config:
+        config_context = f"\n\n## 🔑 User-Provided Configuration\n\n"
+        config_context += "The user has provided the following configuration/API keys:\n\n"
+        config_context += "```\n"
+        config_context += raw_config
+        config_context += "\n```\n\n"
+        config_context += "### Your Responsibilities:\n"
+        config_context += "1. **Parse intelligently**: Extract keys, tokens, connection strings from above\n"
+        config_context += "2. **Integrate properly**: Use these values in your `.env.example` and application code\n"
+        config_context += "3. **Document clearly**: Explain in README what each configuration does\n"
+        config_context += "4. **Add placeholders**: For any keys you think are needed but weren't provided\n"
+    else:
+        config_context = "\n\n## 🔑 Configuration\n\n"
+        config_context += "No configuration was provided. You should:\n"
+        config_context += "1. Analyze the project requirements and determine needed API keys/config\n"
+        config_context += "2. Create `.env.example` with intelligent placeholder values\n"
+        config_context += "3. Document in README which services need API keys and where to get them\n"
+    
+    return config_context
+
+def format_additional_context(user_selections: Dict[str, Any]) -> str:
+    """Additional features / special requirements - THESE ARE COMMANDS, NOT SUGGESTIONS."""
+    # Format additional requirements - THESE ARE COMMANDS, NOT SUGGESTIONS
+    additional_context = ""
+    if user_selections.get('additional_features'):
+        additional_context += f"\n\n## ✨ USER'S ADDITIONAL FEATURES (🚨 MANDATORY - NOT OPTIONAL)\n\n"
+        additional_context += f"**User explicitly requested:**\n\n{user_selections['additional_features']}\n\n"
+        additional_context += "🚨 **THIS IS A COMMAND, NOT A SUGGESTION**:\n"
+        additional_context += "- If user says 'MongoDB' → Use MongoDB (even if package says PostgreSQL)\n"
+        additional_context += "- If user says 'Netlify' → Deploy to Netlify (even if package says DigitalOcean)\n"
+        additional_context += "- If user says 'GraphQL' → Build GraphQL API (even if package says REST)\n"
+        additional_context += "- User's words = Your instructions. Follow them EXACTLY.\n"
+    if user_selections.get('special_requirements'):
+        additional_context += f"\n\n## ⚙️ USER'S SPECIAL REQUIREMENTS (🚨 MANDATORY - NOT OPTIONAL)\n\n"
+        additional_context += f"**User explicitly requested:**\n\n{user_selections['special_requirements']}\n\n"
+        additional_context += "🚨 **THIS IS A COMMAND, NOT A SUGGESTION**:\n"
+        additional_context += "- These requirements OVERRIDE everything else\n"
+        additional_context += "- If there's ANY conflict with the base package → User wins\n"
+        additional_context += "- Implement EXACTLY as user described\n"
+    
+    return additional_context
+
+ORCHESTRATOR_PROMPT_PREFIX = static_prefix("orchestrator", """
+# 🎯 PROJECT EXECUTION MISSION
+
+You are the Orchestrator leading a team of specialist agents to build a complete, production-ready application.
+
+The project itself (the user's idea, the base technology package they chose, the architecture,
+configuration, their additional requirements and reference files) is given in PROJECT SPECIFICS
+at the END of this brief. If that section starts with retry instructions, they take priority
+over everything else in this brief.
+
+## 🏗️ BASE TECHNOLOGY PACKAGE RULES
+
+⚠️ **CRITICAL PACKAGE RULES**:
+
+1. **Backend Framework**: You MUST use the backend framework specified in this package
+   - If package says "Flask (Python)" → Use Flask, NOT Node.js
+   - If package says "Django (Python)" → Use Django, NOT Express
+   - If package says "Node.js with Express" → Use Node.js/Express
+   - **NEVER change the backend language/framework unless user explicitly says so**
+
+2. **User Can Modify Other Components**:
+   - User can change frontend (React instead of Vue)
+   - User can change database (MongoDB instead of PostgreSQL)
+   - User can change deployment platform (Netlify instead of Render)
+   - BUT: Backend framework from package is LOCKED unless explicitly overridden
+
+3. **How to Know if User Wants Different Backend**:
+   - User must explicitly say "use Node.js instead" or "use Django instead"
+   - Just mentioning "React + MongoDB" does NOT mean "use MERN"
+   - **Example**: Package B (Flask) + User says "React + MongoDB" = Flask backend + React frontend + MongoDB ✅
+   - **Example**: Package B (Flask) + User says "use Node.js backend" = Node.js backend ✅
+
+## ⚠️ CRITICAL: TECHNOLOGY CONFLICT RESOLUTION RULES
+
+You MUST analyze the user's Additional Features and Special Requirements and intelligently resolve any conflicts with the base package.
+
+### Decision-Making Process:
+
+**STEP 1: Identify User's Technology Choices**
+Read the "Additional Features" and "Special Requirements" sections carefully. Extract ANY technology mentions:
+- Databases: MongoDB, PostgreSQL, MySQL, Firebase, Supabase, etc.
+- Deployment: Netlify, Vercel, Render, Railway, Heroku, AWS, DigitalOcean, etc.
+- APIs: REST, GraphQL, etc.
+- Auth: JWT, OAuth, Session-based, etc.
+
+**STEP 2: Compare with Base Package**
+Check if the user's choices conflict with the base package.
+
+**STEP 3: Apply Priority Rules**
+```
+IF (user mentions a technology) THEN
+    USE user's technology
+    IGNORE package's conflicting technology
+ELSE
+    USE package's technology
+END IF
+```
+
+### Real-World Examples:
+
+**Example 1: Database Override**
+```
+Base Package: "Backend: Flask (Python), Database: PostgreSQL"
+User's Additional Features: "We are using Render, deploying to Netlify and using mongoDB"
+
+✅ CORRECT DECISION:
+- Database: MongoDB (user specified, OVERRIDE PostgreSQL)
+- Backend: Flask (no conflict, keep from package)
+- Deployment: Netlify (user specified, OVERRIDE Render or DigitalOcean)
+
+❌ WRONG DECISION:
+- Using BOTH PostgreSQL and MongoDB
+- Using DigitalOcean when user said Netlify
+```
+
+**Example 2: Deployment Override**
+```
+Base Package: "Deployment: DigitalOcean or Render"
+User's Additional Features: "deploy to Netlify"
+
+✅ CORRECT DECISION:
+- Deployment: Netlify ONLY
+- Configure for Netlify, not DigitalOcean or Render
+
+❌ WRONG DECISION:
+- Providing deployment instructions for multiple platforms
+```
+
+**Example 3: API Style Override**
+```
+Base Package: "REST API"
+User's Special Requirements: "use GraphQL for the API"
+
+✅ CORRECT DECISION:
+- API: GraphQL (user specified, OVERRIDE REST)
+
+❌ WRONG DECISION:
+- Building a REST API when user explicitly wants GraphQL
+```
+
+### ✅ Your Responsibilities:
+
+1. **READ CAREFULLY**: User's additional features and requirements
+2. **IDENTIFY CONFLICTS**: Between user input and base package
+3. **CHOOSE INTELLIGENTLY**: Always prioritize user's explicit requests
+4. **IMPLEMENT CONSISTENTLY**: Use chosen technologies throughout ALL files
+5. **DOCUMENT CLEARLY**: Explain in README which technologies were used and why
+
+## 🎯 YOUR MISSION
+
+Your mission is to deliver a complete **Deployment Kit** that includes:
+
+### 1️⃣ Complete Source Code
+- **Frontend**: All UI components, pages, layouts, styles
+- **Backend**: API routes, controllers, services, middleware
+- **Database**: Schema definitions, models, migrations
+- **Configuration**: All config files (package.json, requirements.txt, tsconfig.json, etc.)
+- **Environment Setup**: .env.example with all required variables
+
+### 2️⃣ Essential Files
+- `.gitignore` (properly configured for the chosen tech stack)
+- `README.md` (comprehensive setup and usage guide)
+- `package.json` or `requirements.txt` (with ALL dependencies and versions)
+- Configuration files for the chosen framework/platform
+
+### 3️⃣ Deployment Guide
+- **Step-by-step deployment instructions** for the chosen platform
+- **Environment variable configuration** guide
+- **Database setup** instructions (if applicable)
+- **Domain and DNS** setup (if applicable)
+- **Troubleshooting** common issues
+
+### 4️⃣ Documentation
+- **Project overview** and architecture
+- **API documentation** (if applicable)
+- **Component documentation** (for complex UIs)
+- **Development workflow** (how to run locally, test, build)
+
+## 📋 CRITICAL REQUIREMENTS
+
+⚠️ **COMPLETENESS**: This must be a COMPLETE application, not a tutorial or example. Every file needed to deploy and run the application must be included.
+
+⚠️ **PRODUCTION-READY**: Code must be clean, well-commented, follow best practices, and be ready for production deployment.
+
+⚠️ **TECH STACK ADHERENCE**: You MUST use the chosen technology strategy. Do not substitute with different technologies.
+
+⚠️ **DEPLOYMENT-FOCUSED**: Provide exact, copy-paste-ready deployment instructions. Assume the user has basic technical knowledge but needs clear guidance.
+
+⚠️ **API KEY INTEGRATION**: If API keys were provided, show exactly where and how to use them in the code and deployment.
+
+⚠️ **IMPLEMENTATION FILES USAGE**: If user provided implementation files (notebooks, guides, code examples), you MUST extract and use the actual code from those files. Do NOT create mock/placeholder versions.
+
+## 📝 HOW TO USE IMPLEMENTATION FILES
+
+If the user provided implementation files, follow this process:
+
+### Step 1: Extract Code Patterns
+**Read the implementation files and identify:**
+- Function definitions → Copy the logic
+- Algorithm implementations → Use the same algorithms
+- Data processing steps → Implement those exact steps
+- UI components → Build those components
+- API endpoints → Create those routes
+
+### Step 2: Translate If Needed
+**If tech stacks differ:**
+- Python notebook → Node.js backend: Translate pandas operations to JavaScript equivalents
+- Python ML code → Browser ML: Use ML.js equivalents of scikit-learn models
+- Preserve the LOGIC and FUNCTIONALITY even if syntax changes
+
+### Step 3: Real Examples
+
+**Example 1: ML Model from Notebook**
+```
+User's file has:
+    model = RandomForestClassifier(n_estimators=100, max_depth=10)
+    model.fit(X_train, y_train)
+    predictions = model.predict(X_test)
+
+❌ WRONG: def train_model(data): # Training logic here...
+
+✅ RIGHT: 
+    from sklearn.ensemble import RandomForestClassifier
+    model = RandomForestClassifier(n_estimators=100, max_depth=10)
+    model.fit(X_train, y_train)
+    predictions = model.predict(X_test)
+```
+
+**Example 2: Data Cleaning Steps**
+```
+User's file has:
+    df = df.dropna()
+    df['column'] = df['column'].fillna(df['column'].mean())
+    df = df[df['value'] > 0]
+
+❌ WRONG: cleaned_data = []  # Data cleaning logic...
+
+✅ RIGHT:
+    df = df.dropna()
+    df['column'] = df['column'].fillna(df['column'].mean())
+    df = df[df['value'] > 0]
+```
+
+**Example 3: UI Component**
+```
+User's file has:
+    <ConfusionMatrix data={matrix} labels={labels} />
+    - Shows heatmap
+    - Color-coded cells
+    - Displays percentages
+
+❌ WRONG: <div>{/* Confusion matrix display */}</div>
+
+✅ RIGHT: Build actual ConfusionMatrix component with heatmap library
+```
+
+### Step 4: Verify You Used Files
+**Before submitting, ask yourself:**
+1. Did I read the implementation files? YES/NO
+2. Did I extract specific code/logic from them? YES/NO
+3. Did I use that code in my implementation? YES/NO
+4. Or did I create generic placeholders instead? (If YES = FAIL)
+
+**If you answer NO to questions 1-3, STOP and actually use the files!**
+
+## 🚫 ABSOLUTELY FORBIDDEN - REAL EXAMPLES
+
+These are ACTUAL violations from previous builds that are UNACCEPTABLE:
+
+❌ **NO PLACEHOLDER COMMENTS**:
+```javascript
+// WRONG ❌
+const handleUpload = (event) => {
+    // Logic for uploading data and processing it  ← FORBIDDEN!
+};
+
+// RIGHT ✅
+const handleUpload = async (event) => {
+    const file = event.target.files[0];
+    const formData = new FormData();
+    formData.append('file', file);
+    const response = await fetch('/api/upload', {
+        method: 'POST',
+        body: formData
+    });
+    return response.json();
+};
+```
+
+❌ **NO EMPTY FUNCTIONS**:
+```javascript
+// WRONG ❌
+<button onClick={() => {}}>Upload</button>
+
+// RIGHT ✅
+<button onClick={handleUpload}>Upload</button>
+```
+
+❌ **NO COMMENT PLACEHOLDERS IN JSX**:
+```javascript
+// WRONG ❌
+{/* Logic to display processed data */}
+
+// RIGHT ✅
+{data.map(item => <div key={item.id}>{item.name}</div>)}
+```
+
+❌ **NO SKELETON ENDPOINTS**:
+```javascript
+// WRONG ❌
+exports.handleGraphQL = async (req, res) => {
+    res.send("GraphQL endpoint");  ← USELESS!
+};
+
+// RIGHT ✅
+const { ApolloServer } = require('apollo-server-express');
+const typeDefs = gql`...`;
+const resolvers = {...};
+const server = new ApolloServer({ typeDefs, resolvers });
+```
+
+❌ **NO MINIMAL MODELS**:
+```javascript
+// WRONG ❌
+const dataSchema = new mongoose.Schema({
+    fieldName: String  ← TOO GENERIC!
+});
+
+// RIGHT ✅
+const dataSchema = new mongoose.Schema({
+    fileName: { type: String, required: true },
+    rawData: { type: Buffer, required: true },
+    cleanedData: { type: Object },
+    uploadedAt: { type: Date, default: Date.now },
+    userId: { type: mongoose.Schema.Types.ObjectId, ref: 'User' }
+});
+```
+
+**IF YOU GENERATE ANY OF THE "WRONG" EXAMPLES ABOVE, YOUR OUTPUT WILL BE REJECTED.**
+
+## ✅ MANDATORY VALIDATION CHECKLIST
+
+Before submitting your output, you MUST verify every item:
+
+### Code Validation
+- [ ] Every import statement references a file that exists in your output
+- [ ] Every function has actual implementation (no placeholders)
+- [ ] All dependencies are listed in package.json/requirements.txt
+- [ ] Entry point files exist (index.js, index.html, main.py, etc.)
+- [ ] No "TODO" or "implement this" comments remain
+
+### Completeness Validation
+- [ ] Frontend has ALL required files (components, pages, styles, assets)
+- [ ] Backend has ALL routes, controllers, models, middleware
+- [ ] Database schemas and connections are complete
+- [ ] CORS and security middleware are implemented
+- [ ] Error handling is implemented throughout
+
+### Documentation Validation
+- [ ] README.md exists with complete setup instructions
+- [ ] .env.example has ALL required variables with descriptions
+- [ ] Deployment guide has step-by-step instructions
+- [ ] API documentation is included (if applicable)
+- [ ] Troubleshooting section covers common issues
+
+### Integration Validation
+- [ ] Frontend can connect to backend (CORS configured)
+- [ ] Environment variables are properly used
+- [ ] File structure matches imports
+- [ ] Build commands will work
+- [ ] Deploy commands are accurate for chosen platform
+
+## 📊 EXPECTED OUTPUT STRUCTURE
+
+Format your response EXACTLY like this:
+
+```markdown
+# 🏭 [PROJECT NAME] - Deployment Kit
+
+## 📖 Project Overview
+[2-3 paragraph description of what was built]
+
+## 🏗️ Technology Stack
+[List the exact technologies used, matching the chosen strategy]
+
+## 📋 FILE MANIFEST
+
+**Total Files Generated:** [NUMBER]
+
+This deployment kit includes the following files:
+
+### Frontend Files ([X] files)
+- `frontend/public/index.html` (52 lines) - Main HTML template
+- `frontend/src/index.js` (15 lines) - React entry point
+- `frontend/src/App.js` (120 lines) - Main application component
+- `frontend/src/components/[Name].js` ([X] lines) - [Description]
+- `frontend/src/styles.css` (85 lines) - Application styles
+- `frontend/package.json` (25 lines) - Frontend dependencies
+[List EVERY frontend file with line count and purpose]
+
+### Backend Files ([X] files)
+- `backend/server.js` (65 lines) - Express server setup
+- `backend/routes/api.js` (110 lines) - API route definitions
+- `backend/controllers/[name]Controller.js` ([X] lines) - [Description]
+- `backend/models/[Name].js` ([X] lines) - Database model
+- `backend/middleware/[name].js` ([X] lines) - [Description]
+- `backend/package.json` (20 lines) - Backend dependencies
+[List EVERY backend file with line count and purpose]
+
+### Configuration & Documentation ([X] files)
+- `README.md` (180 lines) - Complete setup and usage guide
+- `.env.example` (15 lines) - Environment variable template
+- `.gitignore` (25 lines) - Git ignore rules
+- `DEPLOYMENT.md` (120 lines) - Step-by-step deployment guide
+[List EVERY config/doc file]
+
+## 📁 Project Structure
+```
+/project-root
+├── frontend/
+│   ├── public/
+│   │   ├── index.html ✅
+│   │   └── manifest.json ✅
+│   ├── src/
+│   │   ├── components/
+│   │   │   └── [Component].js ✅
+│   │   ├── App.js ✅
+│   │   ├── index.js ✅
+│   │   └── styles.css ✅
+│   └── package.json ✅
+├── backend/
+│   ├── routes/
+│   │   └── api.js ✅
+│   ├── controllers/
+│   │   └── [name]Controller.js ✅
+│   ├── models/
+│   │   └── [Name].js ✅
+│   ├── middleware/
+│   │   └── [name].js ✅
+│   ├── server.js ✅
+│   └── package.json ✅
+├── .gitignore ✅
+├── .env.example ✅
+├── README.md ✅
+└── DEPLOYMENT.md ✅
+```
+
+## ✅ VALIDATION REPORT
+
+Before delivery, I verified:
+- ✅ All [X] imports are valid (no broken references)
+- ✅ All [X] functions have complete implementations
+- ✅ All [X] dependencies are listed in package.json/requirements.txt
+- ✅ Entry point files exist and are configured correctly
+- ✅ CORS is configured for frontend-backend communication
+- ✅ Error handling is implemented
+- ✅ README includes complete setup instructions
+- ✅ No placeholder code or TODOs remain
+
+## 💻 Source Code Files
+
+### File: README.md
+```markdown
+[Complete README with setup, usage, deployment instructions]
+```
+
+### File: .gitignore
+```
+[Complete .gitignore content for the tech stack]
+```
+
+### File: .env.example
+```
+[ALL required environment variables with descriptions]
+```
+
+### File: frontend/public/index.html
+```html
+[Complete HTML template]
+```
+
+### File: frontend/src/index.js
+```javascript
+[Complete entry point]
+```
+
+### File: frontend/src/App.js
+```javascript
+[Complete, working code with NO placeholders]
+```
+
+### File: frontend/src/components/[ComponentName].js
+```javascript
+[Complete component implementation]
+```
+
+### File: frontend/src/styles.css
+```css
+[Complete styling]
+```
+
+### File: frontend/package.json
+```json
+[Complete dependency file with ALL packages and exact versions]
+```
+
+### File: backend/server.js
+```javascript
+[Complete server setup with middleware, CORS, error handling]
+```
+
+### File: backend/routes/api.js
+```javascript
+[Complete API routes with actual implementations]
+```
+
+### File: backend/controllers/[name]Controller.js
+```javascript
+[Complete controller with full business logic - NO placeholders]
+```
+
+### File: backend/models/[Name].js
+```javascript
+[Complete database model]
+```
+
+### File: backend/middleware/[name].js
+```javascript
+[Complete middleware implementation]
+```
+
+### File: backend/package.json
+```json
+[Complete dependency file with ALL packages and exact versions]
+```
+
+[Include EVERY file needed for the application to run]
+
+## 🔐 Environment Configuration
+
+### File: .env.example
+```
+[All required environment variables with descriptions]
+```
+
+## 🚀 Deployment Guide
+
+### Prerequisites
+- [List what user needs installed]
+
+### Step 1: Clone and Setup
+```bash
+[Exact commands]
+```
+
+### Step 2: Configure Environment
+[How to set up .env file with API keys]
+
+### Step 3: Database Setup (if applicable)
+[Database initialization steps]
+
+### Step 4: Deploy to [Platform Name]
+[Platform-specific deployment steps]
+
+### Step 5: Verify Deployment
+[How to test that it's working]
+
+## 🧪 Local Development
+
+### Install Dependencies
+```bash
+[Commands to install]
+```
+
+### Run Development Server
+```bash
+[Commands to run]
+```
+
+### Build for Production
+```bash
+[Commands to build]
+```
+
+## 🔧 Troubleshooting
+
+[Common issues and solutions]
+
+## 📚 Additional Resources
+
+[Helpful links and documentation]
+```
+
+## ⚡ EXECUTION STRATEGY
+
+1. **Analyze** the project idea and chosen strategy
+2. **Design** the complete architecture
+3. **Delegate** specific tasks to specialist agents (Frontend Coder, Backend Coder, etc.)
+4. **Coordinate** the outputs from all agents
+5. **Integrate** everything into a cohesive deployment kit
+6. **Verify** completeness against the requirements
+
+## ✅ FINAL QUALITY CHECKLIST
+
+Before submitting, verify EVERY item below. An incomplete submission is REJECTED:
+
+### ✅ Code Completeness (MANDATORY)
+- [ ] Every file referenced in imports exists in your output
+- [ ] Every function has complete implementation (no "// TODO" or "// implement this")
+- [ ] Entry points exist: index.js, index.html, main.py, etc.
+- [ ] All components/modules used are actually generated
+- [ ] No broken references or missing files
+
+### ✅ Dependencies & Configuration (MANDATORY)
+- [ ] package.json/requirements.txt includes ALL dependencies with versions
+- [ ] .gitignore is complete for the tech stack
+- [ ] .env.example has ALL environment variables with descriptions
+- [ ] Config files are complete (tsconfig.json, webpack.config.js, etc.)
+
+### ✅ Functionality (MANDATORY)
+- [ ] Core features are FULLY IMPLEMENTED (not placeholders)
+- [ ] CORS is configured for frontend-backend communication
+- [ ] Error handling is implemented
+- [ ] Database connections work
+- [ ] API routes have actual logic
+
+### ✅ Documentation (MANDATORY)
+- [ ] README.md includes: overview, setup, run, deploy instructions
+- [ ] Deployment guide has step-by-step platform-specific instructions
+- [ ] API documentation included (if applicable)
+- [ ] Troubleshooting section included
+
+### ✅ File Manifest (MANDATORY)
+- [ ] File manifest lists ALL files with line counts
+- [ ] Total file count is realistic (15+ files minimum for full-stack apps)
+- [ ] All files in manifest are actually generated
+
+---
+
+## 🎯 FINAL REMINDER
+
+**STOP AND VERIFY** before submitting:
+
+1. **BACKEND FRAMEWORK CHECK**: Did I use the CORRECT backend from the base package?
+   - If package says "Flask (Python)" → Is my backend Flask? ✅/❌
+   - If package says "Django" → Is my backend Django? ✅/❌
+   - If package says "Node.js/Express" → Is my backend Node.js? ✅/❌
+   - **DID NOT just assume MERN because user said "React"?** ✅/❌
+
+2. **NO PLACEHOLDER CODE**: Are there ANY comments like these?
+   - `// Logic goes here` ❌
+   - `// TODO: implement` ❌
+   - `{/* Add logic here */}` ❌
+   - Empty onClick handlers `() => {}` ❌
+   - **If YES to any = REJECT and fix**
+
+3. **CAN IT RUN?**: Can this code run with just `npm install && npm start` or equivalent?
+   - All dependencies installed? ✅/❌
+   - Entry points exist? ✅/❌
+   - No broken imports? ✅/❌
+
+4. **ARE ALL FUNCTIONS REAL?**: Every function has actual implementation (not just comments)?
+   - Upload handlers have real upload code? ✅/❌
+   - API endpoints have real business logic? ✅/❌
+   - Database models have proper schemas? ✅/❌
+
+5. **IS DOCUMENTATION COMPLETE?**: README has everything needed for deployment?
+   - Setup instructions? ✅/❌
+   - Environment variables explained? ✅/❌
+   - Deployment steps? ✅/❌
+
+6. **FILE COUNT**: Generated at LEAST 15-20 files for full-stack app with meaningful content?
+
+**If you answer NO to ANY question above, DO NOT SUBMIT. Fix it first.**
+
+The user is counting on you to deliver a COMPLETE, WORKING, DEPLOYABLE application. This is not a mockup, tutorial, or proof-of-concept - it's the real thing that must work immediately.
+""")
+
+def orchestrator_task_prompt(project_idea: str, chosen_strategy: str, architecture_doc: str, config_context: str,
+                             additional_context: str, file_context: str, retry_instructions: str = "") -> str:
+    """The orchestrator's build mission: the static rules, then this project (retry instructions first)."""
+    return ORCHESTRATOR_PROMPT_PREFIX + f"""
+{'='*80}
+# 📌 PROJECT SPECIFICS
+{'='*80}
+{f'''
+{retry_instructions}
+
+{'='*80}
+''' if retry_instructions else ''}
+## 📝 USER'S PROJECT IDEA
+
+{project_idea}
+
+## 🏗️ BASE TECHNOLOGY PACKAGE (USER'S CHOICE)
+
+{chosen_strategy}
+
+## 🏛️ TECHNICAL ARCHITECTURE
+{architecture_doc if architecture_doc else 'No detailed architecture provided - design as you implement'}
+
+{config_context}
+{additional_context}
+{file_context}
+"""
+
+def build_expected_output(chosen_strategy: str) -> str:
+    """Expected output of the orchestrated build task."""
+    return (
+        "A complete Deployment Kit in markdown format containing:\n"
+        "1. All source code files (frontend, backend, database, config)\n"
+        "2. .gitignore file\n"
+        "3. Complete dependency files (package.json, requirements.txt, etc.)\n"
+        "4. Environment configuration (.env.example)\n"
+        "5. Step-by-step deployment guide for the chosen platform\n"
+        "6. README with project overview and local development instructions\n"
+        "7. Troubleshooting section\n\n"
+        "Format: Each file must be in markdown code blocks with clear file paths.\n"
+        f"Tech Stack: MUST match {chosen_strategy}\n"
+        "Quality: Production-ready, complete, and immediately deployable."
+    )
+
+INTEGRATION_PROMPT_PREFIX = static_prefix("integration_check", """
+Review the generated code (at the end of this message) and validate that all components integrate correctly.
+
+## Your Task
+Validate:
+1. **API Contract Consistency**: Frontend requests match backend endpoints
+2. **Data Flow**: Database schema → Backend models → API responses → Frontend state
+3. **Configuration Sync**: CORS, environment variables, connection strings
+4. **Dependency Compatibility**: No conflicting package versions
+5. **Deployment Readiness**: Services can reach each other after deployment
+
+Output an Integration Report identifying any mismatches, missing configurations, or integration issues.
+If everything looks good, confirm: "✅ All components integrate correctly."
+""")
+
+def integration_task_prompt(final_output: str) -> str:
+    """Phase 3: cross-component integration review."""
+    return INTEGRATION_PROMPT_PREFIX + f"""
+## Generated Code
+{final_output[:5000]}... (truncated for review)
+"""
+
+QA_PROMPT_PREFIX = static_prefix("qa_validation", """
+Perform comprehensive QA validation on the generated deployment kit (at the end of this message).
+
+## VALIDATION CHECKLIST
+Run through your complete validation checklist:
+
+**Code Quality:**
+1. Check for placeholder comments: "// TODO", "# Logic here", "{/* Add logic */}"
+2. Check for empty functions or handlers
+3. Check for mock/hardcoded test data
+4. Verify all imports reference existing files
+5. Confirm all functions have complete implementations
+
+**Completeness:**
+6. Verify entry points exist (server.py, index.html, App.js)
+7. Check dependencies are listed completely
+8. Verify .env.example documents all variables
+9. Count files (should be 15+ for full-stack apps)
+
+**Documentation:**
+10. README has setup instructions
+11. Deployment guide is complete
+12. API endpoints are documented
+
+**Architecture:**
+13. CORS configured correctly
+14. Error handling present
+15. Input validation implemented
+
+## OUTPUT FORMAT
+Provide:
+- **Overall Status**: ✅ PASS or ❌ FAIL
+- **Failed Checks**: List violations with file/line references
+- **Severity**: Critical/High/Medium/Low for each issue
+- **Recommendations**: Specific fixes needed
+
+Be thorough and uncompromising. If code has placeholders or is incomplete, REJECT it.
+""")
+
+def qa_task_prompt(final_output: str) -> str:
+    """Phase 4: QA validation checklist."""
+    return QA_PROMPT_PREFIX + f"""
+## Generated Code
+{final_output}
+"""
+
+DOCUMENTATION_PROMPT_PREFIX = static_prefix("documentation", """
+Review the generated deployment kit (at the end of this message) and enhance the documentation.
+
+## Your Task
+Enhance or create:
+1. **README.md**: Complete setup guide, prerequisites, installation steps
+2. **Deployment Guide**: Platform-specific instructions with exact commands
+3. **API Documentation**: All endpoints with examples
+4. **Troubleshooting**: Common issues and solutions
+5. **Code Comments**: Ensure complex logic is explained
+
+Output enhanced documentation sections in Markdown format.
+""")
+
+def documentation_task_prompt(final_output: str, chosen_strategy: str) -> str:
+    """Phase 5: documentation enhancement."""
+    return DOCUMENTATION_PROMPT_PREFIX + f"""
+## Technology Stack
+{chosen_strategy}
+
+## Generated Code
+{final_output[:5000]}... (focus on README and deployment sections)
+"""
+
+
+# ------------------------------------------------------------------------------
+# Placeholder scan (QA agents sometimes pass code with stubs in it)
+# ------------------------------------------------------------------------------
+PLACEHOLDER_PATTERNS = [
+    # Explicit placeholders
+    r'//\s*TODO',
+    r'//\s*FIXME',
+    r'//\s*XXX',
+    r'#\s*TODO',
+    r'#\s*FIXME',
+    r'#\s*XXX',
+    r'/\*\s*TODO',
+    r'/\*\s*FIXME',
+    
+    # Action-based placeholders
+    r'//\s*Add\s+(logic|code|implementation|function)',
+    r'//\s*(Implement|Replace|Complete|Fill\s+in)',
+    r'#\s*Add\s+(logic|code|implementation|function)',
+    r'#\s*(Implement|Replace|Complete|Fill\s+in)',
+    
+    # Ellipsis placeholders (very common!)
+    r'//\s*\.{3,}',  # // ...
+    r'#\s*\.{3,}',   # # ...
+    r'//\s*\.{3,}.*?(logic|code|API|function|here)',  # // ... Logic here
+    r'#\s*\.{3,}.*?(logic|code|API|function|here)',   # # ... logic here
+    
+    # "Logic here" patterns
+    r'//\s*Logic\s+(here|to\s+call|goes\s+here)',
+    r'#\s*Logic\s+(here|to\s+call|goes\s+here)',
+    
+    # Mock/Dummy/Test data indicators
+    r'//\s*(Mock|Dummy|Test)\s+(data|results?|response)',
+    r'#\s*(Mock|Dummy|Test)\s+(data|results?|response)',
+    r'//\s*Placeholder',
+    r'#\s*Placeholder',
+    
+    # Empty implementation indicators
+    r'pass\s*#.*(placeholder|TODO|implement|logic|here)',
+    r'return\s+None\s*#.*(placeholder|TODO|implement)',
+    r'return\s+\{\}\s*#.*(placeholder|TODO|mock|dummy)',
+    
+    # Common stub patterns
+    r'//\s*Your\s+code\s+here',
+    r'#\s*Your\s+code\s+here',
+    r'//\s*Write\s+your',
+    r'#\s*Write\s+your',
+    
+    # Framework/library specific stubs
+    r'//\s*Component\s+logic\s+here',
+    r'//\s*API\s+call\s+here',
+    r'#\s*API\s+call\s+here',
+    r'//\s*State\s+management\s+here',
+]
+
+def scan_placeholders(final_output: str) -> List[Dict[str, Any]]:
+    """
+    Find placeholder/stub comments in generated code.
+
+    Returns: [{'pattern': matched text, 'line': 1-based line, 'file': nearest "File:" header}]
+    """
+    detected_placeholders = []
+    for pattern in PLACEHOLDER_PATTERNS:
+        matches = re.finditer(pattern, final_output, re.IGNORECASE)
+        for match in matches:
+            # Find line number
+            line_num = final_output[:match.start()].count('\n') + 1
+            context_start = max(0, match.start() - 100)
+            context_end = min(len(final_output), match.end() + 100)
+            context = final_output[context_start:context_end]
+            
+            # Try to extract filename from context
+            file_match = re.search(r'File:\s*([^\n]+)', context[::-1])
+            filename = file_match.group(1)[::-1] if file_match else "Unknown file"
+            
+            detected_placeholders.append({
+                'pattern': match.group(),
+                'line': line_num,
+                'file': filename
+            })
+    
+    return detected_placeholders
+
+def placeholder_override_report(qa_report: str, detected_placeholders: List[Dict[str, Any]]) -> str:
+    """Replace a passing QA report with a FAIL listing the detected placeholders."""
+    placeholder_list = "\n".join([
+        f"- **{p['file']}**: Line {p['line']} - `{p['pattern']}`" 
+        for p in detected_placeholders[:10]  # Limit to first 10
+    ])
+    
+    return f"""
+## ❌ FAIL - Placeholder Code Detected
+
+**CRITICAL**: The QA agent initially passed this code, but automated scanning detected placeholder comments.
+
+### Detected Placeholder Code:
+{placeholder_list}
+{f"...and {len(detected_placeholders) - 10} more" if len(detected_placeholders) > 10 else ""}
+
+### Issue:
+Placeholder comments indicate incomplete implementations. All functions must have complete business logic.
+
+### Severity: Critical
+
+### Recommendations:
+Replace all placeholder comments with actual implementations using the extracted patterns from Phase 1.
+
+---
+
+**Original QA Report (OVERRIDDEN):**
+{qa_report}
+"""
+
+def qa_failed(qa_report: str) -> bool:
+    """True when the QA report rejects the kit."""
+    return "❌ FAIL" in qa_report or "REJECT" in qa_report.upper()
+
+# ------------------------------------------------------------------------------
+# Environment variables
+# ------------------------------------------------------------------------------
+# Every env-var access form we understand, compiled once into a single
+# alternation so each file is scanned in one pass. Each branch captures the
+# variable name in its own group and, where the language allows it, the
+# default expression that makes the variable optional. The leading lookahead
+# rejects positions that cannot start any branch before the alternation is
+# tried, which keeps multi-MB kits fast.
+_ENV_NAME = r'[A-Za-z_][A-Za-z0-9_]*'
+# One default value (an `or` / `||` / `??` operand or a getenv second argument):
+# a literal, or a name or call with up to one level of nested parentheses. The
+# `or` fallback is captured in a lookahead, so an env access used as the
+# fallback is still matched on its own. A second argument that isn't a single
+# operand (`int(x) + 1`) falls back to the text up to the closing parenthesis.
+_ENV_OPERAND = (r'''(?:"[^"\n]*"|'[^'\n]*'|`[^`\n]*`|-?\d+(?:\.\d+)?'''
+                r'''|[A-Za-z_$][\w.$]*(?:\((?:[^()\n]|\([^()\n]*\))*\))?)''')
+_ENV_USAGE_PATTERN = re.compile(
+    rf'''
+    (?=[ogesip])
+    (?:
+      \b(?:os\.)?getenv\(\s*["'](?P<py_getenv>{_ENV_NAME})["']\s*(?P<py_getenv_default>,\s*(?:{_ENV_OPERAND}|[^)\n]+))?\s*\)
+        (?=(?P<py_getenv_or>\s+or\s+{_ENV_OPERAND}))?
+    | \b(?:os\.)?environ\.get\(\s*["'](?P<py_environ_get>{_ENV_NAME})["']\s*(?P<py_environ_get_default>,\s*(?:{_ENV_OPERAND}|[^)\n]+))?\s*\)
+        (?=(?P<py_environ_get_or>\s+or\s+{_ENV_OPERAND}))?
+    | \b(?:os\.)?environ\[\s*["'](?P<py_environ>{_ENV_NAME})["']\s*\]
+    | st\.secrets\.get\(\s*["'](?P<st_get>{_ENV_NAME})["']\s*(?P<st_get_default>,\s*(?:{_ENV_OPERAND}|[^)\n]+))?\s*\)
+    | st\.secrets\[\s*["'](?P<st_item>{_ENV_NAME})["']\s*\]
+    | (?:process\.env|import\.meta\.env)
+        (?:\.(?P<js_attr>{_ENV_NAME})|\[\s*["'`](?P<js_item>{_ENV_NAME})["'`]\s*\])
+        (?=(?P<js_default>\s*(?:\|\||\?\?)\s*{_ENV_OPERAND}))?
+    )
+    ''',
+    re.VERBOSE,
+)
+_ENV_NAME_GROUPS = {
+    'py_getenv': ('py_getenv_default', 'py_getenv_or'),
+    'py_environ_get': ('py_environ_get_default', 'py_environ_get_or'),
+    'py_environ': (),
+    'st_get': ('st_get_default',),
+    'st_item': (),
+    'js_attr': ('js_default',),
+    'js_item': ('js_default',),
+}
+_DOTENV_LINE_PATTERN = re.compile(
+    rf'^[ \t]*(?:export[ \t]+)?(?P<name>{_ENV_NAME})[ \t]*=[ \t]*(?P<value>[^\n]*)$',
+    re.MULTILINE,
+)
+# Fallbacks that leave the variable unset in practice: it is still required
+_ENV_EMPTY_DEFAULTS = {'None', 'null', 'undefined', ''}
+# Names Vite defines on import.meta.env that are not environment variables
+_ENV_IGNORED_NAMES = {'NODE_ENV', 'MODE', 'DEV', 'PROD', 'SSR', 'BASE_URL'}
+
+
+def _is_dotenv_file(filepath: str) -> bool:
+    """True for .env, .env.example, .env.local and friends."""
+    return Path(filepath).name.lower().startswith('.env')
+
+
+def _clean_env_default(raw: str) -> str:
+    """Strip the separator and quotes from a captured default expression."""
+    value = raw.strip()
+    for prefix in (',', '||', '??', 'or '):
+        if value.startswith(prefix):
+            value = value[len(prefix):].strip()
+            break
+    if len(value) >= 2 and value[0] == value[-1] and value[0] in '"\'`':
+        value = value[1:-1]
+    return value
+
+
+def scan_env_usage(files: Dict[str, str]) -> Dict[str, Any]:
+    """
+    Scan extracted kit files for environment variable usage in a single pass per file.
+
+    Returns: {
+        'variables': {NAME: {'required': bool, 'defaults': List[str],
+                             'locations': List[{'file', 'line'}]}},
+        'required': List[str],   # used at least once without a default
+        'defaulted': List[str],  # every usage has a fallback value
+        'declared': {NAME: {'file', 'line', 'value'}}  # from .env* files
+    }
+    """
+    variables: Dict[str, Dict[str, Any]] = {}
+    declared: Dict[str, Dict[str, Any]] = {}
+
+    for filepath, content in files.items():
+        if not content:
+            continue
+        # Matches arrive in order, so line numbers are tracked incrementally
+        # (str.count runs in C) instead of re-counting from the start each time
+        line, last_pos = 1, 0
+
+        if _is_dotenv_file(filepath):
+            for match in _DOTENV_LINE_PATTERN.finditer(content):
+                line += content.count('\n', last_pos, match.start())
+                last_pos = match.start()
+                declared.setdefault(match.group('name'), {
+                    'file': filepath,
+                    'line': line,
+                    'value': match.group('value').strip(),
+                })
+            continue
+
+        for match in _ENV_USAGE_PATTERN.finditer(content):
+            line += content.count('\n', last_pos, match.start())
+            last_pos = match.start()
+            groups = match.groupdict()
+            name_group = next(g for g in _ENV_NAME_GROUPS if groups.get(g))
+            name = groups[name_group]
+            if name in _ENV_IGNORED_NAMES and match.group(0).startswith('import.meta.env'):
+                continue
+
+            default = None
+            for default_group in _ENV_NAME_GROUPS[name_group]:
+                if groups.get(default_group):
+                    default = _clean_env_default(groups[default_group])
+                    if default not in _ENV_EMPTY_DEFAULTS:
+                        break
+                    default = None
+
+            entry = variables.setdefault(name, {'required': False, 'defaults': [], 'locations': []})
+            entry['locations'].append({'file': filepath, 'line': line})
+            if default is None:
+                entry['required'] = True
+            elif default not in entry['defaults']:
+                entry['defaults'].append(default)
+
+    return {
+        'variables': variables,
+        'required': sorted(name for name, v in variables.items() if v['required']),
+        'defaulted': sorted(name for name, v in variables.items() if not v['required']),
+        'declared': declared,
+    }
+
+# ------------------------------------------------------------------------------
+# Kit files
+# ------------------------------------------------------------------------------
+_KIT_FILE_HEADER = re.compile(r'###\s+File:\s+([^\n]+)\n\s*(`{3,})(\w+)?\n')
+_FENCE_LINE = re.compile(r'^[ \t]*(`{3,})([^`\n]*)$', re.MULTILINE)
+
+def kit_file_blocks(result_text: str) -> List[tuple]:
+    """
+    Every `### File:` block of a kit as (path, body_start, body_end).
+
+    The body ends at the first bare fence at least as long as the opening one
+    that doesn't close a fence opened inside the file (```bash in a README),
+    so Markdown files with their own code blocks are read whole.
+    """
+    blocks = []
+    position = 0
+    while True:
+        header = _KIT_FILE_HEADER.search(result_text, position)
+        if header is None:
+            return blocks
+        position = header.end()
+        depth = 0
+        for fence in _FENCE_LINE.finditer(result_text, header.end()):
+            if fence.group(2).strip():
+                depth += 1
+            elif depth:
+                depth -= 1
+            elif len(fence.group(1)) >= len(header.group(2)):
+                blocks.append((header.group(1).strip(), header.end(), fence.start()))
+                position = fence.end()
+                break
+
+@tracing.traced("helper")
+def extract_code_files_from_result(result_text: str) -> Dict[str, str]:
+    """Extract code files from markdown result (### File: name followed by a fenced block)."""
+    return {path: result_text[start:end].strip() for path, start, end in kit_file_blocks(result_text)}
+
+@tracing.traced("helper")
+def create_project_zip(files: Dict[str, str], project_name: str = "project") -> bytes:
+    """Create a ZIP file from extracted code files."""
+    zip_buffer = io.BytesIO()
+    
+    with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
+        for filepath, content in files.items():
+            zip_file.writestr(filepath, content)
+    
+    zip_buffer.seek(0)
+    return zip_buffer.getvalue()
+
+@tracing.traced("helper")
+def write_files_to_directory(files: Dict[str, str], base_path: str) -> tuple:
+    """Write extracted files to a local directory."""
+    try:
+        base_dir = Path(base_path)
+        base_dir.mkdir(parents=True, exist_ok=True)
+        
+        written_files = []
+        for filepath, content in files.items():
+            full_path = base_dir / filepath
+            full_path.parent.mkdir(parents=True, exist_ok=True)
+            
+            with open(full_path, 'w', encoding='utf-8') as f:
+                f.write(content)
+            
+            written_files.append(str(full_path))
+        
+        return True, written_files
+    except Exception as e:
+        return False, str(e)
+
+# ------------------------------------------------------------------------------
+# CrewAI execution
+# ------------------------------------------------------------------------------
+def build_crewai_agent(profile: Dict[str, Any], phase: str | None = None) -> Agent:
+    """
+    Build a CrewAI Agent from a stored profile.
+
+    Model, temperature, max output tokens and timeout are resolved per phase
+    (see model_routing.py) and can be overridden by the profile's `llm` field.
+    Every call the agent's LLM makes goes through the shared rate limiter.
+    CrewAI will read the OpenAI key from the environment.
+    """
+    settings = resolve_llm_settings(profile, phase)
+
+    return Agent(
+        role=profile.get("role", "Agent"),
+        goal=profile.get("goal", ""),
+        backstory=profile.get("backstory", ""),
+        allow_delegation=bool(profile.get("allow_delegation", True)),
+        llm=rate_limited_llm(LLM(
+            model=settings["model"],
+            temperature=settings["temperature"],
+            max_tokens=settings["max_tokens"],
+            timeout=settings["timeout"],
+        )),
+        verbose=settings["verbose"],
+    )
+
+def _llm_tokens_used(llm: Any) -> int:
+    """Total tokens an LLM instance has reported so far (0 if it doesn't track usage)."""
+    try:
+        return int(llm.get_token_usage_summary().total_tokens or 0)
+    except Exception:
+        return 0
+
+def rate_limited_llm(llm: LLM) -> LLM:
+    """
+    Route each call this LLM makes through the shared rate limiter.
+
+    Every agent step, tool round-trip and manager delegation is one call, so
+    the RPM/TPM buckets count real requests, and a 429 retries only the call
+    that hit it instead of the whole crew. Tokens are reserved as message
+    chars / 4 plus the output budget, then corrected with the usage the LLM
+    reported for the call.
+    """
+    inner = llm.call
+
+    def call(messages, *args, **kwargs):
+        if isinstance(messages, str):
+            prompt_chars = len(messages)
+        else:
+            prompt_chars = sum(len(str(message.get('content') or '')) for message in messages)
+        estimated_tokens = prompt_chars // 4 + int(getattr(llm, 'max_tokens', 0) or 0)
+        used_before = _llm_tokens_used(llm)
+        result, _ = get_rate_limiter().call(
+            lambda: inner(messages, *args, **kwargs),
+            estimated_tokens=estimated_tokens,
+            key=llm.model,
+            usage_of=lambda _: (_llm_tokens_used(llm) - used_before) or None,
+        )
+        return result
+
+    llm.call = call
+    return llm
+
+def get_token_usage(result: Any) -> Dict[str, int]:
+    """Pull prompt/completion token counts from a CrewOutput (zeros if unavailable)."""
+    usage = getattr(result, 'token_usage', None)
+    return {
+        'prompt_tokens': int(getattr(usage, 'prompt_tokens', 0) or 0),
+        'completion_tokens': int(getattr(usage, 'completion_tokens', 0) or 0),
+        'cached_prompt_tokens': int(getattr(usage, 'cached_prompt_tokens', 0) or 0),
+    }
+
+_WHOLE_FILE = re.compile(r"^### 📋 IMPLEMENTATION FILE \d+: (.+) \([^()\n]*\)$", re.MULTILINE)
+_EXCERPT = re.compile(r"^#### 📎 EXCERPT \[(.+?), lines \d+-\d+\]$", re.MULTILINE)
+
+def reference_chunks_in(prompt_text: str) -> str:
+    """The uploaded files (whole) and excerpts (file#chunk) a prompt carries, comma-separated."""
+    used = [f"{name} (whole)" for name in _WHOLE_FILE.findall(prompt_text or "")]
+    used += _EXCERPT.findall(prompt_text or "")
+    return ", ".join(dict.fromkeys(used))
+
+def build_call_metrics(phase: str, role: str, settings: Dict[str, Any], latency: float,
+                       result: Any = None, error: str | None = None, queue_wait: float = 0.0,
+                       prompt_text: str = "") -> Dict[str, Any]:
+    """
+    Describe one LLM-backed call (model, latency, queue wait, tokens, cost) for
+    run metadata, with the fingerprint of the static prompt prefix it was sent with
+    and the reference files or excerpts it included.
+    """
+    usage = get_token_usage(result)
+    return {
+        'ts': time.time(),
+        'phase': phase,
+        'role': role,
+        'model': settings.get('model'),
+        'temperature': settings.get('temperature'),
+        'latency': round(latency, 2),
+        'queue_wait': round(queue_wait, 2),
+        **usage,
+        **prompt_prefix_fingerprint(prompt_text),
+        'reference_chunks': reference_chunks_in(prompt_text),
+        'cost': round(estimate_cost(settings.get('model', ''), usage['prompt_tokens'], usage['completion_tokens'],
+                                    usage['cached_prompt_tokens']), 5),
+        'outcome': 'error' if error else 'ok',
+    }
+
+def kickoff_with_rate_limit(crew: Crew, settings: Dict[str, Any], prompt_text: str, on_wait=None,
+                            run_id: str | None = None) -> tuple:
+    """
+    Kick off a crew through the active LLM backend.
+    The live backend's agents throttle and retry each LLM call themselves
+    (see rate_limited_llm); the kickoff is never re-run as a whole. Simulated
+    backends (fake/replay) stand in for the LLM, so their kickoff counts as one
+    limited call, reserved as prompt chars / 4 plus the output budget.
+    `on_wait` is shown while any of the calls is queued.
+    `run_id` ties the kickoff to the run's trace and cassette.
+    
+    Returns: (result, seconds the kickoff's calls spent queued or backing off)
+    """
+    backend = get_llm_backend()
+    lead = crew.manager_agent or (crew.agents[0] if crew.agents else None)
+    backend_settings = {**settings, 'run_id': run_id}
+    with tracing.span(f"kickoff.{settings.get('phase', 'default')}", kind="agent", trace_id=run_id,
+                      role=getattr(lead, 'role', ''), model=settings.get('model'),
+                      prompt_prefix=prompt_prefix_fingerprint(prompt_text)['prompt_prefix'],
+                      reference_chunks=reference_chunks_in(prompt_text)) as kickoff_span:
+        queued_at = time.time()
+        with limiter_scope(on_wait=on_wait) as scope:
+            if getattr(backend, 'name', 'live') in ('fake', 'replay'):
+                def actual_tokens(result: Any):
+                    usage = get_token_usage(result)
+                    return (usage['prompt_tokens'] + usage['completion_tokens']) or None
+
+                result, _ = get_rate_limiter().call(
+                    lambda: backend.kickoff(crew, backend_settings, prompt_text),
+                    estimated_tokens=len(prompt_text) // 4 + int(settings.get('max_tokens') or 0),
+                    key=settings.get('model', 'default'),
+                    usage_of=actual_tokens,
+                )
+            else:
+                result = backend.kickoff(crew, backend_settings, prompt_text)
+        queue_wait = scope.queued
+        if queue_wait > 0.05:
+            tracing.record_span("rate_limit.wait", "wait", queued_at, queued_at + queue_wait)
+        kickoff_span.set(queue_wait=round(queue_wait, 2), llm_calls=scope.calls, **get_token_usage(result))
+    return result, queue_wait
+
+def extract_final_output(result: Any) -> str:
+    """The COMPLETE output of a crew run (not just the summary)."""
+    # Method 1: Try to get the full task output
+    if hasattr(result, 'tasks_output') and result.tasks_output:
+        return str(result.tasks_output[0].raw if hasattr(result.tasks_output[0], 'raw') else result.tasks_output[0])
+    # Method 2: Try result.raw
+    if hasattr(result, 'raw'):
+        return str(result.raw)
+    # Method 3: Try result.output
+    if hasattr(result, 'output'):
+        return str(result.output)
+    # Method 4: Try converting entire result
+    return str(result)
+
+def run_agent_task(agent_profile: Dict[str, Any], task_description: str, expected_output: str,
+                   phase: str | None = None, run_id: str | None = None, on_wait=None) -> tuple:
+    """
+    Run a single agent on a specific task.
+    Used for multi-phase workflows (PM → Architect → Extract → etc.)
+
+    Never raises: failures come back as an "Error running ..." text with an
+    error outcome in the metrics, like the interactive flow.
+
+    Returns: (result_text, call_metrics)
+    """
+    role = agent_profile.get('role', 'agent')
+    settings = resolve_llm_settings(agent_profile, phase)
+    start = time.perf_counter()
+    try:
+        agent = build_crewai_agent(agent_profile, phase)
+        task = Task(description=task_description, expected_output=expected_output, agent=agent)
+        # A crew with just this one agent
+        crew = Crew(agents=[agent], tasks=[task], process=Process.sequential, verbose=False)
+
+        result, queue_wait = kickoff_with_rate_limit(crew, settings, task_description, on_wait=on_wait, run_id=run_id)
+        return str(result), build_call_metrics(settings['phase'], role, settings, time.perf_counter() - start, result,
+                                               queue_wait=queue_wait, prompt_text=task_description)
+    except Exception as e:
+        return (f"Error running {role}: {str(e)}",
+                build_call_metrics(settings['phase'], role, settings, time.perf_counter() - start, error=str(e),
+                                   prompt_text=task_description))
+
+def build_orchestrated_crew(saved_agents: List[Dict[str, Any]], orchestrator_profile: Dict[str, Any],
+                            task_description: str, chosen_strategy: str, run_id: str | None = None) -> Crew:
+    """
+    Hierarchical build crew: the orchestrator manages, every other stored agent is a worker.
+    In hierarchical mode manager_agent is separate and the agents list holds only workers.
+    """
+    orchestrator_agent = build_crewai_agent(orchestrator_profile, phase='build')
+    worker_agents = [
+        build_crewai_agent(profile, phase='build')
+        for profile in saved_agents
+        if profile['id'] != orchestrator_profile['id']
+    ]
+    build_task = Task(
+        description=task_description,
+        expected_output=build_expected_output(chosen_strategy),
+        agent=orchestrator_agent
+    )
+    return Crew(
+        agents=worker_agents if worker_agents else [orchestrator_agent],  # Use workers, or orchestrator if no workers
+        tasks=[build_task],
+        process=Process.hierarchical,
+        manager_agent=orchestrator_agent,
+        step_callback=tracing.step_recorder(run_id),
+        verbose=True
+    )
+
+# ------------------------------------------------------------------------------
+# Fan-out build mode: manifest first, then files in parallel
+# ------------------------------------------------------------------------------
+BUILD_MODES = {
+    'crew': "Single crew (orchestrator writes the whole kit)",
+    'fanout': "Parallel files (manifest, then one task per file group)",
+}
+FANOUT_CONCURRENCY = 6
+FANOUT_GROUP_SIZE = 3
+
+MANIFEST_EXPECTED_OUTPUT = "A JSON file manifest listing every file of the deployment kit with its responsibility and interfaces."
+FILE_GROUP_EXPECTED_OUTPUT = "The complete contents of every assigned file, each as a `### File:` heading followed by one fenced code block."
+
+LANGUAGE_BY_EXTENSION = {
+    'py': 'python', 'js': 'javascript', 'jsx': 'javascript', 'ts': 'typescript', 'tsx': 'typescript',
+    'md': 'markdown', 'json': 'json', 'html': 'html', 'css': 'css', 'sql': 'sql', 'yml': 'yaml',
+    'yaml': 'yaml', 'toml': 'toml', 'sh': 'bash', 'txt': 'text', 'env': 'bash', 'example': 'bash',
+}
+
+MANIFEST_PROMPT_PREFIX = static_prefix("build_manifest", """
+# 🎯 DEPLOYMENT KIT PLAN
+
+You are the Orchestrator. Before any code is written, plan the COMPLETE deployment kit as a file
+manifest. Specialist agents will then write the files in parallel from your manifest, so every
+file must be listed and every cross-file interface must be spelled out. The project (idea,
+technology package - which MUST be followed - architecture and requirements) is at the end of
+this message.
+
+## 📋 OUTPUT FORMAT
+
+Respond with ONLY a JSON object in a ```json code block:
+
+```json
+{
+  "project_name": "short-kebab-name",
+  "shared_notes": "Conventions every file must follow: API base URL, auth scheme, env var names, naming.",
+  "files": [
+    {
+      "path": "backend/app.py",
+      "responsibility": "What this file does, in one or two sentences.",
+      "interfaces": "Functions/classes/endpoints/props it exposes, with exact names and signatures.",
+      "depends_on": ["backend/models.py"]
+    }
+  ]
+}
+```
+
+Include source files, configuration (requirements.txt / package.json), .env.example, .gitignore,
+README.md and deployment config. Use the exact paths the code will import.
+""")
+
+def manifest_task_prompt(project_idea: str, chosen_strategy: str, architecture_doc: str, config_context: str,
+                         additional_context: str, file_context: str) -> str:
+    """Fan-out step 1: the orchestrator plans the kit as a file manifest instead of writing it."""
+    return MANIFEST_PROMPT_PREFIX + f"""
+## 🏗️ TECHNOLOGY PACKAGE (USER'S CHOICE - MUST BE FOLLOWED)
+
+{chosen_strategy}
+
+## 📝 USER'S PROJECT IDEA
+
+{project_idea}
+
+## 🏛️ ARCHITECTURE
+
+{architecture_doc or 'No architecture document - design it yourself from the idea and package.'}
+{additional_context}
+{config_context}
+{file_context}
+"""
+
+FILE_GROUP_PROMPT_PREFIX = static_prefix("build_files", """
+# 💻 WRITE YOUR ASSIGNED FILES
+
+You are one of several specialists writing a deployment kit in parallel. Other agents are writing the
+other files RIGHT NOW from the same manifest, so match the listed interfaces EXACTLY. The project,
+the full manifest and the files assigned to you are at the end of this message.
+
+## 📋 OUTPUT FORMAT
+
+For EACH assigned file, output exactly:
+
+### File: path/to/file.ext
+```language
+complete file contents
+```
+
+❌ **NO PLACEHOLDER COMMENTS**: every function must be fully implemented - no TODOs, no
+"implement logic here", no mock data. Output ONLY your assigned files.
+""")
+
+def file_group_task_prompt(group: List[Dict[str, Any]], manifest: Dict[str, Any], project_idea: str,
+                           chosen_strategy: str, additional_context: str, file_context: str) -> str:
+    """Fan-out step 2: write one group of files against the shared manifest (only the assignment differs per group)."""
+    overview = "\n".join(
+        f"- `{entry['path']}`: {entry.get('responsibility', '')}"
+        + (f" Interfaces: {entry['interfaces']}" if entry.get('interfaces') else "")
+        for entry in manifest['files']
+    )
+    assigned = "\n\n".join(
+        f"### `{entry['path']}`\n"
+        f"- Responsibility: {entry.get('responsibility', '')}\n"
+        f"- Interfaces: {entry.get('interfaces', 'n/a')}\n"
+        f"- Depends on: {', '.join(entry.get('depends_on') or []) or 'nothing'}"
+        for entry in group
+    )
+    return FILE_GROUP_PROMPT_PREFIX + f"""
+## 🏗️ TECHNOLOGY PACKAGE
+
+{chosen_strategy}
+
+## 📝 PROJECT
+
+{project_idea}
+
+## 🤝 SHARED CONVENTIONS
+
+{manifest.get('shared_notes') or 'Follow the package defaults.'}
+{additional_context}
+{file_context}
+
+## 🗂️ FULL FILE MANIFEST (for reference - do NOT write these unless assigned)
+
+{overview}
+
+## ✍️ YOUR ASSIGNED FILES
+
+{assigned}
+"""
+
+def parse_manifest(text: str) -> Dict[str, Any]:
+    """
+    Read the orchestrator's JSON manifest (fenced or bare).
+
+    Raises ValueError if there is no usable manifest.
+    """
+    fenced = re.search(r'```(?:json)?\s*\n(.*?)```', text, re.DOTALL)
+    candidate = fenced.group(1) if fenced else text[text.find('{'):text.rfind('}') + 1]
+    try:
+        manifest = json.loads(candidate)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Manifest is not valid JSON: {e}") from e
+
+    entries, seen = [], set()
+    for entry in manifest.get('files') or []:
+        path = str(entry.get('path', '')).strip() if isinstance(entry, dict) else ''
+        path = (path[2:] if path.startswith('./') else path).lstrip('/')
+        if path and path not in seen:
+            seen.add(path)
+            entries.append({**entry, 'path': path})
+    if not entries:
+        raise ValueError("Manifest lists no files")
+    manifest['files'] = entries
+    return manifest
+
+def group_manifest(entries: List[Dict[str, Any]], group_size: int = FANOUT_GROUP_SIZE) -> List[List[Dict[str, Any]]]:
+    """Split manifest entries into groups of related files (same directory), at most `group_size` each."""
+    by_dir: Dict[str, List[Dict[str, Any]]] = {}
+    for entry in entries:
+        by_dir.setdefault(entry['path'].rsplit('/', 1)[0] if '/' in entry['path'] else '', []).append(entry)
+    groups = []
+    for files in by_dir.values():
+        groups.extend(files[i:i + group_size] for i in range(0, len(files), group_size))
+    return groups
+
+def pick_file_agent(group: List[Dict[str, Any]], saved_agents: List[Dict[str, Any]],
+                    fallback: Dict[str, Any]) -> Dict[str, Any]:
+    """Frontend-looking groups go to a frontend agent, the rest to a backend agent, else the fallback."""
+    frontend_ext = ('.js', '.jsx', '.ts', '.tsx', '.css', '.html', '.vue', '.svelte')
+    is_frontend = any(e['path'].startswith(('frontend/', 'client/', 'web/')) or e['path'].endswith(frontend_ext)
+                      for e in group)
+    keywords = ["frontend"] if is_frontend else ["backend", "developer", "coder"]
+    for keyword in keywords:
+        agent = find_agent_by_role(saved_agents, keyword)
+        if agent:
+            return agent
+    return fallback
+
+def assemble_deployment_kit(manifest: Dict[str, Any], generated: Dict[str, str]) -> str:
+    """Stitch generated files into the usual `### File:` kit, in manifest order; missing files are listed."""
+    sections = [f"# Deployment Kit: {manifest.get('project_name', 'project')}\n"]
+    if manifest.get('shared_notes'):
+        sections.append(f"## Conventions\n\n{manifest['shared_notes']}\n")
+    missing = []
+    for entry in manifest['files']:
+        path = entry['path']
+        if path not in generated:
+            missing.append(path)
+            continue
+        ext = path.rsplit('.', 1)[-1].lower() if '.' in path else 'text'
+        sections.append(f"### File: {path}\n```{LANGUAGE_BY_EXTENSION.get(ext, ext)}\n{generated[path]}\n```\n")
+    extra = [path for path in generated if path not in {e['path'] for e in manifest['files']}]
+    for path in extra:
+        ext = path.rsplit('.', 1)[-1].lower() if '.' in path else 'text'
+        sections.append(f"### File: {path}\n```{LANGUAGE_BY_EXTENSION.get(ext, ext)}\n{generated[path]}\n```\n")
+    if missing:
+        sections.append("## ⚠️ Missing Files\n\nThese manifest files were not generated:\n"
+                        + "\n".join(f"- {path}" for path in missing) + "\n")
+    return "\n".join(sections)
+
+def run_fanout_build(saved_agents: List[Dict[str, Any]], orchestrator_profile: Dict[str, Any], project_idea: str,
+                     chosen_strategy: str, architecture_doc: str, config_context: str, additional_context: str,
+                     file_context: str, run_id: str | None = None, on_wait=None,
+                     on_progress: Optional[Callable[[int, int], None]] = None,
+                     max_workers: int = FANOUT_CONCURRENCY) -> tuple:
+    """
+    Build the kit as manifest → parallel file groups → local assembly.
+
+    The orchestrator plans the files; each group of related files is written
+    by a matching specialist on its own thread (at most `max_workers` at once,
+    and all behind the shared rate limiter), so wall-clock follows the slowest
+    group rather than the whole kit. `on_progress(done, total)` reports groups.
+
+    Returns: (kit_text, call_metrics_list). Raises ValueError if the manifest is unusable.
+    """
+    metrics: List[Dict[str, Any]] = []
+    with tracing.span("build.manifest", kind="phase"):
+        manifest_text, manifest_metrics = run_agent_task(
+            orchestrator_profile,
+            manifest_task_prompt(project_idea, chosen_strategy, architecture_doc, config_context,
+                                 additional_context, file_context),
+            MANIFEST_EXPECTED_OUTPUT, phase='build_manifest', run_id=run_id, on_wait=on_wait,
+        )
+    metrics.append(manifest_metrics)
+    if manifest_metrics['outcome'] == 'error':
+        raise ValueError(manifest_text)
+    manifest = parse_manifest(manifest_text)
+
+    groups = group_manifest(manifest['files'])
+    generated: Dict[str, str] = {}
+    done = 0
+    if on_progress:
+        on_progress(0, len(groups))
+
+    def write_group(group: List[Dict[str, Any]]) -> tuple:
+        profile = pick_file_agent(group, saved_agents, orchestrator_profile)
+        with tracing.span("build.files", kind="phase", files=len(group), role=profile.get('role', '')):
+            return run_agent_task(
+                profile,
+                file_group_task_prompt(group, manifest, project_idea, chosen_strategy, additional_context, file_context),
+                FILE_GROUP_EXPECTED_OUTPUT, phase='build_files', run_id=run_id,
+            )
+
+    with tracing.span("build.fanout", kind="phase", groups=len(groups), files=len(manifest['files'])):
+        with ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="fanout") as pool:
+            # Each worker gets a copy of this context so its spans nest under the fan-out span
+            futures = [pool.submit(contextvars.copy_context().run, write_group, group) for group in groups]
+            for future in as_completed(futures):
+                text, group_metrics = future.result()
+                metrics.append(group_metrics)
+                generated.update(extract_code_files_from_result(text))
+                done += 1
+                if on_progress:
+                    on_progress(done, len(groups))
+
+    with tracing.span("build.assemble", kind="helper", files=len(generated)):
+        kit = assemble_deployment_kit(manifest, generated)
+    return kit, metrics
+
+# ------------------------------------------------------------------------------
+# Surgical retry: unified diffs for flagged files only
+# ------------------------------------------------------------------------------
+CODE_SUPERVISION_EXPECTED_OUTPUT = "A detailed Code Supervision Report with targeted fix instructions for each QA failure."
+SURGICAL_FIX_EXPECTED_OUTPUT = "A unified diff (--- a/path, +++ b/path, @@ hunks) fixing only the listed issues."
+SURGICAL_RETRY_CONCURRENCY = 4
+MAX_SURGICAL_RETRIES = int(os.getenv("MAX_SURGICAL_RETRIES", "1"))
+
+CODE_SUPERVISION_PROMPT_PREFIX = static_prefix("code_supervision", """
+You are reviewing a QA validation failure. Your job is to create TARGETED, SURGICAL fix instructions that prevent the "whack-a-mole" problem.
+The extracted patterns, the generated code and the failed QA report are at the end of this message.
+
+## Your Task
+Create a Code Supervision Report with PRECISE, TARGETED fix instructions for EACH issue found by QA.
+
+For each issue, provide:
+1. **File and Line**: Exact location
+2. **Issue**: What QA found
+3. **Required Fix**: Surgical instruction (fix ONLY this specific issue)
+4. **Implementation**: Code snippet or pattern reference to use
+5. **DO NOT**: What working code to preserve
+6. **Pattern Reference**: Which Phase 1 pattern to use (if applicable)
+
+CRITICAL: Your instructions must be SURGICAL, not wholesale rewrites. Fix the specific line/function flagged by QA without touching working code.
+
+Mark issues as:
+- **CRITICAL**: Must fix (breaks functionality)
+- **HIGH**: Should fix (security/quality)
+- **MEDIUM**: Nice to fix (docs/polish)
+
+Also identify which files QA did NOT flag - mark these as PRESERVE.
+
+Output your report in clear Markdown format with step-by-step fix instructions.
+""")
+
+def code_supervision_task_prompt(qa_report: str, extracted_patterns: str, final_output: str) -> str:
+    """Turn a failed QA report into targeted, per-file fix instructions."""
+    return CODE_SUPERVISION_PROMPT_PREFIX + f"""
+## Extracted Code Patterns from Phase 1
+{extracted_patterns[:3000]}... (truncated)
+
+## Generated Code (for context)
+{final_output[:3000]}... (truncated)
+
+## QA Validation Report (FAILED)
+{qa_report}
+"""
+
+def _mentions_path(text: str, path: str) -> bool:
+    """`path` appears in `text` as a whole path (app.py doesn't match webapp.py or src/app.py)."""
+    return re.search(r'(?<![\w./\\-])' + re.escape(path) + r'(?![\w/\\-]|\.\w)', text) is not None
+
+def flagged_files(report_text: str, kit_files: Dict[str, str]) -> List[str]:
+    """
+    Kit files a QA / supervision report asks to fix: explicit `**File:** \`path\``
+    references plus any kit path the report mentions, in kit order.
+    """
+    named = {path.strip() for path in re.findall(r'\*\*File:\*\*\s*`([^`]+)`', report_text)}
+    return [path for path in kit_files if path in named or _mentions_path(report_text, path)]
+
+def flagged_lines(report_text: str, path: str, content: str) -> List[int]:
+    """
+    1-based lines of `path` the reports point at ("line 42", "lines 10-14" on
+    or just after a line naming the file), plus placeholder-scan hits.
+    """
+    lines: List[int] = []
+    report_lines = report_text.split('\n')
+    for index, line in enumerate(report_lines):
+        if not _mentions_path(line, path):
+            continue
+        window = ' '.join(report_lines[index:index + 4])
+        for start, end in re.findall(r'[Ll]ines?\s+(\d+)(?:\s*[-–]\s*(\d+))?', window):
+            lines.extend(range(int(start), int(end or start) + 1))
+    lines.extend(p['line'] for p in scan_placeholders(content))
+    line_count = content.count('\n') + 1
+    return sorted({n for n in lines if 1 <= n <= line_count})
+
+SURGICAL_FIX_PROMPT_PREFIX = static_prefix("surgical_fix", """
+# 🔪 SURGICAL FIX
+
+QA rejected the file at the end of this message. Fix ONLY the issues listed with it. Do NOT rewrite
+the file, do NOT touch code that is not part of a listed issue, do NOT rename anything. Changes
+outside the flagged lines will be rejected automatically.
+
+The file is shown with line numbers for reference only - they are NOT part of the code.
+
+## Output format
+
+Respond with ONLY a unified diff in a ```diff block, with 3 lines of unchanged context per hunk:
+
+```diff
+--- a/path/to/file
++++ b/path/to/file
+@@ -<old line>,<old count> +<new line>,<new count> @@
+ unchanged context
+-line being replaced
++replacement line
+ unchanged context
+```
+""")
+
+def surgical_fix_task_prompt(path: str, content: str, issues: str) -> str:
+    """Ask for a unified diff for ONE flagged file, against its numbered original."""
+    ext = path.rsplit('.', 1)[-1].lower() if '.' in path else 'text'
+    return SURGICAL_FIX_PROMPT_PREFIX + f"""
+## SURGICAL FIX: `{path}`
+
+### Issues to fix
+
+{issues}
+
+### Original file
+
+```{LANGUAGE_BY_EXTENSION.get(ext, ext)}
+{with_line_numbers(content)}
+```
+
+Use `--- a/{path}` and `+++ b/{path}` as the diff headers.
+"""
+
+def replace_file_in_kit(kit: str, path: str, content: str) -> str:
+    """Swap one `### File:` block's code for `content`, leaving every other byte of the kit alone."""
+    for block_path, start, end in kit_file_blocks(kit):
+        if block_path == path:
+            return kit[:start] + content + '\n' + kit[end:]
+    return kit
+
+def run_surgical_retry(saved_agents: List[Dict[str, Any]], fallback_profile: Dict[str, Any], final_output: str,
+                       qa_report: str, supervision_report: str = "", run_id: str | None = None,
+                       max_workers: int = SURGICAL_RETRY_CONCURRENCY) -> tuple:
+    """
+    Fix only the files QA flagged, by asking for unified diffs and applying them locally.
+
+    One small task per flagged file (run in parallel), so the cost follows the
+    number of broken files rather than the kit size. Hunks that touch lines
+    nobody flagged are rejected, and every unflagged file is verified to be
+    byte-identical afterwards.
+
+    Returns: (patched_output, report, call_metrics_list), where report is
+    {'files': {path: {'applied', 'rejected', 'error'}}, 'files_to_fix', 'unchanged_verified'}
+    """
+    kit_files = extract_code_files_from_result(final_output)
+    issues_text = "\n\n".join(part for part in (supervision_report, qa_report) if part)
+    files_to_fix = flagged_files(issues_text, kit_files)
+    # Placeholder stubs count as flagged even if the report did not name the file
+    files_to_fix += [path for path, content in kit_files.items()
+                     if path not in files_to_fix and scan_placeholders(content)]
+    report: Dict[str, Any] = {'files': {}, 'files_to_fix': files_to_fix, 'unchanged_verified': True}
+    metrics: List[Dict[str, Any]] = []
+    if not files_to_fix:
+        return final_output, report, metrics
+
+    def fix_file(path: str) -> tuple:
+        content = kit_files[path]
+        profile = pick_file_agent([{'path': path}], saved_agents, fallback_profile)
+        with tracing.span("retry.file", kind="phase", file=path, role=profile.get('role', '')):
+            text, call_metrics = run_agent_task(
+                profile, surgical_fix_task_prompt(path, content, issues_text), SURGICAL_FIX_EXPECTED_OUTPUT,
+                phase='surgical_fix', run_id=run_id,
+            )
+            if call_metrics['outcome'] == 'error':
+                return path, None, {'applied': [], 'rejected': [], 'error': text}, call_metrics
+            hunks = parse_unified_diff(text)
+            # Diffs for other files are ignored: only this file may change
+            own_hunks = hunks.get(path) or (next(iter(hunks.values())) if len(hunks) == 1 else [])
+            result = apply_patch(content, own_hunks, allowed_regions(flagged_lines(issues_text, path, content)))
+            outcome = {'applied': result['applied'], 'rejected': result['rejected'],
+                       'error': None if own_hunks else "no diff for this file in the response"}
+            return path, result['text'] if result['applied'] else None, outcome, call_metrics
+
+    patched = final_output
+    with tracing.span("phase.surgical_retry", kind="phase", files=len(files_to_fix)):
+        with ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="retry") as pool:
+            futures = [pool.submit(contextvars.copy_context().run, fix_file, path) for path in files_to_fix]
+            results = [future.result() for future in futures]
+        for path, new_content, outcome, call_metrics in results:
+            metrics.append(call_metrics)
+            report['files'][path] = outcome
+            if new_content is not None:
+                patched = replace_file_in_kit(patched, path, new_content)
+
+        # Untouched files must come through byte-identical
+        patched_files = extract_code_files_from_result(patched)
+        changed = [path for path, content in kit_files.items()
+                   if path not in files_to_fix and patched_files.get(path) != content]
+        if changed:
+            report['unchanged_verified'] = False
+            report['error'] = f"unflagged files changed: {', '.join(changed)}; patch discarded"
+            return final_output, report, metrics
+    return patched, report, metrics
+
+# ------------------------------------------------------------------------------
+# Headless project run
+# ------------------------------------------------------------------------------
+def run_project(spec: Dict[str, Any], saved_agents: List[Dict[str, Any]], run_id: str | None = None,
+                on_event: Optional[Callable[[str, Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+    """
+    Run every build phase for one project spec (see module docstring), without Streamlit.
+
+    Phases are skipped when their agent is missing, as in the app. A kit that
+    fails QA gets up to MAX_SURGICAL_RETRIES surgical retries, each followed by
+    QA again. Each call is persisted to the telemetry store and traced under `run_id`.
+    `on_event(event, data)` receives 'phase_start' / 'phase_done' progress.
+
+    Returns: {
+        'run_id', 'status' ('ok' | 'qa_failed' | 'error'), 'error',
+        'output', 'phase_results', 'phase_metrics', 'elapsed_time',
+        'files': {path: content}, 'surgical_retries'
+    }
+    """
+    run_id = run_id or uuid4().hex
+    files_data = spec.get('files') or []
+    chosen_strategy = spec.get('package', '')
+    project_idea = spec.get('idea', '')
+    user_selections = {
+        'additional_features': spec.get('additional_features', ''),
+        'special_requirements': spec.get('special_requirements', ''),
+    }
+    phase_results: Dict[str, str] = {}
+    phase_metrics: List[Dict[str, Any]] = []
+    started = time.time()
+    report = {'run_id': run_id, 'status': 'ok', 'error': None, 'output': '', 'phase_results': phase_results,
+              'phase_metrics': phase_metrics, 'elapsed_time': 0, 'files': {}, 'surgical_retries': 0}
+
+    def emit(event: str, **data: Any) -> None:
+        if on_event:
+            on_event(event, {'run_id': run_id, **data})
+
+    def record(metrics: Dict[str, Any]) -> None:
+        phase_metrics.append(metrics)
+        try:
+            telemetry.record_call(metrics, run_id=run_id)
+        except Exception as e:
+            # Telemetry must never fail a build
+            logger.warning("Telemetry write failed: %s", e)
+
+    def run_phase(phase: str, profile: Dict[str, Any] | None, prompt: str, expected: str) -> str:
+        if not profile:
+            emit('phase_skipped', phase=phase)
+            return ""
+        emit('phase_start', phase=phase)
+        with tracing.span(f"phase.{phase}", kind="phase"):
+            text, metrics = run_agent_task(profile, prompt, expected, phase=phase, run_id=run_id)
+        record(metrics)
+        phase_results[phase] = text
+        emit('phase_done', phase=phase, outcome=metrics['outcome'], latency=metrics['latency'])
+        return text
+
+    orchestrator_profile = find_orchestrator(saved_agents)
+    if not orchestrator_profile:
+        report.update(status='error', error="Orchestrator Agent not found. Create an agent with 'Orchestrator' in the role name.")
+        return report
+
+    build_trace = tracing.start_span("build_run", kind="run", trace_id=run_id, root=True, headless=True)
+    try:
+        # PHASE 1: CODE EXTRACTION (if implementation files were provided)
+        extracted_patterns = ""
+        if files_data:
+            extracted_patterns = run_phase(
+                'code_extraction', find_code_extractor(saved_agents),
+                extraction_task_prompt(
+                    build_context_from_files(files_data, reference_query(project_idea, chosen_strategy, user_selections)),
+                    chosen_strategy),
+                EXTRACTION_EXPECTED_OUTPUT,
+            )
+
+        # PHASE 2: ARCHITECTURE DESIGN
+        architecture_doc = run_phase(
+            'architecture', find_solutions_architect(saved_agents),
+            architecture_task_prompt(project_idea, chosen_strategy, user_selections, extracted_patterns),
+            ARCHITECTURE_EXPECTED_OUTPUT,
+        )
+
+        # BUILD: hierarchical crew led by the orchestrator, or manifest + parallel files
+        config_context = format_config_context(spec.get('config', ''))
+        additional_context = format_additional_context(user_selections)
+        file_context = orchestrator_file_context(
+            files_data, extracted_patterns, reference_query(project_idea, chosen_strategy, user_selections))
+        emit('phase_start', phase='build')
+        build_start = time.time()
+        result, error = None, None
+        if spec.get('build_mode') == 'fanout':
+            try:
+                result, fanout_metrics = run_fanout_build(
+                    saved_agents, orchestrator_profile, project_idea, chosen_strategy, architecture_doc,
+                    config_context, additional_context, file_context, run_id=run_id,
+                )
+                for metrics in fanout_metrics:
+                    record(metrics)
+            except Exception as e:
+                error = str(e)
+        else:
+            build_prompt = orchestrator_task_prompt(
+                project_idea, chosen_strategy, architecture_doc, config_context, additional_context, file_context,
+            )
+            build_settings = resolve_llm_settings(orchestrator_profile, 'build')
+            queue_wait = 0.0
+            with tracing.span("phase.build", kind="phase"):
+                try:
+                    build_crew = build_orchestrated_crew(saved_agents, orchestrator_profile, build_prompt,
+                                                         chosen_strategy, run_id)
+                    result, queue_wait = kickoff_with_rate_limit(build_crew, build_settings, build_prompt, run_id=run_id)
+                except Exception as e:
+                    error = str(e)
+            record(build_call_metrics('build', orchestrator_profile.get('role', 'Orchestrator'), build_settings,
+                                      time.time() - build_start, result, error=error, queue_wait=queue_wait,
+                                      prompt_text=build_prompt))
+        emit('phase_done', phase='build', outcome='error' if error else 'ok')
+        if error:
+            build_trace.end(status="error", error=error)
+            report.update(status='error', error=f"Build failed: {error}", elapsed_time=int(time.time() - started))
+            return report
+
+        final_output = extract_final_output(result)
+        report['output'] = final_output
+
+        # PHASE 3: INTEGRATION VALIDATION
+        run_phase('integration_check', find_integration_coordinator(saved_agents),
+                  integration_task_prompt(final_output), INTEGRATION_EXPECTED_OUTPUT)
+
+        # PHASE 4: QA VALIDATION, backed by the placeholder scan (QA agents sometimes pass stubs)
+        qa_validator = find_qa_validation(saved_agents)
+
+        def validate(kit: str) -> str:
+            qa_report = run_phase('qa_validation', qa_validator, qa_task_prompt(kit), QA_EXPECTED_OUTPUT)
+            with tracing.span("qa.placeholder_scan", kind="helper", chars=len(kit)) as scan_span:
+                detected_placeholders = scan_placeholders(kit)
+                scan_span.set(matches=len(detected_placeholders))
+            if detected_placeholders and ("✅ PASS" in qa_report or "No placeholder code" in qa_report):
+                qa_report = placeholder_override_report(qa_report, detected_placeholders)
+                phase_results['qa_validation'] = qa_report
+            return qa_report
+
+        if qa_validator:
+            qa_report = validate(final_output)
+            # SURGICAL RETRY: unified diffs for the flagged files only, applied locally, then QA again
+            while qa_failed(qa_report) and report['surgical_retries'] < MAX_SURGICAL_RETRIES:
+                report['surgical_retries'] += 1
+                emit('phase_start', phase='surgical_retry', attempt=report['surgical_retries'])
+                code_supervisor = find_code_supervisor(saved_agents)
+                supervision_report = run_phase(
+                    'code_supervision', code_supervisor,
+                    code_supervision_task_prompt(qa_report, extracted_patterns or 'No patterns extracted', final_output),
+                    CODE_SUPERVISION_EXPECTED_OUTPUT,
+                )
+                patched_output, patch_report, retry_metrics = run_surgical_retry(
+                    saved_agents, code_supervisor or orchestrator_profile, final_output, qa_report,
+                    supervision_report, run_id=run_id,
+                )
+                for metrics in retry_metrics:
+                    record(metrics)
+                emit('phase_done', phase='surgical_retry', outcome='error' if patch_report.get('error') else 'ok',
+                     files=len(patch_report['files']))
+                if patched_output == final_output:
+                    break
+                final_output = patched_output
+                report['output'] = final_output
+                qa_report = validate(final_output)
+            if qa_failed(qa_report):
+                report['status'] = 'qa_failed'
+
+        # PHASE 5: DOCUMENTATION ENHANCEMENT
+        run_phase('documentation', find_documentation_specialist(saved_agents),
+                  documentation_task_prompt(final_output, chosen_strategy), DOCUMENTATION_EXPECTED_OUTPUT)
+
+        report['files'] = extract_code_files_from_result(final_output)
+        report['elapsed_time'] = int(time.time() - started)
+        build_trace.end(phases=len(phase_results) + 1, output_chars=len(final_output))
+        return report
+    except Exception as e:
+        build_trace.end(status="error", error=str(e))
+        report.update(status='error', error=str(e), elapsed_time=int(time.time() - started))
+        return report
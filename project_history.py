@@ -0,0 +1,248 @@
+"""
+Persistent project history with deduplicated file storage.
+
+Every completed build is saved as a small manifest (idea, strategy, status,
+cost, ...) that lists the kit's files by content hash. File contents are
+stored once per distinct SHA-256, gzip-compressed, so a file that is the same
+across retries or projects costs one object. Two backends share this layout:
+
+- GridFS (bucket "history_objects") plus a "project_history" collection when
+  MongoDB is configured;
+- a local object store otherwise: PROJECT_HISTORY_DIR/objects/<ab>/<sha>.gz
+  and one JSON manifest per run in PROJECT_HISTORY_DIR/runs/.
+
+Reading is streaming: open_file() returns a file object that decompresses as
+it is read, and write_zip() copies one file at a time into the archive, so
+neither ever holds the whole kit in memory. The *_bytes() helpers are for
+Streamlit download buttons, which need the payload of the one item clicked.
+
+This module has no Streamlit dependency so scripts can import it directly.
+"""
+
+import gzip
+import hashlib
+import io
+import json
+import os
+import shutil
+import threading
+import time
+import zipfile
+from pathlib import Path
+from typing import IO, Any, Dict, List, Optional
+
+DEFAULT_HISTORY_DIR = "history"
+COPY_CHUNK = 64 * 1024
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class LocalObjectStore:
+    """Gzip objects on disk, one file per content hash."""
+
+    name = "local"
+
+    def __init__(self, directory: Path):
+        self.directory = Path(directory) / "objects"
+
+    def _path(self, digest: str) -> Path:
+        return self.directory / digest[:2] / f"{digest}.gz"
+
+    def exists(self, digest: str) -> bool:
+        return self._path(digest).exists()
+
+    def put(self, digest: str, compressed: bytes) -> None:
+        path = self._path(digest)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp.write_bytes(compressed)
+        os.replace(tmp, path)
+
+    def open(self, digest: str) -> IO[bytes]:
+        return gzip.open(self._path(digest), "rb")
+
+
+class GridFSObjectStore:
+    """Gzip objects in a GridFS bucket, named by content hash."""
+
+    name = "gridfs"
+
+    def __init__(self, db: Any, bucket: str = "history_objects"):
+        import gridfs
+        self._files = db.get_collection(f"{bucket}.files")
+        self._bucket = gridfs.GridFSBucket(db, bucket_name=bucket)
+
+    def exists(self, digest: str) -> bool:
+        return self._files.find_one({"filename": digest}, {"_id": 1}) is not None
+
+    def put(self, digest: str, compressed: bytes) -> None:
+        self._bucket.upload_from_stream(digest, compressed)
+
+    def open(self, digest: str) -> IO[bytes]:
+        return gzip.GzipFile(fileobj=self._bucket.open_download_stream_by_name(digest), mode="rb")
+
+
+class LocalManifestIndex:
+    """One JSON manifest per run."""
+
+    def __init__(self, directory: Path):
+        self.directory = Path(directory) / "runs"
+
+    def save(self, manifest: Dict[str, Any]) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.directory / f"{manifest['run_id']}.json"
+        tmp = path.with_suffix(f".{os.getpid()}.tmp")
+        tmp.write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+        os.replace(tmp, path)
+
+    def get(self, run_id: str) -> Optional[Dict[str, Any]]:
+        path = self.directory / f"{Path(run_id).name}.json"
+        if not path.exists():
+            return None
+        return json.loads(path.read_text(encoding="utf-8"))
+
+    def list(self, limit: int) -> List[Dict[str, Any]]:
+        if not self.directory.is_dir():
+            return []
+        paths = sorted(self.directory.glob("*.json"), key=lambda p: p.stat().st_mtime, reverse=True)[:limit]
+        manifests = []
+        for path in paths:
+            try:
+                manifests.append(json.loads(path.read_text(encoding="utf-8")))
+            except (OSError, ValueError):
+                continue
+        return sorted(manifests, key=lambda m: m.get("created", 0), reverse=True)
+
+
+class MongoManifestIndex:
+    """Manifests in the "project_history" collection."""
+
+    def __init__(self, db: Any):
+        # No I/O here: the app builds this before MongoDB has answered (indexes are made on first save)
+        self._collection = db.get_collection("project_history")
+        self._indexed = False
+
+    def save(self, manifest: Dict[str, Any]) -> None:
+        if not self._indexed:
+            self._collection.create_index("run_id", unique=True)
+            self._collection.create_index("created")
+            self._indexed = True
+        self._collection.replace_one({"run_id": manifest["run_id"]}, dict(manifest), upsert=True)
+
+    def get(self, run_id: str) -> Optional[Dict[str, Any]]:
+        return self._collection.find_one({"run_id": run_id}, {"_id": 0})
+
+    def list(self, limit: int) -> List[Dict[str, Any]]:
+        return list(self._collection.find({}, {"_id": 0}).sort("created", -1).limit(limit))
+
+
+class ProjectHistory:
+    """Completed kits as manifests of content-addressed files."""
+
+    def __init__(self, objects: Any, index: Any):
+        self.objects = objects
+        self.index = index
+        self.backend = objects.name
+
+    def _store(self, text: str) -> Dict[str, Any]:
+        """Store one text object unless already present; returns {'sha256', 'size', 'new_bytes'}."""
+        digest = content_hash(text)
+        raw = text.encode("utf-8")
+        new_bytes = 0
+        if not self.objects.exists(digest):
+            compressed = gzip.compress(raw, compresslevel=6)
+            self.objects.put(digest, compressed)
+            new_bytes = len(compressed)
+        return {"sha256": digest, "size": len(raw), "new_bytes": new_bytes}
+
+    def save_run(self, run_id: str, kit_text: str, files: Dict[str, str], metadata: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Store a completed kit: the markdown document and each file by content
+        hash, then its manifest (saving the same run_id again replaces it).
+        `metadata` is kept as is (idea, strategy, status, cost, ...).
+        Returns the manifest, with 'stored_bytes' = newly written compressed bytes.
+        """
+        kit = self._store(kit_text)
+        entries = []
+        stored_bytes = kit.pop("new_bytes")
+        for path, content in files.items():
+            entry = self._store(content)
+            stored_bytes += entry.pop("new_bytes")
+            entries.append({"path": path, **entry})
+        manifest = {
+            **metadata,
+            "run_id": run_id,
+            "created": metadata.get("created") or time.time(),
+            "kit": kit,
+            "files": entries,
+            "total_bytes": kit["size"] + sum(e["size"] for e in entries),
+            "stored_bytes": stored_bytes,
+        }
+        self.index.save(manifest)
+        return manifest
+
+    def list_runs(self, limit: int = 100) -> List[Dict[str, Any]]:
+        """Most recent manifests first."""
+        return self.index.list(limit)
+
+    def get_run(self, run_id: str) -> Optional[Dict[str, Any]]:
+        return self.index.get(run_id)
+
+    def open_object(self, digest: str) -> IO[bytes]:
+        """Decompressing binary stream over one stored object."""
+        return self.objects.open(digest)
+
+    def open_file(self, manifest: Dict[str, Any], path: str) -> IO[bytes]:
+        """Stream one file of a run; raises KeyError for a path not in the manifest."""
+        for entry in manifest["files"]:
+            if entry["path"] == path:
+                return self.open_object(entry["sha256"])
+        raise KeyError(path)
+
+    def open_kit(self, manifest: Dict[str, Any]) -> IO[bytes]:
+        """Stream the run's full deployment-kit markdown."""
+        return self.open_object(manifest["kit"]["sha256"])
+
+    def write_zip(self, manifest: Dict[str, Any], target: IO[bytes]) -> None:
+        """Write the run's files as a ZIP into `target`, one file at a time."""
+        with zipfile.ZipFile(target, "w", zipfile.ZIP_DEFLATED) as archive:
+            for entry in manifest["files"]:
+                with self.open_object(entry["sha256"]) as source, archive.open(entry["path"], "w") as dest:
+                    shutil.copyfileobj(source, dest, COPY_CHUNK)
+
+    def file_bytes(self, manifest: Dict[str, Any], path: str) -> bytes:
+        with self.open_file(manifest, path) as stream:
+            return stream.read()
+
+    def kit_bytes(self, manifest: Dict[str, Any]) -> bytes:
+        with self.open_kit(manifest) as stream:
+            return stream.read()
+
+    def zip_bytes(self, manifest: Dict[str, Any]) -> bytes:
+        """The run's ZIP, built from the stored objects without decompressing them all at once."""
+        buffer = io.BytesIO()
+        self.write_zip(manifest, buffer)
+        return buffer.getvalue()
+
+
+_HISTORY: Optional[ProjectHistory] = None
+_HISTORY_LOCK = threading.Lock()
+
+
+def get_project_history(db: Any = None, directory: Optional[str] = None) -> ProjectHistory:
+    """
+    Process-wide project history. The first caller wins: with a pymongo
+    database, GridFS + a collection; otherwise the local store under
+    `directory`, PROJECT_HISTORY_DIR, or "history".
+    """
+    global _HISTORY
+    with _HISTORY_LOCK:
+        if _HISTORY is None:
+            if db is not None:
+                _HISTORY = ProjectHistory(GridFSObjectStore(db), MongoManifestIndex(db))
+            else:
+                root = Path(directory or os.getenv("PROJECT_HISTORY_DIR", DEFAULT_HISTORY_DIR))
+                _HISTORY = ProjectHistory(LocalObjectStore(root), LocalManifestIndex(root))
+        return _HISTORY
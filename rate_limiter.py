@@ -0,0 +1,297 @@
+"""
+Process-wide rate limiter for LLM calls.
+
+Every LLM call the crews make goes through one shared limiter (agents' LLMs
+are wrapped in pipeline.rate_limited_llm), so concurrent Streamlit sessions
+and threads draw from the same budget instead of each hitting the OpenAI
+limits independently. It combines:
+
+- two token buckets: requests/minute and tokens/minute (prompt + reserved
+  output, corrected with actual usage when the call finishes);
+- AIMD concurrency: the in-flight limit grows by ~1 per window of successful
+  calls and is halved on a 429 (or cut back when latency spikes);
+- jittered exponential retry for rate-limit errors, one LLM call at a time.
+
+`limiter_scope()` collects the time a block of calls (one crew kickoff) spent
+queued or backing off, for the run's metrics and progress messages.
+
+This module has no Streamlit dependency so scripts can import it directly.
+"""
+
+import contextvars
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+
+DEFAULT_REQUESTS_PER_MINUTE = 500
+DEFAULT_TOKENS_PER_MINUTE = 200_000
+DEFAULT_MAX_CONCURRENCY = 8
+
+
+def is_rate_limit_error(error: BaseException) -> bool:
+    """
+    True for provider 429s: a RateLimitError (OpenAI/LiteLLM) or an HTTP 429
+    status, on the error itself or anywhere in its cause chain. The message
+    text is not consulted, so an unrelated error that merely mentions "429"
+    is raised instead of retried.
+    """
+    seen = set()
+    current: Optional[BaseException] = error
+    while current is not None and id(current) not in seen:
+        seen.add(id(current))
+        if any(cls.__name__ == "RateLimitError" for cls in type(current).__mro__):
+            return True
+        status = getattr(current, "status_code", None)
+        if status is None:
+            status = getattr(getattr(current, "response", None), "status_code", None)
+        if status == 429:
+            return True
+        current = current.__cause__ or current.__context__
+    return False
+
+
+def _retry_after_seconds(error: BaseException) -> Optional[float]:
+    """Read a Retry-After header from the provider response, if there is one."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        value = headers.get("retry-after") or headers.get("Retry-After")
+        return float(value) if value is not None else None
+    except (TypeError, ValueError, AttributeError):
+        return None
+
+
+class LimiterScope:
+    """Queue/backoff time accumulated by the limited calls made inside one `limiter_scope()`."""
+
+    def __init__(self, on_wait: Optional[Callable[[float, int], None]] = None):
+        self.on_wait = on_wait
+        self.queued = 0.0
+        self.calls = 0
+        self.lock = threading.Lock()
+
+
+_SCOPE: contextvars.ContextVar[Optional[LimiterScope]] = contextvars.ContextVar("llm_limiter_scope", default=None)
+
+
+@contextmanager
+def limiter_scope(on_wait: Optional[Callable[[float, int], None]] = None) -> Iterator[LimiterScope]:
+    """
+    Collect the wait of every limited call made in this block (same thread or
+    context). `on_wait` is used for calls that don't pass their own.
+    """
+    scope = LimiterScope(on_wait)
+    token = _SCOPE.set(scope)
+    try:
+        yield scope
+    finally:
+        _SCOPE.reset(token)
+
+
+class TokenBucket:
+    """Continuous-refill bucket. Not thread-safe on its own; the limiter holds the lock."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = float(per_minute) / 60.0
+        self.level = float(per_minute)
+        self.updated = time.monotonic()
+
+    def refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def seconds_until(self, amount: float) -> float:
+        """Time until `amount` is available (0 if it already is)."""
+        amount = min(amount, self.capacity)
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) / self.rate
+
+
+class LLMRateLimiter:
+    """Shared token-bucket limiter with AIMD concurrency and retry."""
+
+    def __init__(
+        self,
+        requests_per_minute: float = DEFAULT_REQUESTS_PER_MINUTE,
+        tokens_per_minute: float = DEFAULT_TOKENS_PER_MINUTE,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+        min_concurrency: int = 1,
+        latency_spike_factor: float = 3.0,
+    ):
+        self._cond = threading.Condition()
+        self._requests = TokenBucket(requests_per_minute)
+        self._tokens = TokenBucket(tokens_per_minute)
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.concurrency_limit = float(max(min_concurrency, max_concurrency // 2))
+        self.latency_spike_factor = latency_spike_factor
+        self._in_flight = 0
+        self._waiting = 0
+        self._latency_ewma: Dict[str, float] = {}
+        self._stats = {"calls": 0, "rate_limited": 0, "retries": 0, "total_wait": 0.0, "last_wait": 0.0}
+
+    # -- slot management -------------------------------------------------------
+
+    def acquire(self, estimated_tokens: int,
+                on_wait: Optional[Callable[[float, int], None]] = None) -> float:
+        """
+        Block until a concurrency slot, one request and `estimated_tokens` are
+        available, then reserve them. Returns the seconds spent queued.
+        `on_wait(waited_seconds, queued_callers)` is called about twice a second while blocked.
+        """
+        start = time.monotonic()
+        with self._cond:
+            self._waiting += 1
+            try:
+                while True:
+                    now = time.monotonic()
+                    self._requests.refill(now)
+                    self._tokens.refill(now)
+                    delay = max(
+                        self._requests.seconds_until(1),
+                        self._tokens.seconds_until(estimated_tokens),
+                    )
+                    if self._in_flight < int(self.concurrency_limit) and delay == 0:
+                        break
+                    if on_wait is not None:
+                        on_wait(now - start, self._waiting)
+                    self._cond.wait(timeout=min(0.5, delay) if delay else 0.5)
+
+                self._requests.level -= 1
+                self._tokens.level -= min(estimated_tokens, self._tokens.capacity)
+                self._in_flight += 1
+            finally:
+                self._waiting -= 1
+
+            waited = time.monotonic() - start
+            self._stats["total_wait"] += waited
+            self._stats["last_wait"] = waited
+            return waited
+
+    def release(self, estimated_tokens: int, actual_tokens: Optional[int] = None,
+                latency: Optional[float] = None, rate_limited: bool = False, key: str = "default") -> None:
+        """Return the slot, settle token usage and apply the AIMD adjustment."""
+        with self._cond:
+            self._in_flight = max(0, self._in_flight - 1)
+            if actual_tokens is not None:
+                # Positive: we reserved too much and give it back. Negative: debt.
+                self._tokens.level += min(estimated_tokens, self._tokens.capacity) - actual_tokens
+
+            if rate_limited:
+                self._stats["rate_limited"] += 1
+                self.concurrency_limit = max(float(self.min_concurrency), self.concurrency_limit / 2)
+            elif latency is not None:
+                baseline = self._latency_ewma.get(key)
+                if baseline is not None and latency > baseline * self.latency_spike_factor:
+                    # Provider is slowing down: back off gently before it starts returning 429s
+                    self.concurrency_limit = max(float(self.min_concurrency), self.concurrency_limit * 0.75)
+                else:
+                    self.concurrency_limit = min(
+                        float(self.max_concurrency), self.concurrency_limit + 1.0 / self.concurrency_limit
+                    )
+                self._latency_ewma[key] = latency if baseline is None else 0.8 * baseline + 0.2 * latency
+            self._cond.notify_all()
+
+    # -- call wrapper ----------------------------------------------------------
+
+    def call(
+        self,
+        fn: Callable[[], Any],
+        estimated_tokens: int,
+        key: str = "default",
+        usage_of: Optional[Callable[[Any], Optional[int]]] = None,
+        on_wait: Optional[Callable[[float, int], None]] = None,
+        max_retries: int = 5,
+        base_delay: float = 2.0,
+        max_delay: float = 60.0,
+    ) -> Tuple[Any, float]:
+        """
+        Run `fn` under the limiter, retrying 429s with full-jitter exponential backoff.
+        Returns (result, total seconds spent queued or backing off), which is
+        also added to the enclosing `limiter_scope()`, if any.
+        Non-rate-limit errors are raised immediately.
+        """
+        scope = _SCOPE.get()
+        if on_wait is None and scope is not None:
+            on_wait = scope.on_wait
+        queued = 0.0
+        try:
+            for attempt in range(max_retries + 1):
+                queued += self.acquire(estimated_tokens, on_wait=on_wait)
+                started = time.monotonic()
+                try:
+                    result = fn()
+                except Exception as e:
+                    limited = is_rate_limit_error(e)
+                    self.release(estimated_tokens, latency=time.monotonic() - started, rate_limited=limited, key=key)
+                    if not limited or attempt == max_retries:
+                        raise
+                    delay = _retry_after_seconds(e) or random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+                    with self._cond:
+                        self._stats["retries"] += 1
+                    if on_wait is not None:
+                        on_wait(queued, self._waiting)
+                    time.sleep(delay)
+                    queued += delay
+                    continue
+
+                actual = usage_of(result) if usage_of is not None else None
+                self.release(estimated_tokens, actual_tokens=actual, latency=time.monotonic() - started, key=key)
+                with self._cond:
+                    self._stats["calls"] += 1
+                return result, queued
+            raise RuntimeError("unreachable")  # pragma: no cover
+        finally:
+            if scope is not None:
+                with scope.lock:
+                    scope.queued += queued
+                    scope.calls += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Current limiter state for display."""
+        with self._cond:
+            now = time.monotonic()
+            self._requests.refill(now)
+            self._tokens.refill(now)
+            calls = self._stats["calls"]
+            return {
+                "in_flight": self._in_flight,
+                "queued": self._waiting,
+                "concurrency_limit": round(self.concurrency_limit, 2),
+                "requests_available": int(self._requests.level),
+                "tokens_available": int(self._tokens.level),
+                "calls": calls,
+                "rate_limited": self._stats["rate_limited"],
+                "retries": self._stats["retries"],
+                "avg_wait": (self._stats["total_wait"] / calls) if calls else 0.0,
+                "last_wait": self._stats["last_wait"],
+            }
+
+
+_LIMITER: Optional[LLMRateLimiter] = None
+_LIMITER_LOCK = threading.Lock()
+
+
+def get_rate_limiter(**config: Any) -> LLMRateLimiter:
+    """
+    Process-wide limiter singleton. The first caller's config wins; unset
+    values fall back to LLM_REQUESTS_PER_MINUTE / LLM_TOKENS_PER_MINUTE /
+    LLM_MAX_CONCURRENCY environment variables, then to the defaults.
+    """
+    global _LIMITER
+    with _LIMITER_LOCK:
+        if _LIMITER is None:
+            _LIMITER = LLMRateLimiter(
+                requests_per_minute=float(config.get("requests_per_minute")
+                                          or os.getenv("LLM_REQUESTS_PER_MINUTE", DEFAULT_REQUESTS_PER_MINUTE)),
+                tokens_per_minute=float(config.get("tokens_per_minute")
+                                        or os.getenv("LLM_TOKENS_PER_MINUTE", DEFAULT_TOKENS_PER_MINUTE)),
+                max_concurrency=int(config.get("max_concurrency")
+                                    or os.getenv("LLM_MAX_CONCURRENCY", DEFAULT_MAX_CONCURRENCY)),
+            )
+        return _LIMITER
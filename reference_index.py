@@ -0,0 +1,276 @@
+"""
+Local retrieval index over uploaded reference files.
+
+Uploads used to be pasted in full into the strategy, extraction and build
+prompts, so one large file inflated every call. Now each upload is cut into
+chunks of about CHUNK_CHARS (on blank lines where possible, code fences kept
+per chunk) and indexed in memory, on CPU, with no network:
+
+- BM25 over word tokens (the tokenizer of agent_search.py);
+- optionally (REFERENCE_VECTORS, on by default) TF-IDF vectors of character
+  trigrams, which still match renamed identifiers and typos. The two rankings
+  are merged by reciprocal rank fusion.
+
+select() returns the chunks most relevant to a phase's query that fit its
+token budget (REFERENCE_BUDGET_TOKENS, chars / 4 like the rate limiter's
+estimate), back in file order. Uploads that fit the budget are used whole.
+Indexes are cached per set of uploads, so reruns and later phases reuse them.
+
+Repository ZIPs (repo_archive.py) contribute their overview up front; each
+query then reads and indexes only the ARCHIVE_FILES_PER_QUERY members that
+match it best by path and outline, or every member if the repository fits.
+
+This module has no Streamlit dependency so scripts can import it directly.
+"""
+
+import logging
+import math
+import os
+import re
+import threading
+import zipfile
+from collections import Counter, OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from agent_search import B, K1, tokenize
+from repo_archive import get_repo_archive
+from strategy_cache import uploads_fingerprint
+
+logger = logging.getLogger(__name__)
+
+CHUNK_CHARS = 1200
+DEFAULT_BUDGET_TOKENS = 8000
+RRF_K = 60
+MAX_CACHED_INDEXES = 16
+MAX_VECTOR_QUERY_CHARS = 2000  # long queries (a whole strategy) cost O(chunks x grams)
+ARCHIVE_FILES_PER_QUERY = 12
+
+_FENCED = re.compile(r"\A```(\w*)\n(.*?)\n?```\s*\Z", re.DOTALL)
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // 4 + 1
+
+
+def _unfence(content: str) -> Tuple[str, Optional[str]]:
+    """Body and language of a file that parse_uploaded_file wrapped in one code fence."""
+    match = _FENCED.match(content.strip())
+    if match:
+        return match.group(2), match.group(1)
+    return content, None
+
+
+def _trigrams(text: str) -> Counter:
+    normalized = " ".join(re.sub(r"[^\w]+", " ", text.lower()).split())
+    padded = f" {normalized} "
+    return Counter(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+class Chunk:
+    def __init__(self, file_index: int, name: str, file_type: str, number: int, start_line: int,
+                 end_line: int, text: str, language: Optional[str]):
+        self.file_index = file_index
+        self.name = name
+        self.file_type = file_type
+        self.number = number
+        self.start_line = start_line
+        self.end_line = end_line
+        self.text = text
+        self.language = language
+        self.tokens = estimate_tokens(text)
+        self.position = 0  # order in the index
+
+    @property
+    def label(self) -> str:
+        return f"{self.name}#{self.number}"
+
+    def render(self) -> str:
+        """The chunk as it appears in a prompt (re-fenced when the file was fenced)."""
+        if self.language is not None:
+            return f"```{self.language}\n{self.text}\n```"
+        return self.text
+
+
+def chunk_file(file_index: int, file_data: Dict[str, Any], max_chars: int = CHUNK_CHARS) -> List[Chunk]:
+    """Split one parsed upload into chunks of about `max_chars`, preferring blank-line boundaries."""
+    body, language = _unfence(str(file_data.get("content", "")))
+    name, file_type = file_data.get("name", f"file{file_index}"), file_data.get("type", "")
+    return chunk_text(file_index, name, file_type, body, language, max_chars)
+
+
+def chunk_text(file_index: int, name: str, file_type: str, body: str, language: Optional[str],
+               max_chars: int = CHUNK_CHARS) -> List[Chunk]:
+    chunks: List[Chunk] = []
+    current: List[Tuple[int, str]] = []
+    size = 0
+
+    def flush() -> None:
+        nonlocal current, size
+        if any(line.strip() for _, line in current):
+            chunks.append(Chunk(file_index, name, file_type, len(chunks) + 1, current[0][0], current[-1][0],
+                                "\n".join(line for _, line in current), language))
+        current, size = [], 0
+
+    for line_no, line in enumerate(body.split("\n"), 1):
+        # Minified or very long lines are cut into max_chars pieces
+        for piece in [line[i:i + max_chars] for i in range(0, len(line), max_chars)] or [""]:
+            if current and size + len(piece) + 1 > max_chars:
+                flush()
+            current.append((line_no, piece))
+            size += len(piece) + 1
+        if not line.strip() and size >= max_chars // 2:
+            flush()
+    flush()
+    return chunks
+
+
+class ReferenceIndex:
+    """BM25 (plus optional trigram vectors) over the chunks of one set of uploads."""
+
+    def __init__(self, files_data: List[Dict[str, Any]], use_vectors: bool = True, max_chars: int = CHUNK_CHARS):
+        self.files = list(files_data or [])
+        self.use_vectors = use_vectors
+        self.max_chars = max_chars
+        self.chunks: List[Chunk] = []
+        self.total_tokens = 0
+        self._lock = threading.RLock()
+        self._postings: Dict[str, Dict[int, int]] = {}
+        self._lengths: List[int] = []
+        self._average = 1.0
+        self._grams: List[Counter] = []
+        self._gram_df: Counter = Counter()
+        self._vectors: Optional[List[Dict[str, float]]] = None  # rebuilt after chunks are added
+        # Repository ZIPs: only their overview is indexed up front, members as queries need them
+        self._archives = {}
+        for index, f in enumerate(self.files, 1):
+            if f.get("archive"):
+                try:
+                    self._archives[index] = get_repo_archive(f["archive"], f.get("name"))
+                except (OSError, zipfile.BadZipFile) as e:
+                    # Spool expired or damaged: the stored overview is still indexed below
+                    logger.warning("Repository archive %s unavailable, using its overview: %s", f.get("name"), e)
+        self._loaded_members: set = set()
+
+        chunks = []
+        for file_index, file_data in enumerate(self.files, 1):
+            chunks.extend(chunk_file(file_index, file_data, max_chars))
+        self._add(chunks)
+
+    def _add(self, chunks: List[Chunk]) -> None:
+        for chunk in chunks:
+            chunk.position = len(self.chunks)
+            self.chunks.append(chunk)
+            self.total_tokens += chunk.tokens
+            tokens = tokenize(chunk.text)
+            self._lengths.append(len(tokens))
+            for term, count in Counter(tokens).items():
+                self._postings.setdefault(term, {})[chunk.position] = count
+            if self.use_vectors:
+                grams = _trigrams(chunk.text)
+                self._grams.append(grams)
+                self._gram_df.update(grams.keys())
+        self._average = (sum(self._lengths) / len(self._lengths)) if self._lengths else 1.0
+        self._vectors = None
+
+    def _load_members(self, query: str, budget_tokens: int) -> None:
+        """Read and index the archive members relevant to `query` (all of them if the archive fits the budget)."""
+        for file_index, archive in self._archives.items():
+            if archive.text_bytes // 4 + self.total_tokens <= budget_tokens:
+                paths = [entry.path for entry in archive.readable_files()]
+            else:
+                paths = archive.search_files(query, ARCHIVE_FILES_PER_QUERY)
+            chunks = []
+            for path in paths:
+                if (file_index, path) in self._loaded_members:
+                    continue
+                self._loaded_members.add((file_index, path))
+                text = archive.read(path)
+                if text:
+                    language = archive.language_of(path)
+                    chunks.extend(chunk_text(file_index, f"{archive.name}/{path}", "Repository file", text,
+                                             None if language in ("markdown", "text") else language, self.max_chars))
+            self._add(chunks)
+
+    def _weigh(self, counts: Counter) -> Dict[str, float]:
+        total = len(self.chunks)
+        vector = {g: c * (math.log((1 + total) / (1 + self._gram_df.get(g, 0))) + 1.0) for g, c in counts.items()}
+        norm = math.sqrt(sum(w * w for w in vector.values())) or 1.0
+        return {g: w / norm for g, w in vector.items()}
+
+    def _bm25(self, query: str) -> Dict[int, float]:
+        scores: Dict[int, float] = {}
+        count = len(self.chunks)
+        for term in dict.fromkeys(tokenize(query)):
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for position, frequency in postings.items():
+                norm = K1 * (1 - B + B * self._lengths[position] / (self._average or 1.0))
+                scores[position] = scores.get(position, 0.0) + idf * frequency * (K1 + 1) / (frequency + norm)
+        return scores
+
+    def _cosine(self, query: str) -> Dict[int, float]:
+        if self._vectors is None:
+            self._vectors = [self._weigh(counts) for counts in self._grams]
+        query_vector = self._weigh(_trigrams(query[:MAX_VECTOR_QUERY_CHARS]))
+        scores = {}
+        for position, vector in enumerate(self._vectors):
+            score = sum(w * vector.get(g, 0.0) for g, w in query_vector.items())
+            if score > 0:
+                scores[position] = score
+        return scores
+
+    def rank(self, query: str) -> List[Tuple[Chunk, float]]:
+        """Every chunk indexed so far with its fused relevance to `query`, most relevant first."""
+        with self._lock:
+            rankings = [self._bm25(query)]
+            if self.use_vectors:
+                rankings.append(self._cosine(query))
+        fused: Dict[int, float] = {}
+        for scores in rankings:
+            ordered = sorted(scores, key=lambda position: scores[position], reverse=True)
+            for rank, position in enumerate(ordered, 1):
+                fused[position] = fused.get(position, 0.0) + 1.0 / (RRF_K + rank)
+        # Unmatched chunks keep file order after the matches
+        order = sorted(range(len(self.chunks)), key=lambda position: (-fused.get(position, 0.0), position))
+        return [(self.chunks[position], round(fused.get(position, 0.0), 5)) for position in order]
+
+    def select(self, query: str, budget_tokens: int) -> List[Chunk]:
+        """The most relevant chunks that fit `budget_tokens`, in file order; all of them if they fit."""
+        with self._lock:
+            if self._archives:
+                self._load_members(query, budget_tokens)
+            if self.total_tokens <= budget_tokens:
+                return list(self.chunks)
+        chosen, used = [], 0
+        for chunk, _ in self.rank(query):
+            if used + chunk.tokens <= budget_tokens:
+                chosen.append(chunk)
+                used += chunk.tokens
+        return sorted(chosen, key=lambda chunk: (chunk.file_index, chunk.position))
+
+
+_INDEXES: "OrderedDict[Tuple[str, bool], ReferenceIndex]" = OrderedDict()
+_INDEXES_LOCK = threading.Lock()
+
+
+def reference_budget() -> int:
+    """Prompt tokens per phase for reference excerpts (REFERENCE_BUDGET_TOKENS)."""
+    return int(os.getenv("REFERENCE_BUDGET_TOKENS", DEFAULT_BUDGET_TOKENS))
+
+
+def get_reference_index(files_data: List[Dict[str, Any]]) -> ReferenceIndex:
+    """Index for these uploads, built once and kept for the most recent MAX_CACHED_INDEXES upload sets."""
+    use_vectors = os.getenv("REFERENCE_VECTORS", "1").lower() not in ("0", "false", "no", "off")
+    key = (uploads_fingerprint(files_data), use_vectors)
+    with _INDEXES_LOCK:
+        if key in _INDEXES:
+            _INDEXES.move_to_end(key)
+            return _INDEXES[key]
+    index = ReferenceIndex(files_data, use_vectors=use_vectors)
+    with _INDEXES_LOCK:
+        _INDEXES[key] = index
+        while len(_INDEXES) > MAX_CACHED_INDEXES:
+            _INDEXES.popitem(last=False)
+    return index
@@ -0,0 +1,429 @@
+"""
+Repository ZIP uploads, indexed without extracting them.
+
+A .zip upload is spooled to disk once (REPO_UPLOAD_DIR, named by content
+hash) and opened in place. Spooled uploads are kept until nobody has used
+them for REPO_SPOOL_TTL_HOURS (default one week), so a session that is still
+building from one never finds it gone. Ingesting it:
+
+- scans the central directory only (zipfile.infolist()) for the file tree,
+  sizes and CRCs; vendored and generated directories (SKIP_DIRS), binaries
+  and members over MAX_MEMBER_BYTES are listed but never read;
+- detects each file's language from its name (LANGUAGES);
+- streams the readable members one at a time to extract a per-file outline
+  (classes, functions, headings: OUTLINE_PATTERNS), keeping only the outline.
+
+Member contents are read lazily afterwards: reference_index.py asks
+search_files() which members match a phase's query (BM25 over paths and
+outline symbols) and reads just those. Memory stays bounded by the outlines
+plus the members actually retrieved, whatever the size of the archive.
+
+This module has no Streamlit dependency so scripts can import it directly.
+"""
+
+import hashlib
+import heapq
+import math
+import os
+import re
+import tempfile
+import threading
+import time
+import zipfile
+from collections import Counter, OrderedDict
+from pathlib import Path, PurePosixPath
+from typing import IO, Dict, List, Optional, Tuple
+
+from agent_search import B, K1, tokenize
+
+MAX_MEMBER_BYTES = 1_000_000
+MAX_MEMBERS = 20_000
+OUTLINE_ITEMS = 40
+OVERVIEW_CHARS = 12_000
+OUTLINE_LINE_CHARS = 240
+TREE_FILES_PER_DIR = 25
+MAX_OPEN_ARCHIVES = 8
+SPOOL_TTL_HOURS = 7 * 24
+COPY_CHUNK = 1024 * 1024
+
+SKIP_DIRS = frozenset({
+    ".git", ".hg", ".svn", "node_modules", "bower_components", "__pycache__", ".venv", "venv", "env",
+    ".tox", ".mypy_cache", ".pytest_cache", ".ipynb_checkpoints", "dist", "build", ".next", ".nuxt",
+    "target", "coverage", ".idea", ".vscode", "__MACOSX", "vendor",
+})
+
+# File suffix (or exact name) -> language, also used as the code fence tag
+LANGUAGES = {
+    ".py": "python", ".pyi": "python", ".ipynb": "json", ".js": "javascript", ".mjs": "javascript",
+    ".cjs": "javascript", ".jsx": "jsx", ".ts": "typescript", ".tsx": "tsx", ".vue": "vue",
+    ".svelte": "svelte", ".java": "java", ".kt": "kotlin", ".kts": "kotlin", ".scala": "scala",
+    ".go": "go", ".rs": "rust", ".rb": "ruby", ".php": "php", ".cs": "csharp", ".swift": "swift",
+    ".c": "c", ".h": "c", ".cc": "cpp", ".cpp": "cpp", ".hpp": "cpp", ".m": "objectivec",
+    ".sql": "sql", ".sh": "bash", ".bash": "bash", ".ps1": "powershell", ".r": "r", ".dart": "dart",
+    ".html": "html", ".htm": "html", ".css": "css", ".scss": "scss", ".less": "less",
+    ".md": "markdown", ".markdown": "markdown", ".rst": "rst", ".txt": "text",
+    ".json": "json", ".yaml": "yaml", ".yml": "yaml", ".toml": "toml", ".ini": "ini", ".cfg": "ini",
+    ".xml": "xml", ".graphql": "graphql", ".proto": "protobuf", ".tf": "hcl", ".env.example": "bash",
+    "dockerfile": "dockerfile", "makefile": "makefile", "procfile": "text", "requirements.txt": "text",
+}
+LOCKFILES = frozenset({"package-lock.json", "yarn.lock", "pnpm-lock.yaml", "poetry.lock", "pipfile.lock",
+                       "cargo.lock", "composer.lock", "gemfile.lock", "go.sum"})
+BINARY_SUFFIXES = frozenset(
+    ".png .jpg .jpeg .gif .bmp .ico .webp .svgz .pdf .zip .gz .tgz .bz2 .xz .7z .tar .jar .war .class .so "
+    ".dll .exe .dylib .o .a .pyc .pyo .whl .woff .woff2 .ttf .otf .eot .mp3 .mp4 .mov .avi .wav .ogg "
+    ".sqlite .db .parquet .pkl .npy .npz .h5 .onnx .pt .bin".split()
+)
+
+_C_FAMILY = re.compile(
+    r"\n[ \t]*(?:(?:public|private|protected|internal|static|final|abstract|sealed|open|data|export|default|"
+    r"async|pub(?:\([^)]*\))?|override|virtual|partial|inline|extern|const|unsafe)\s+)*"
+    r"(?P<kind>class|interface|enum|struct|record|trait|object|impl|mod|module|fn|func|fun|function|def|type)"
+    r"\s+(?:\([^)]*\)\s*)?(?P<name>[A-Za-z_$][\w$]*)"
+)
+# Every pattern starts with a literal newline (the text is searched with one
+# prepended): much faster than ^ with re.MULTILINE, which is tried at every position.
+OUTLINE_PATTERNS = {
+    "python": re.compile(r"\n(?P<indent>[ \t]*)(?:async\s+)?(?P<kind>def|class)\s+(?P<name>\w+)"),
+    "javascript": re.compile(
+        r"\n[ \t]*(?:export\s+)?(?:default\s+)?(?:async\s+)?(?:(?P<kind>function\*?|class|interface|type|enum)"
+        r"\s+(?P<name>[A-Za-z_$][\w$]*)|(?P<bind>const|let|var)\s+(?P<arrow>[A-Za-z_$][\w$]*)\s*=\s*"
+        r"(?:async\s*)?(?:\([^)]*\)|[A-Za-z_$][\w$]*)\s*=>)"
+    ),
+    "markdown": re.compile(r"\n(?P<kind>#{1,3})[ \t]+(?P<name>[^\n]+?)[ \t]*#*(?=\n|$)"),
+    "sql": re.compile(
+        r"\n[ \t]*create\s+(?:or\s+replace\s+)?(?P<kind>table|view|function|procedure|index|type)\s+"
+        r"(?:if\s+not\s+exists\s+)?(?P<name>[\w.\"]+)",
+        re.IGNORECASE,
+    ),
+}
+for _language in ("typescript", "jsx", "tsx", "vue", "svelte"):
+    OUTLINE_PATTERNS[_language] = OUTLINE_PATTERNS["javascript"]
+for _language in ("java", "kotlin", "scala", "go", "rust", "ruby", "php", "csharp", "swift", "c", "cpp", "dart"):
+    OUTLINE_PATTERNS[_language] = _C_FAMILY
+
+_CAMEL = re.compile(r"(?<=[a-z0-9])(?=[A-Z])")
+
+
+def detect_language(path: str) -> Optional[str]:
+    """Language of a file from its name, or None for binaries and unknown types."""
+    name = PurePosixPath(path).name.lower()
+    if name in LANGUAGES:
+        return LANGUAGES[name]
+    if name.startswith("dockerfile"):
+        return "dockerfile"
+    suffix = PurePosixPath(name).suffix
+    if suffix in BINARY_SUFFIXES:
+        return None
+    return LANGUAGES.get(suffix)
+
+
+def outline(text: str, language: Optional[str], limit: int = OUTLINE_ITEMS) -> List[str]:
+    """Top symbols of a file ("L12 class Foo", nested ones indented), at most `limit`."""
+    pattern = OUTLINE_PATTERNS.get(language or "")
+    if pattern is None:
+        return []
+    items = []
+    text = "\n" + text
+    line, counted = 0, 0
+    for match in pattern.finditer(text):
+        groups = match.groupdict()
+        kind, name = groups.get("kind"), groups.get("name")
+        if name is None and groups.get("arrow"):
+            kind, name = "const", groups["arrow"]
+        if not name:
+            continue
+        line += text.count("\n", counted, match.start() + 1)
+        counted = match.start() + 1
+        indent = "  " if groups.get("indent") else ""
+        items.append(f"{indent}L{line} {name}" if language == "markdown" else f"{indent}L{line} {kind.lower()} {name}")
+        if len(items) >= limit:
+            break
+    return items
+
+
+def _search_terms(text: str) -> List[str]:
+    return tokenize(_CAMEL.sub(" ", text))
+
+
+class RepoFile:
+    __slots__ = ("member", "path", "size", "compressed", "crc", "language", "skipped", "outline")
+
+    def __init__(self, info: zipfile.ZipInfo, path: str):
+        self.member = info.filename
+        self.path = path
+        self.size = info.file_size
+        self.compressed = info.compress_size
+        self.crc = info.CRC
+        self.language = detect_language(path)
+        self.skipped: Optional[str] = None  # why the file is never read
+        self.outline: List[str] = []
+
+    @property
+    def readable(self) -> bool:
+        return self.skipped is None
+
+
+class RepoArchive:
+    """File tree, languages and outlines of a zipped repository, with lazy member reads."""
+
+    def __init__(self, path: str, name: Optional[str] = None):
+        self.path = str(path)
+        self.name = name or Path(path).name
+        self._lock = threading.Lock()
+        self._zip = zipfile.ZipFile(self.path)
+        self.files: List[RepoFile] = []
+        self.omitted = 0  # members past MAX_MEMBERS
+        self._by_path: Dict[str, RepoFile] = {}
+        self._scan()
+        self._outline_all()
+        self._postings: Optional[Dict[str, Dict[int, int]]] = None
+        self._lengths: List[int] = []
+
+    def _scan(self) -> None:
+        infos = [info for info in self._zip.infolist() if not info.is_dir()]
+        names = [info.filename for info in infos]
+        # GitHub archives wrap everything in one "repo-main/" directory
+        roots = {name.split("/", 1)[0] for name in names}
+        strip = len(next(iter(roots))) + 1 if len(roots) == 1 and all("/" in name for name in names) else 0
+        digest = hashlib.sha256()
+        for info in infos:
+            path = info.filename[strip:]
+            digest.update(f"{path}\0{info.CRC}\0{info.file_size}\n".encode("utf-8"))
+            if len(self.files) >= MAX_MEMBERS:
+                self.omitted += 1
+                continue
+            entry = RepoFile(info, path)
+            parts = path.split("/")
+            if any(part in SKIP_DIRS for part in parts[:-1]):
+                continue
+            if entry.language is None:
+                entry.skipped = "binary or unknown type"
+            elif PurePosixPath(path).name.lower() in LOCKFILES:
+                entry.skipped = "lockfile"
+            elif info.file_size > MAX_MEMBER_BYTES:
+                entry.skipped = f"over {MAX_MEMBER_BYTES // 1000} KB"
+            elif info.flag_bits & 0x1:
+                entry.skipped = "encrypted"
+            self.files.append(entry)
+            self._by_path[path] = entry
+        self.fingerprint = digest.hexdigest()
+
+    def _outline_all(self) -> None:
+        for entry in self.files:
+            if entry.readable and entry.language in OUTLINE_PATTERNS:
+                text = self.read(entry.path)
+                if text is not None:
+                    entry.outline = outline(text, entry.language)
+
+    # -- lazy access -----------------------------------------------------------
+
+    def read(self, path: str) -> Optional[str]:
+        """Contents of one member, decompressed now; None for skipped, binary or unknown members."""
+        entry = self._by_path.get(path)
+        if entry is None or not entry.readable:
+            return None
+        with self._lock, self._zip.open(entry.member) as handle:
+            data = handle.read(MAX_MEMBER_BYTES + 1)  # never trust the declared size
+        if b"\0" in data[:8192]:
+            entry.skipped = "binary"
+            return None
+        return data[:MAX_MEMBER_BYTES].decode("utf-8", errors="replace")
+
+    def language_of(self, path: str) -> Optional[str]:
+        entry = self._by_path.get(path)
+        return entry.language if entry else None
+
+    def readable_files(self) -> List[RepoFile]:
+        return [entry for entry in self.files if entry.readable]
+
+    @property
+    def text_bytes(self) -> int:
+        return sum(entry.size for entry in self.files if entry.readable)
+
+    def languages(self) -> List[Tuple[str, int]]:
+        counts = Counter(entry.language for entry in self.files if entry.language)
+        return counts.most_common()
+
+    # -- file search -----------------------------------------------------------
+
+    def _build_search(self) -> None:
+        postings: Dict[str, Dict[int, int]] = {}
+        lengths = []
+        for position, entry in enumerate(self.files):
+            if not entry.readable:
+                lengths.append(0)
+                continue
+            # The path counts twice: file names are the best hint of what a file holds
+            terms = _search_terms(entry.path) * 2 + _search_terms(" ".join(entry.outline))
+            lengths.append(len(terms))
+            for term, count in Counter(terms).items():
+                postings.setdefault(term, {})[position] = count
+        self._lengths = lengths
+        self._postings = postings
+
+    def search_files(self, query: str, limit: int = 20) -> List[str]:
+        """Paths of the readable members whose path and outline best match `query`."""
+        with self._lock:
+            if self._postings is None:
+                self._build_search()
+        count = sum(1 for length in self._lengths if length) or 1
+        average = (sum(self._lengths) / count) or 1.0
+        scores: Dict[int, float] = {}
+        for term in dict.fromkeys(_search_terms(query)):
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for position, frequency in postings.items():
+                norm = K1 * (1 - B + B * self._lengths[position] / average)
+                scores[position] = scores.get(position, 0.0) + idf * frequency * (K1 + 1) / (frequency + norm)
+        best = heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+        return [self.files[position].path for position, _ in best]
+
+    # -- overview --------------------------------------------------------------
+
+    def tree(self, files_per_dir: int = TREE_FILES_PER_DIR) -> List[str]:
+        """Indented directory tree with file counts, listing up to `files_per_dir` files per directory."""
+        directories: Dict[str, List[RepoFile]] = {}
+        for entry in self.files:
+            directories.setdefault(str(PurePosixPath(entry.path).parent), []).append(entry)
+        for directory in list(directories):
+            for parent in PurePosixPath(directory).parents:
+                directories.setdefault(str(parent), [])
+        lines = []
+        for directory in sorted(directories, key=lambda d: () if d == "." else PurePosixPath(d).parts):
+            entries = sorted(directories[directory], key=lambda e: e.path)
+            depth = 0 if directory == "." else directory.count("/") + 1
+            if directory != ".":
+                count = f" ({len(entries)} file{'s' if len(entries) > 1 else ''})" if entries else ""
+                lines.append(f"{'  ' * (depth - 1)}{PurePosixPath(directory).name}/{count}")
+            for entry in entries[:files_per_dir]:
+                note = entry.language or "binary"
+                if entry.skipped:
+                    note += f", not read: {entry.skipped}"
+                lines.append(f"{'  ' * depth}{PurePosixPath(entry.path).name}  ({note}, {_size(entry.size)})")
+            if entries and len(entries) > files_per_dir:
+                lines.append(f"{'  ' * depth}… {len(entries) - files_per_dir} more files")
+        return lines
+
+    def overview(self, max_chars: int = OVERVIEW_CHARS) -> str:
+        """Summary, tree and outlines of the repository in about `max_chars`."""
+        languages = ", ".join(f"{language} {count}" for language, count in self.languages()[:8])
+        lines = [
+            f"Repository archive {self.name}: {len(self.files):,} files "
+            f"({len(self.readable_files()):,} readable, {_size(self.text_bytes)} of text)"
+            + (f", {self.omitted:,} more not indexed" if self.omitted else ""),
+            f"Languages: {languages or 'none detected'}",
+            "Relevant files are excerpted below; the tree and outlines show the rest of the codebase.",
+            "",
+            "File tree:",
+            "```",
+        ]
+        # The tree gets up to half the space, listing fewer files per directory in larger repositories
+        for files_per_dir in (TREE_FILES_PER_DIR, 5, 0):
+            tree = self.tree(files_per_dir)
+            if sum(len(line) + 1 for line in tree) <= max_chars // 2:
+                break
+        lines += _fit(tree, max_chars // 2) + ["```", "", "Outlines:"]
+        used = sum(len(line) + 1 for line in lines)
+        # Top-level symbols only; the excerpts show the members of the files that matter
+        outlines = []
+        for entry in self.files:
+            symbols = "; ".join(item for item in entry.outline if not item.startswith(" "))
+            if symbols:
+                line = f"- {entry.path}: {symbols}"
+                outlines.append(line if len(line) <= OUTLINE_LINE_CHARS else line[:OUTLINE_LINE_CHARS] + " …")
+        return "\n".join(lines + _fit(outlines, max_chars - used))
+
+
+def _fit(lines: List[str], max_chars: int) -> List[str]:
+    kept, used = [], 0
+    for position, line in enumerate(lines):
+        if used + len(line) + 1 > max_chars:
+            return kept + [f"… {len(lines) - position} more lines"]
+        kept.append(line)
+        used += len(line) + 1
+    return kept
+
+
+def _size(size: int) -> str:
+    if size >= 1_048_576:
+        return f"{size / 1_048_576:.1f} MB"
+    return f"{size / 1024:.1f} KB"
+
+
+# ------------------------------------------------------------------------------
+# Uploads and the process-wide cache
+# ------------------------------------------------------------------------------
+def upload_dir() -> Path:
+    """Where ZIP uploads are spooled (REPO_UPLOAD_DIR)."""
+    return Path(os.getenv("REPO_UPLOAD_DIR") or Path(tempfile.gettempdir()) / "ai_factory_repos")
+
+
+def spool_ttl_seconds() -> float:
+    """How long an unused spooled upload is kept (REPO_SPOOL_TTL_HOURS)."""
+    return float(os.getenv("REPO_SPOOL_TTL_HOURS") or SPOOL_TTL_HOURS) * 3600
+
+
+def _touch(path: str) -> None:
+    """Mark a spooled upload as used now, so expiry counts from its last use."""
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+
+def prune_spool(directory: Path) -> None:
+    """Delete spooled uploads (and abandoned partial copies) unused for longer than the TTL."""
+    cutoff = time.time() - spool_ttl_seconds()
+    for stale in [*directory.glob("*.zip"), *directory.glob("*.part")]:
+        try:
+            if stale.stat().st_mtime < cutoff:
+                stale.unlink()
+        except OSError:
+            pass
+
+
+def spool_upload(uploaded_file: IO[bytes]) -> str:
+    """Copy an upload to REPO_UPLOAD_DIR, named by its hash (so reruns find it already there). Returns the path."""
+    directory = upload_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    digest = hashlib.sha256()
+    uploaded_file.seek(0)
+    for block in iter(lambda: uploaded_file.read(COPY_CHUNK), b""):
+        digest.update(block)
+    target = directory / f"{digest.hexdigest()[:32]}.zip"
+    if target.exists():
+        _touch(str(target))
+        return str(target)
+    uploaded_file.seek(0)
+    with tempfile.NamedTemporaryFile(dir=directory, suffix=".part", delete=False) as tmp:
+        for block in iter(lambda: uploaded_file.read(COPY_CHUNK), b""):
+            tmp.write(block)
+    os.replace(tmp.name, target)
+    prune_spool(directory)
+    return str(target)
+
+
+_ARCHIVES: "OrderedDict[Tuple[str, Optional[str]], RepoArchive]" = OrderedDict()
+_ARCHIVES_LOCK = threading.Lock()
+
+
+def get_repo_archive(path: str, name: Optional[str] = None) -> RepoArchive:
+    """
+    Indexed archive for this path (and display name), opened once and kept for
+    the MAX_OPEN_ARCHIVES most recent. Each lookup renews the file's spool TTL.
+    Raises OSError / zipfile.BadZipFile if the file is gone or unreadable.
+    """
+    key = (str(Path(path).resolve()), name)
+    _touch(key[0])
+    with _ARCHIVES_LOCK:
+        if key in _ARCHIVES:
+            _ARCHIVES.move_to_end(key)
+            return _ARCHIVES[key]
+    archive = RepoArchive(key[0], name)
+    with _ARCHIVES_LOCK:
+        _ARCHIVES[key] = archive
+        while len(_ARCHIVES) > MAX_OPEN_ARCHIVES:
+            _ARCHIVES.popitem(last=False)
+    return archive
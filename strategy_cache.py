@@ -0,0 +1,235 @@
+"""
+Cache of Strategy Consultant results, with near-duplicate idea matching.
+
+Planning a strategy is a full crew kickoff. Ideas that come back (re-clicking
+after going back, fixing a typo, rewording slightly) get the stored result:
+
+- exact hits are keyed by the normalized idea (case, punctuation and spacing
+  ignored), the content hashes of the uploaded files and a fingerprint of the
+  Strategy Consultant (profile and model), so a changed agent or different
+  uploads never reuse a stale analysis;
+- near-duplicates are found with a TF-IDF index over character trigrams of
+  the normalized ideas (robust to typos and small edits); the best match with
+  the same uploads and consultant is offered when its cosine similarity is at
+  least STRATEGY_CACHE_THRESHOLD.
+
+Entries live in SQLite (STRATEGY_CACHE_DB, default `strategy_cache.db`) and the
+index is kept in memory; the oldest entries are pruned past STRATEGY_CACHE_MAX.
+
+This module has no Streamlit dependency so scripts can import it directly.
+"""
+
+import hashlib
+import json
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+DEFAULT_THRESHOLD = 0.88
+DEFAULT_MAX_ENTRIES = 500
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS strategies (
+    key TEXT PRIMARY KEY,
+    idea TEXT NOT NULL,
+    normalized TEXT NOT NULL,
+    uploads TEXT NOT NULL,
+    consultant TEXT NOT NULL,
+    result TEXT NOT NULL,
+    created REAL NOT NULL,
+    hits INTEGER DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_strategies_created ON strategies (created);
+"""
+
+
+def normalize_idea(idea: str) -> str:
+    """Lowercase, punctuation to spaces, single-spaced."""
+    return " ".join(re.sub(r"[^\w]+", " ", idea.lower()).split())
+
+
+def uploads_fingerprint(files_data: List[Dict[str, Any]]) -> str:
+    """Order-independent hash of the uploaded files' names and contents (archives: their members' CRCs)."""
+    digests = sorted(
+        hashlib.sha256(
+            (f"{f.get('name', '')}\0{f.get('content', '')}"
+             + (f"\0{f['fingerprint']}" if f.get('fingerprint') else "")).encode("utf-8")
+        ).hexdigest()
+        for f in files_data or []
+    )
+    return hashlib.sha256("\n".join(digests).encode("utf-8")).hexdigest()
+
+
+def consultant_fingerprint(profile: Dict[str, Any], settings: Dict[str, Any]) -> str:
+    """Hash of what shapes the consultant's answer: its prompt fields and model settings."""
+    relevant = {k: profile.get(k) for k in ("role", "goal", "backstory")}
+    relevant["model"] = settings.get("model")
+    relevant["temperature"] = settings.get("temperature")
+    return hashlib.sha256(json.dumps(relevant, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def _trigrams(normalized: str) -> Counter:
+    padded = f" {normalized} "
+    return Counter(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+class StrategyCache:
+    """Exact and near-duplicate lookup of stored strategy results."""
+
+    def __init__(self, db_path: str = "strategy_cache.db", threshold: float = DEFAULT_THRESHOLD,
+                 max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.db_path = db_path
+        self.threshold = float(threshold)
+        self.max_entries = max(1, int(max_entries))
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._grams: Dict[str, Counter] = {}
+        self._df: Counter = Counter()
+        self._vectors: Optional[Dict[str, Dict[str, float]]] = None  # rebuilt lazily after changes
+        self._stats = {"exact_hits": 0, "near_hits": 0, "misses": 0}
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                "SELECT key, idea, normalized, uploads, consultant, created FROM strategies"
+            ).fetchall()
+        finally:
+            conn.close()
+        for key, idea, normalized, uploads, consultant, created in rows:
+            self._index(key, {"idea": idea, "normalized": normalized, "uploads": uploads,
+                              "consultant": consultant, "created": created})
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        conn.executescript(_SCHEMA)
+        return conn
+
+    # -- index -----------------------------------------------------------------
+
+    def _index(self, key: str, entry: Dict[str, Any]) -> None:
+        if key in self._entries:
+            self._unindex(key)
+        self._entries[key] = entry
+        self._grams[key] = _trigrams(entry["normalized"])
+        self._df.update(self._grams[key].keys())
+        self._vectors = None
+
+    def _unindex(self, key: str) -> None:
+        self._entries.pop(key, None)
+        grams = self._grams.pop(key, Counter())
+        self._df.subtract(grams.keys())
+        self._df += Counter()  # drop zero counts
+        self._vectors = None
+
+    def _idf(self, gram: str) -> float:
+        return math.log((1 + len(self._entries)) / (1 + self._df.get(gram, 0))) + 1.0
+
+    def _weigh(self, grams: Counter) -> Dict[str, float]:
+        vector = {g: count * self._idf(g) for g, count in grams.items()}
+        norm = math.sqrt(sum(w * w for w in vector.values())) or 1.0
+        return {g: w / norm for g, w in vector.items()}
+
+    def _nearest(self, normalized: str, uploads: str, consultant: str) -> Optional[tuple]:
+        if self._vectors is None:
+            self._vectors = {key: self._weigh(grams) for key, grams in self._grams.items()}
+        query = self._weigh(_trigrams(normalized))
+        best = None
+        for key, entry in self._entries.items():
+            if entry["uploads"] != uploads or entry["consultant"] != consultant:
+                continue
+            vector = self._vectors[key]
+            score = sum(w * vector.get(g, 0.0) for g, w in query.items())
+            if best is None or score > best[1]:
+                best = (key, score)
+        return best
+
+    # -- public API ------------------------------------------------------------
+
+    @staticmethod
+    def make_key(normalized: str, uploads: str, consultant: str) -> str:
+        return hashlib.sha256(f"{normalized}\0{uploads}\0{consultant}".encode("utf-8")).hexdigest()
+
+    def lookup(self, idea: str, files_data: List[Dict[str, Any]], consultant: str) -> Optional[Dict[str, Any]]:
+        """
+        Cached strategy for this idea, if any:
+        {'result', 'idea' (as originally typed), 'similarity', 'exact', 'key'}.
+        """
+        normalized = normalize_idea(idea)
+        uploads = uploads_fingerprint(files_data)
+        key = self.make_key(normalized, uploads, consultant)
+        with self._lock:
+            if key in self._entries:
+                match, similarity = key, 1.0
+            else:
+                nearest = self._nearest(normalized, uploads, consultant)
+                if nearest is None or nearest[1] < self.threshold:
+                    self._stats["misses"] += 1
+                    return None
+                match, similarity = nearest
+            self._stats["exact_hits" if match == key else "near_hits"] += 1
+            original_idea = self._entries[match]["idea"]
+        conn = self._connect()
+        try:
+            with conn:
+                row = conn.execute("SELECT result FROM strategies WHERE key = ?", (match,)).fetchone()
+                conn.execute("UPDATE strategies SET hits = hits + 1 WHERE key = ?", (match,))
+        finally:
+            conn.close()
+        if row is None:
+            return None
+        return {"result": row[0], "idea": original_idea, "similarity": round(similarity, 3),
+                "exact": match == key, "key": match}
+
+    def store(self, idea: str, files_data: List[Dict[str, Any]], consultant: str, result: str) -> str:
+        """Save (or replace) the result for this idea; prunes the oldest entries past the limit."""
+        normalized = normalize_idea(idea)
+        uploads = uploads_fingerprint(files_data)
+        key = self.make_key(normalized, uploads, consultant)
+        entry = {"idea": idea, "normalized": normalized, "uploads": uploads,
+                 "consultant": consultant, "created": time.time()}
+        with self._lock:
+            self._index(key, entry)
+            stale = sorted(self._entries, key=lambda k: self._entries[k]["created"])[:-self.max_entries]
+            for old in stale:
+                self._unindex(old)
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO strategies (key, idea, normalized, uploads, consultant, result, created, hits) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, 0)",
+                    (key, idea, normalized, uploads, consultant, result, entry["created"]),
+                )
+                conn.executemany("DELETE FROM strategies WHERE key = ?", [(old,) for old in stale])
+        finally:
+            conn.close()
+        return key
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"entries": len(self._entries), "threshold": self.threshold, **self._stats}
+
+
+_CACHE: Optional[StrategyCache] = None
+_CACHE_LOCK = threading.Lock()
+
+
+def get_strategy_cache(**config: Any) -> StrategyCache:
+    """
+    Process-wide strategy cache. The first caller's config wins; unset values
+    fall back to STRATEGY_CACHE_DB / STRATEGY_CACHE_THRESHOLD /
+    STRATEGY_CACHE_MAX environment variables, then to the defaults.
+    """
+    global _CACHE
+    with _CACHE_LOCK:
+        if _CACHE is None:
+            _CACHE = StrategyCache(
+                db_path=config.get("db_path") or os.getenv("STRATEGY_CACHE_DB", "strategy_cache.db"),
+                threshold=float(config.get("threshold") or os.getenv("STRATEGY_CACHE_THRESHOLD", DEFAULT_THRESHOLD)),
+                max_entries=int(config.get("max_entries") or os.getenv("STRATEGY_CACHE_MAX", DEFAULT_MAX_ENTRIES)),
+            )
+        return _CACHE
@@ -0,0 +1,170 @@
+"""
+Local telemetry store for LLM calls.
+
+Every agent task and crew kickoff is appended to a SQLite table so phase
+latency, token usage and spend can be analysed across runs. The database
+defaults to `telemetry.db` in the working directory (override with the
+TELEMETRY_DB environment variable).
+
+This module has no Streamlit dependency so scripts can import it directly.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+TELEMETRY_DB = os.getenv("TELEMETRY_DB", "telemetry.db")
+
+CALL_COLUMNS = (
+    "ts", "run_id", "phase", "role", "model", "temperature",
+    "prompt_tokens", "completion_tokens", "cached_prompt_tokens",
+    "latency", "queue_wait", "cost", "outcome", "prompt_prefix", "reference_chunks",
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS llm_calls (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ts REAL NOT NULL,
+    run_id TEXT,
+    phase TEXT NOT NULL,
+    role TEXT,
+    model TEXT,
+    temperature REAL,
+    prompt_tokens INTEGER DEFAULT 0,
+    completion_tokens INTEGER DEFAULT 0,
+    cached_prompt_tokens INTEGER DEFAULT 0,
+    latency REAL,
+    queue_wait REAL DEFAULT 0,
+    cost REAL DEFAULT 0,
+    outcome TEXT,
+    prompt_prefix TEXT,
+    reference_chunks TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_llm_calls_ts ON llm_calls (ts);
+CREATE INDEX IF NOT EXISTS idx_llm_calls_phase ON llm_calls (phase, ts);
+"""
+
+# Columns added after the first release, created on databases that predate them
+_ADDED_COLUMNS = {"prompt_prefix": "TEXT", "reference_chunks": "TEXT"}
+
+_WRITE_LOCK = threading.Lock()
+_INITIALIZED: set = set()
+
+
+def _connect(db_path: Optional[str] = None) -> sqlite3.Connection:
+    path = db_path or TELEMETRY_DB
+    conn = sqlite3.connect(path, timeout=10)
+    if path not in _INITIALIZED:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(_SCHEMA)
+        existing = {row[1] for row in conn.execute("PRAGMA table_info(llm_calls)")}
+        for column, kind in _ADDED_COLUMNS.items():
+            if column not in existing:
+                conn.execute(f"ALTER TABLE llm_calls ADD COLUMN {column} {kind}")
+        conn.commit()
+        _INITIALIZED.add(path)
+    return conn
+
+
+def record_call(metrics: Dict[str, Any], run_id: Optional[str] = None, db_path: Optional[str] = None) -> None:
+    """Persist one call-metrics dict (as produced by build_call_metrics in app.py)."""
+    row = {key: metrics.get(key) for key in CALL_COLUMNS}
+    row["ts"] = metrics.get("ts") or time.time()
+    row["run_id"] = run_id or metrics.get("run_id")
+    placeholders = ", ".join("?" for _ in CALL_COLUMNS)
+    with _WRITE_LOCK:
+        conn = _connect(db_path)
+        try:
+            with conn:
+                conn.execute(
+                    f"INSERT INTO llm_calls ({', '.join(CALL_COLUMNS)}) VALUES ({placeholders})",
+                    [row[key] for key in CALL_COLUMNS],
+                )
+        finally:
+            conn.close()
+
+
+def load_calls(since: Optional[float] = None, db_path: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Return recorded calls (oldest first), optionally only those after `since` (epoch seconds)."""
+    conn = _connect(db_path)
+    try:
+        conn.row_factory = sqlite3.Row
+        cursor = conn.execute(
+            "SELECT * FROM llm_calls WHERE ts >= ? ORDER BY ts",
+            (since or 0,),
+        )
+        return [dict(row) for row in cursor.fetchall()]
+    finally:
+        conn.close()
+
+
+def phase_summary(calls: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Aggregate calls per phase: count, error rate, p50/p95/p99 latency,
+    tokens, the share of prompt tokens served from the provider's prompt
+    cache, cost, and each phase's share of total spend and wall time.
+    Returns one dict per phase, most expensive first.
+    """
+    if not calls:
+        return []
+
+    phases = np.array([c["phase"] for c in calls])
+    latency = np.array([c["latency"] or 0.0 for c in calls], dtype=float)
+    cost = np.array([c["cost"] or 0.0 for c in calls], dtype=float)
+    tokens = np.array([(c["prompt_tokens"] or 0) + (c["completion_tokens"] or 0) for c in calls], dtype=np.int64)
+    prompt = np.array([c["prompt_tokens"] or 0 for c in calls], dtype=np.int64)
+    cached = np.array([c.get("cached_prompt_tokens") or 0 for c in calls], dtype=np.int64)
+    errors = np.array([c["outcome"] == "error" for c in calls])
+
+    total_cost = cost.sum() or 1.0
+    total_time = latency.sum() or 1.0
+    summary = []
+    for phase in np.unique(phases):
+        mask = phases == phase
+        p50, p95, p99 = np.percentile(latency[mask], [50, 95, 99])
+        summary.append({
+            "phase": str(phase),
+            "calls": int(mask.sum()),
+            "error_rate": float(errors[mask].mean()),
+            "p50": float(p50),
+            "p95": float(p95),
+            "p99": float(p99),
+            "tokens": int(tokens[mask].sum()),
+            "cached_ratio": float(cached[mask].sum() / (prompt[mask].sum() or 1)),
+            "cost": float(cost[mask].sum()),
+            "cost_share": float(cost[mask].sum() / total_cost),
+            "time_share": float(latency[mask].sum() / total_time),
+        })
+    summary.sort(key=lambda row: row["cost"], reverse=True)
+    return summary
+
+
+def daily_phase_series(calls: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Per-day, per-phase cost and p95 latency, in long form for charting:
+    [{'day': 'YYYY-MM-DD', 'phase', 'cost', 'p95'}].
+    """
+    if not calls:
+        return []
+
+    days = np.array([time.strftime("%Y-%m-%d", time.localtime(c["ts"])) for c in calls])
+    phases = np.array([c["phase"] for c in calls])
+    latency = np.array([c["latency"] or 0.0 for c in calls], dtype=float)
+    cost = np.array([c["cost"] or 0.0 for c in calls], dtype=float)
+
+    series = []
+    for day in np.unique(days):
+        day_mask = days == day
+        for phase in np.unique(phases[day_mask]):
+            mask = day_mask & (phases == phase)
+            series.append({
+                "day": str(day),
+                "phase": str(phase),
+                "cost": float(cost[mask].sum()),
+                "p95": float(np.percentile(latency[mask], 95)),
+            })
+    return series
@@ -0,0 +1,52 @@
+import os
+import time
+
+from blob_store import BlobStore
+
+
+def test_stores_sharing_a_directory_keep_their_own_spill_files(tmp_path):
+    first = BlobStore(tmp_path, spill_bytes=0)
+    second = BlobStore(tmp_path, spill_bytes=0)
+    digest = first.put("shared kit", owner="a")
+    assert second.put("shared kit", owner="b") == digest
+
+    second.release_owner("b")
+    assert second.evict_idle(force=True) == 1
+    assert first.get_text(digest) == "shared kit"
+
+    first.evict_idle(force=True)
+    assert second.spill_dir.is_dir()
+
+
+def test_spill_directories_of_gone_processes_are_removed(tmp_path):
+    store = BlobStore(tmp_path, spill_bytes=0, ttl_seconds=60)
+    abandoned = tmp_path / "12345-deadbeef" / "ab"
+    abandoned.mkdir(parents=True)
+    (abandoned / "ab00.z").write_bytes(b"x")
+    long_ago = time.time() - 3600
+    os.utime(abandoned.parent, (long_ago, long_ago))
+
+    store.put("kit", owner="a")
+    store.evict_idle(force=True)
+    assert not abandoned.parent.exists()
+    assert store.spill_dir.is_dir()
+
+
+def test_kept_artifact_outlives_the_idle_ttl_and_the_rest_does_not(tmp_path):
+    from blob_store import ArtifactMap
+
+    store = BlobStore(tmp_path, ttl_seconds=0, keep_ttl_seconds=3600)
+    artifacts = ArtifactMap(store, "session")
+    artifacts["execution_result"] = "kit"
+    artifacts["retry_context"] = "context"
+    artifacts.keep("execution_result")
+    time.sleep(0.01)
+
+    store.evict_idle(force=True)
+    assert artifacts.get("execution_result") == "kit"
+    assert artifacts.get("retry_context") is None
+
+    artifacts.clear()
+    time.sleep(0.01)
+    store.evict_idle(force=True)
+    assert store.snapshot()["blobs"] == 0
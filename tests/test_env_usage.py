@@ -0,0 +1,63 @@
+"""Regression tests for scan_env_usage (pipeline.py)."""
+
+from pipeline import scan_env_usage
+
+
+def _variables(files):
+    return {name: (v["required"], v["defaults"]) for name, v in scan_env_usage(files)["variables"].items()}
+
+
+def test_or_fallback_is_one_operand_and_later_accesses_are_found():
+    found = _variables({"app.py": (
+        'key = os.getenv("A") or os.getenv("B")\n'
+        'if os.getenv("C") or os.getenv("D"):\n'
+        '    pass\n'
+        'name = os.environ.get("E") or "guest"  # comment\n'
+    )})
+    assert found["A"] == (False, ['os.getenv("B")'])
+    assert found["B"] == (True, [])
+    assert found["C"] == (False, ['os.getenv("D")'])
+    assert found["D"] == (True, [])
+    assert found["E"] == (False, ["guest"])
+
+
+def test_js_fallback_to_another_variable():
+    found = _variables({"config.js": "const url = process.env.API_URL || process.env.FALLBACK_URL;\n"})
+    assert found["API_URL"] == (False, ["process.env.FALLBACK_URL"])
+    assert found["FALLBACK_URL"] == (True, [])
+
+
+def test_vite_builtins_are_ignored_only_on_import_meta_env():
+    found = _variables({
+        "main.ts": "const dev = import.meta.env.DEV;\nconst mode = import.meta.env.MODE;\n",
+        "server.js": "const env = process.env.NODE_ENV || 'development';\n",
+        "settings.py": 'MODE = os.environ.get("MODE")\nDEV = os.getenv("DEV", "0")\n',
+    })
+    assert found["MODE"] == (True, [])
+    assert found["DEV"] == (False, ["0"])
+    assert found["NODE_ENV"] == (False, ["development"])
+    assert "MODE" not in _variables({"main.ts": "const mode = import.meta.env.MODE;\n"})
+
+
+def test_empty_fallbacks_leave_the_variable_required():
+    found = _variables({
+        "app.py": 'SECRET = os.getenv("SECRET_KEY") or None\nTOKEN = os.getenv("TOKEN", "")\n'
+                  'NAME = os.environ.get("NAME", "") or "guest"\n',
+        "api.js": "const key = process.env.API_KEY ?? undefined;\nconst id = process.env.APP_ID || null;\n",
+    })
+    assert found["SECRET_KEY"] == (True, [])
+    assert found["TOKEN"] == (True, [])
+    assert found["NAME"] == (False, ["guest"])
+    assert found["API_KEY"] == (True, [])
+    assert found["APP_ID"] == (True, [])
+
+
+def test_second_argument_default_with_a_call_is_captured_whole():
+    found = _variables({"app.py": (
+        'PORT = int(os.getenv("PORT", str(8000)))\n'
+        'HOST = os.environ.get("HOST", default_host())\n'
+        'WORKERS = os.getenv("WORKERS", str(cpu_count() * 2))\n'
+    )})
+    assert found["PORT"] == (False, ["str(8000)"])
+    assert found["HOST"] == (False, ["default_host()"])
+    assert found["WORKERS"][0] is False
@@ -0,0 +1,50 @@
+from pipeline import extract_code_files_from_result, flagged_files, flagged_lines, replace_file_in_kit
+
+KIT = """# Deployment kit
+
+### File: README.md
+```markdown
+# Demo
+
+Run it:
+
+```bash
+python app.py
+```
+
+Done.
+```
+
+### File: app.py
+```python
+print("hello")
+```
+
+### File: webapp.py
+```python
+print("web")
+```
+"""
+
+
+def test_markdown_file_with_code_blocks_is_extracted_whole():
+    files = extract_code_files_from_result(KIT)
+    assert files["README.md"].endswith("Done.")
+    assert files["app.py"] == 'print("hello")'
+    assert list(files) == ["README.md", "app.py", "webapp.py"]
+
+
+def test_replacing_a_markdown_file_keeps_the_rest_of_the_kit():
+    patched = replace_file_in_kit(KIT, "README.md", "# Demo\n\nRun it:\n\n```bash\npython app.py --port 80\n```\n\nDone.")
+    files = extract_code_files_from_result(patched)
+    assert "--port 80" in files["README.md"]
+    assert files["app.py"] == 'print("hello")'
+    assert patched.replace("python app.py --port 80", "python app.py") == KIT
+
+
+def test_flagged_files_match_whole_paths_only():
+    files = extract_code_files_from_result(KIT)
+    assert flagged_files("webapp.py crashes on start", files) == ["webapp.py"]
+    assert flagged_files("see src/app.py", files) == []
+    assert flagged_files("Fix app.py.", files) == ["app.py"]
+    assert flagged_lines("webapp.py line 1 is wrong", "app.py", 'print("hello")') == []
@@ -0,0 +1,49 @@
+"""Regression tests for MongoConnection.run (mongo_connection.py)."""
+
+from pymongo.errors import AutoReconnect
+
+from mongo_connection import CLOSED, LocalMirror, MongoConnection
+
+
+def _connected(failure_threshold=2):
+    # A client that never connects; the test marks it up instead of probing
+    connection = MongoConnection("mongodb://localhost:1", failure_threshold=failure_threshold)
+    connection._probed = True
+    connection._connected.set()
+    return connection
+
+
+def test_write_queued_below_the_breaker_threshold_is_replayed_on_the_next_run(tmp_path):
+    connection = _connected()
+    mirror = LocalMirror(str(tmp_path / "mirror.json"))
+    remote = []
+    connection.on_connect("replay", lambda db: mirror.replay(lambda entry: remote.append(entry["document"])))
+
+    def failing_insert(db):
+        raise AutoReconnect("connection reset")
+
+    agent = {"id": "a1", "role": "Tester"}
+    connection.run(failing_insert, lambda: mirror.queue("insert", document=agent))
+    assert connection.breaker.state == CLOSED and connection.status() == "up"
+    assert mirror.pending() == 1
+
+    assert connection.run(lambda db: list(remote), lambda: None) == [agent]
+    assert mirror.pending() == 0
+
+
+def test_failed_replay_is_retried_on_a_later_run(tmp_path):
+    connection = _connected(failure_threshold=5)
+    calls = []
+
+    def replay(db):
+        calls.append(db)
+        if len(calls) == 1:
+            raise AutoReconnect("still flaky")
+
+    connection.on_connect("replay", replay)
+    connection.run(lambda db: (_ for _ in ()).throw(AutoReconnect("down")), lambda: None)
+    connection.run(lambda db: None, lambda: None)
+    connection.run(lambda db: None, lambda: None)
+    assert len(calls) == 2
+    connection.run(lambda db: None, lambda: None)
+    assert len(calls) == 2
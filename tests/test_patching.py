@@ -0,0 +1,47 @@
+from patching import apply_patch, parse_unified_diff
+
+SCHEMA = "CREATE TABLE users (\n    id INT,\n-- legacy column\n    name TEXT\n);\nSELECT 1;"
+
+SQL_DIFF = """```diff
+--- a/schema.sql
++++ b/schema.sql
+@@ -1,6 +1,6 @@
+ CREATE TABLE users (
+     id INT,
+--- legacy column
++++ current column
+     name TEXT
+ );
+-SELECT 1;
++SELECT 2;
+```"""
+
+
+def test_removed_and_added_lines_that_look_like_headers_stay_in_the_hunk():
+    patches = parse_unified_diff(SQL_DIFF.replace("++ current column", "-- current column"))
+    assert list(patches) == ["schema.sql"]
+    (hunk,) = patches["schema.sql"]
+    assert ("-", "-- legacy column") in hunk.lines
+    assert ("+", "-- current column") in hunk.lines
+    assert ("+", "SELECT 2;") in hunk.lines
+
+
+def test_added_line_starting_with_plus_plus_does_not_start_a_new_file():
+    patches = parse_unified_diff(SQL_DIFF)
+    assert list(patches) == ["schema.sql"]
+    assert ("+", "++ current column") in patches["schema.sql"][0].lines
+
+
+def test_sql_comment_removal_applies_the_whole_hunk():
+    diff = SQL_DIFF.replace("+++ current column\n", "").replace("@@ -1,6 +1,6 @@", "@@ -1,6 +1,5 @@")
+    result = apply_patch(SCHEMA, parse_unified_diff(diff)["schema.sql"])
+    assert result["rejected"] == []
+    assert result["text"] == "CREATE TABLE users (\n    id INT,\n    name TEXT\n);\nSELECT 2;"
+
+
+def test_headers_after_a_finished_hunk_start_the_next_file():
+    diff = ("--- a/a.py\n+++ b/a.py\n@@ -1 +1 @@\n-x = 1\n+x = 2\n"
+            "--- a/b.py\n+++ b/b.py\n@@ -1 +1 @@\n-y = 1\n+y = 2\n")
+    patches = parse_unified_diff(diff)
+    assert list(patches) == ["a.py", "b.py"]
+    assert patches["b.py"][0].lines == [("-", "y = 1"), ("+", "y = 2")]
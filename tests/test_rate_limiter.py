@@ -0,0 +1,64 @@
+from crewai import LLM
+
+from pipeline import rate_limited_llm
+from rate_limiter import LLMRateLimiter, is_rate_limit_error, limiter_scope
+
+
+class _Response:
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+class RateLimitError(Exception):
+    pass
+
+
+class APIStatusError(Exception):
+    def __init__(self, message, status_code):
+        super().__init__(message)
+        self.status_code = status_code
+        self.response = _Response(status_code, {"retry-after": "0.01"})
+
+
+def test_rate_limit_errors_are_matched_by_type_or_status_not_message():
+    assert is_rate_limit_error(RateLimitError("slow down"))
+    assert is_rate_limit_error(APIStatusError("Too Many Requests", 429))
+    assert not is_rate_limit_error(ValueError("order 429 not found"))
+    assert not is_rate_limit_error(APIStatusError("429 bytes received", 500))
+
+
+def test_rate_limit_error_found_in_cause_chain():
+    try:
+        try:
+            raise APIStatusError("Too Many Requests", 429)
+        except APIStatusError as e:
+            raise RuntimeError("LLM call failed") from e
+    except RuntimeError as wrapped:
+        assert is_rate_limit_error(wrapped)
+
+
+def test_scope_collects_waits_of_calls_inside_it():
+    limiter = LLMRateLimiter(requests_per_minute=600, tokens_per_minute=100_000, max_concurrency=2)
+    with limiter_scope() as scope:
+        limiter.call(lambda: "a", estimated_tokens=10)
+        limiter.call(lambda: "b", estimated_tokens=10)
+    assert scope.calls == 2
+    assert scope.queued >= 0.0
+
+
+def test_rate_limited_llm_retries_only_the_failing_call(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    llm = LLM(model="gpt-4o-mini", max_tokens=50)
+    attempts = []
+
+    def flaky(messages, *args, **kwargs):
+        attempts.append(messages)
+        if len(attempts) == 1:
+            raise APIStatusError("Too Many Requests", 429)
+        return "ok"
+
+    llm.call = flaky
+    rate_limited_llm(llm)
+    assert llm.call([{"role": "user", "content": "hello"}]) == "ok"
+    assert len(attempts) == 2
@@ -0,0 +1,40 @@
+import io
+import os
+import time
+import zipfile
+
+import repo_archive
+from reference_index import ReferenceIndex
+
+
+def _zip_bytes(files):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        for name, text in files.items():
+            archive.writestr(name, text)
+    buffer.seek(0)
+    return buffer
+
+
+def test_spooling_keeps_recently_used_uploads(tmp_path, monkeypatch):
+    monkeypatch.setenv("REPO_UPLOAD_DIR", str(tmp_path))
+    paths = [repo_archive.spool_upload(_zip_bytes({f"m{i}.py": f"def f{i}(): pass\n"})) for i in range(25)]
+    assert all(os.path.exists(path) for path in paths)
+
+
+def test_spooling_expires_uploads_unused_past_the_ttl(tmp_path, monkeypatch):
+    monkeypatch.setenv("REPO_UPLOAD_DIR", str(tmp_path))
+    monkeypatch.setenv("REPO_SPOOL_TTL_HOURS", "1")
+    old = repo_archive.spool_upload(_zip_bytes({"old.py": "x = 1\n"}))
+    two_hours_ago = time.time() - 7200
+    os.utime(old, (two_hours_ago, two_hours_ago))
+    repo_archive.spool_upload(_zip_bytes({"new.py": "y = 2\n"}))
+    assert not os.path.exists(old)
+
+
+def test_missing_archive_falls_back_to_its_overview(tmp_path):
+    files = [{"name": "repo.zip", "type": "Repository (ZIP)", "content": "# repo.zip\nsrc/app.py: def main",
+              "archive": str(tmp_path / "gone.zip"), "fingerprint": "abc"}]
+    index = ReferenceIndex(files)
+    chunks = index.select("main", 1000)
+    assert chunks and "def main" in chunks[0].text
@@ -0,0 +1,23 @@
+import llm_backend
+from llm_backend import FakeBackend
+from pipeline import run_project
+
+ROLES = ["Orchestrator Agent", "Backend Coder", "Solutions Architect", "Quality Assurance Validator",
+         "Code Supervisor", "Documentation Specialist"]
+
+
+def test_qa_failure_gets_a_surgical_retry_and_a_second_qa(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    monkeypatch.setattr(llm_backend, "_BACKEND",
+                        FakeBackend(placeholders=2, latency={"default": {"dist": "fixed", "value": 0}}))
+    agents = [{"id": f"a{i}", "role": role, "goal": role, "backstory": ""} for i, role in enumerate(ROLES)]
+    events = []
+
+    report = run_project({"idea": "A habit tracker", "package": "Package A"}, agents,
+                         on_event=lambda event, data: events.append((event, data.get("phase"))))
+
+    assert report["surgical_retries"] == 1
+    assert report["status"] == "ok"
+    assert events.count(("phase_done", "qa_validation")) == 2
+    assert "TODO" not in report["output"]
@@ -0,0 +1,316 @@
+"""
+Lightweight span tracing for the multi-phase build.
+
+Spans follow the OpenTelemetry shape (trace_id, span_id, parent_id, name,
+kind, start/end, status, attributes) without the SDK dependency. The
+current span lives in a contextvar, so nesting works across function calls
+and into worker threads started with `contextvars.copy_context().run(...)`.
+
+Finished spans are:
+- kept in memory per trace (last MAX_TRACES traces) for the UI waterfall;
+- written as one JSON object per line to a rotating file (TRACE_LOG,
+  default `logs/trace.jsonl`) by a background QueueListener, so the build
+  never blocks on disk I/O.
+
+This module has no Streamlit dependency so scripts can import it directly.
+"""
+
+import contextvars
+import functools
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional
+from uuid import uuid4
+
+logger = logging.getLogger(__name__)
+
+TRACE_LOG = os.getenv("TRACE_LOG", str(Path("logs") / "trace.jsonl"))
+TRACE_LOG_MAX_BYTES = 5 * 1024 * 1024
+TRACE_LOG_BACKUPS = 5
+MAX_TRACES = 50
+
+_current_span: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("current_span", default=None)
+
+_lock = threading.Lock()
+_traces: "OrderedDict[str, List[Dict[str, Any]]]" = OrderedDict()
+_open_spans: Dict[str, "Span"] = {}
+_logger: Optional[logging.Logger] = None
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def _get_logger() -> logging.Logger:
+    """Start the async JSONL writer on first use."""
+    global _logger, _listener
+    with _lock:
+        if _logger is None:
+            path = Path(TRACE_LOG)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            file_handler = logging.handlers.RotatingFileHandler(
+                path, maxBytes=TRACE_LOG_MAX_BYTES, backupCount=TRACE_LOG_BACKUPS, encoding="utf-8"
+            )
+            file_handler.setFormatter(logging.Formatter("%(message)s"))
+            span_queue: queue.Queue = queue.Queue(-1)
+            _listener = logging.handlers.QueueListener(span_queue, file_handler)
+            _listener.start()
+
+            span_logger = logging.getLogger("ai_factory.trace")
+            span_logger.setLevel(logging.INFO)
+            span_logger.propagate = False
+            span_logger.addHandler(logging.handlers.QueueHandler(span_queue))
+            _logger = span_logger
+        return _logger
+
+
+class Span:
+    """One timed operation. Use `span()` / `start_span()` rather than constructing directly."""
+
+    def __init__(self, name: str, kind: str, trace_id: str, parent_id: Optional[str],
+                 attributes: Dict[str, Any], start: Optional[float] = None):
+        self.name = name
+        self.kind = kind
+        self.trace_id = trace_id
+        self.span_id = uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.attributes = dict(attributes)
+        self.start = start if start is not None else time.time()
+        self.end_time: Optional[float] = None
+        self.status = "ok"
+        self._token: Optional[contextvars.Token] = None
+
+    def set(self, **attributes: Any) -> None:
+        self.attributes.update(attributes)
+
+    def end(self, status: str = "ok", error: Optional[str] = None, end: Optional[float] = None, **attributes: Any) -> None:
+        """Finish the span (idempotent) and hand it to the exporter."""
+        if self.end_time is not None:
+            return
+        self.end_time = end if end is not None else time.time()
+        self.status = status
+        if error:
+            self.attributes["error"] = error[:500]
+        self.attributes.update(attributes)
+        if self._token is not None:
+            try:
+                _current_span.reset(self._token)
+            except ValueError:
+                # Ended from a different context (e.g. after a rerun); just drop it as current
+                if _current_span.get() is self:
+                    _current_span.set(None)
+            self._token = None
+        with _lock:
+            _open_spans.pop(self.span_id, None)
+        _export(self.to_dict())
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "kind": self.kind,
+            "start": self.start,
+            "end": self.end_time,
+            "duration": (self.end_time - self.start) if self.end_time else None,
+            "status": self.status,
+            "attributes": self.attributes,
+        }
+
+
+def _export(record: Dict[str, Any]) -> None:
+    with _lock:
+        spans = _traces.setdefault(record["trace_id"], [])
+        spans.append(record)
+        _traces.move_to_end(record["trace_id"])
+        while len(_traces) > MAX_TRACES:
+            _traces.popitem(last=False)
+    try:
+        _get_logger().info(json.dumps(record, default=str))
+    except OSError as e:
+        logger.warning("Trace export failed: %s", e)
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+def start_span(name: str, kind: str = "internal", trace_id: Optional[str] = None,
+               root: bool = False, **attributes: Any) -> Span:
+    """
+    Start a span and make it current. The parent is the current span unless
+    `root` is set or `trace_id` names a different trace. Call `span.end()`.
+    """
+    parent = None if root else _current_span.get()
+    if parent is not None and trace_id and parent.trace_id != trace_id:
+        parent = None
+    new_span = Span(
+        name, kind,
+        trace_id=trace_id or (parent.trace_id if parent else uuid4().hex),
+        parent_id=parent.span_id if parent else None,
+        attributes=attributes,
+    )
+    new_span._token = _current_span.set(new_span)
+    with _lock:
+        _open_spans[new_span.span_id] = new_span
+    return new_span
+
+
+@contextmanager
+def span(name: str, kind: str = "internal", trace_id: Optional[str] = None, **attributes: Any) -> Iterator[Span]:
+    """Context-manager form of `start_span`; marks the span as error if the block raises."""
+    active = start_span(name, kind, trace_id=trace_id, **attributes)
+    try:
+        yield active
+    except Exception as e:
+        active.end(status="error", error=str(e))
+        raise
+    finally:
+        active.end()
+
+
+def traced(kind: str = "helper", name: Optional[str] = None) -> Callable:
+    """
+    Decorator that records a span for each call, but only inside an active
+    trace, so standalone/cached uses stay trace-free.
+    """
+    def decorator(fn: Callable) -> Callable:
+        span_name = name or fn.__name__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if _current_span.get() is None:
+                return fn(*args, **kwargs)
+            with span(span_name, kind):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def record_span(name: str, kind: str, start: float, end: float, parent: Optional[Span] = None,
+                status: str = "ok", **attributes: Any) -> None:
+    """Record an already-finished interval (e.g. queue wait measured elsewhere)."""
+    parent = parent or _current_span.get()
+    finished = Span(
+        name, kind,
+        trace_id=parent.trace_id if parent else uuid4().hex,
+        parent_id=parent.span_id if parent else None,
+        attributes=attributes, start=start,
+    )
+    finished.end(status=status, end=end)
+
+
+def _latest_open_span(trace_id: Optional[str]) -> Optional[Span]:
+    with _lock:
+        candidates = [s for s in _open_spans.values() if trace_id is None or s.trace_id == trace_id]
+    return max(candidates, key=lambda s: s.start) if candidates else None
+
+
+def step_recorder(trace_id: Optional[str] = None) -> Callable[[Any], None]:
+    """
+    Build a CrewAI `step_callback` that records one span per agent step,
+    from the previous step's end to now. Delegation / coworker questions are
+    recorded as kind "delegation". Parent is the current span or, when CrewAI
+    runs the step on its own thread, the newest open span of the trace.
+    """
+    last_step = {"at": time.time()}
+
+    def on_step(step_output: Any) -> None:
+        now = time.time()
+        parent = _current_span.get() or _latest_open_span(trace_id)
+        tool = str(getattr(step_output, "tool", "") or "")
+        is_delegation = "delegate" in tool.lower() or "coworker" in tool.lower()
+        attributes = {"tool": tool} if tool else {}
+        tool_input = getattr(step_output, "tool_input", None)
+        if is_delegation and tool_input:
+            attributes["input"] = str(tool_input)[:300]
+        name = f"step.{tool}" if tool else ("step.final_answer" if hasattr(step_output, "output") else "step")
+        started = max(last_step["at"], parent.start) if parent else last_step["at"]
+        record_span(name, "delegation" if is_delegation else "step", started, now, parent=parent, **attributes)
+        last_step["at"] = now
+
+    return on_step
+
+
+def get_trace(trace_id: str) -> List[Dict[str, Any]]:
+    """Finished spans of a trace, from memory or (for older traces) the JSONL files."""
+    with _lock:
+        spans = list(_traces.get(trace_id, []))
+    return spans or load_trace(trace_id)
+
+
+def load_trace(trace_id: str) -> List[Dict[str, Any]]:
+    """Read a trace back from the current and rotated JSONL files."""
+    spans: List[Dict[str, Any]] = []
+    base = Path(TRACE_LOG)
+    for path in [base] + [Path(f"{base}.{i}") for i in range(1, TRACE_LOG_BACKUPS + 1)]:
+        if not path.exists():
+            continue
+        with path.open(encoding="utf-8") as f:
+            for line in f:
+                if trace_id not in line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if record.get("trace_id") == trace_id:
+                    spans.append(record)
+    return sorted(spans, key=lambda s: s["start"])
+
+
+def critical_path(spans: List[Dict[str, Any]]) -> List[str]:
+    """
+    Span ids on the critical path: from each root, repeatedly follow the
+    child that finishes last (the one everything else was waiting on).
+    """
+    children: Dict[Optional[str], List[Dict[str, Any]]] = {}
+    known = {s["span_id"] for s in spans}
+    for s in spans:
+        parent = s["parent_id"] if s["parent_id"] in known else None
+        children.setdefault(parent, []).append(s)
+
+    path: List[str] = []
+    level = children.get(None, [])
+    while level:
+        last = max(level, key=lambda s: s["end"] or s["start"])
+        path.append(last["span_id"])
+        level = children.get(last["span_id"], [])
+    return path
+
+
+def waterfall_rows(spans: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Flatten a trace into chart rows: offsets in seconds from trace start, depth-indented labels."""
+    if not spans:
+        return []
+    by_id = {s["span_id"]: s for s in spans}
+    origin = min(s["start"] for s in spans)
+    on_path = set(critical_path(spans))
+
+    def depth(s: Dict[str, Any]) -> int:
+        level = 0
+        while s.get("parent_id") in by_id and level < 20:
+            s = by_id[s["parent_id"]]
+            level += 1
+        return level
+
+    rows = []
+    for index, s in enumerate(sorted(spans, key=lambda s: s["start"])):
+        end = s["end"] or s["start"]
+        rows.append({
+            "order": index,
+            "label": f"{index + 1:>3}. {'  ' * depth(s)}{s['name']}",
+            "kind": s["kind"],
+            "start": round(s["start"] - origin, 3),
+            "end": round(end - origin, 3),
+            "duration": round(end - s["start"], 3),
+            "status": s["status"],
+            "critical": s["span_id"] in on_path,
+        })
+    return rows
@@ -1,20 +1,31 @@
 """
 Quick script to update Backend and Frontend agent profiles with Surgical Fix Mode
 Run this to apply Manus's Improvement #2 immediately
+
+Goes through agent_profiles.py: MongoDB when MONGODB_URI is set, else the
+agents.json store; both profiles are written in one batch. Pass --dry-run to
+only print the diffs.
 """
 
-from pymongo import MongoClient
 import os
+import re
+import sys
 from dotenv import load_dotenv
 
+from agent_profiles import MongoProfileTarget, StoreProfileTarget, format_change, import_profiles
+
 # Load environment variables
 load_dotenv()
 
-# MongoDB connection
 MONGODB_URI = os.getenv("MONGODB_URI")
-client = MongoClient(MONGODB_URI)
-db = client["ai_factory"]
-agents_collection = db["agents"]
+if MONGODB_URI:
+    from pymongo import MongoClient
+    client = MongoClient(MONGODB_URI)
+    target = MongoProfileTarget(client["ai_factory"]["agents"])
+else:
+    from agent_store import JsonAgentStore
+    client = None
+    target = StoreProfileTarget(JsonAgentStore("agents.json"))
 
 # Backend Developer - New Surgical Fix Mode Profile
 backend_backstory = """You are an elite Senior Backend Developer with deep expertise in multiple frameworks and languages: Python (Flask, Django, FastAPI), Node.js (Express, Fastify, NestJS), and their ecosystems.
@@ -128,38 +139,32 @@ Your task description will contain "🔪 SURGICAL FIX MODE ACTIVATED" and "Origi
 **Your mantra in Surgical Fix Mode:** "Fix the line. Preserve the component. Output the whole file."
 """
 
-# Find and update Backend Developer
-print("🔍 Finding Backend Developer agent...")
-backend_agent = agents_collection.find_one({"role": {"$regex": "backend", "$options": "i"}})
-
-if backend_agent:
-    result = agents_collection.update_one(
-        {"_id": backend_agent["_id"]},
-        {"$set": {"backstory": backend_backstory}}
-    )
-    print(f"✅ Updated Backend Developer (ID: {backend_agent['_id']})")
-    print(f"   Role: {backend_agent['role']}")
-else:
-    print("❌ Backend Developer agent not found")
-
-# Find and update Frontend Developer
-print("\n🔍 Finding Frontend Developer agent...")
-frontend_agent = agents_collection.find_one({"role": {"$regex": "frontend", "$options": "i"}})
-
-if frontend_agent:
-    result = agents_collection.update_one(
-        {"_id": frontend_agent["_id"]},
-        {"$set": {"backstory": frontend_backstory}}
-    )
-    print(f"✅ Updated Frontend Developer (ID: {frontend_agent['_id']})")
-    print(f"   Role: {frontend_agent['role']}")
-else:
-    print("❌ Frontend Developer agent not found")
-
-print("\n🎉 Agent profiles updated with Surgical Fix Mode!")
-print("\n📝 Next Steps:")
-print("1. Restart your Streamlit app (if running)")
-print("2. Run a test build to see if agents now enter Surgical Fix Mode")
-print("3. Implement Manus's Improvements #1 and #3 in app.py")
-
-client.close()
+# Find the Backend and Frontend Developers, then update both in one batch
+agents = target.load()
+profiles = []
+for label, pattern, backstory in [("Backend Developer", "backend", backend_backstory),
+                                  ("Frontend Developer", "frontend", frontend_backstory)]:
+    print(f"🔍 Finding {label} agent...")
+    agent = next((a for a in agents if re.search(pattern, a.get("role", ""), re.IGNORECASE)), None)
+    if agent:
+        print(f"   Found (ID: {agent['id']}) Role: {agent['role']}")
+        profiles.append({"id": agent["id"], "backstory": backstory})
+    else:
+        print(f"❌ {label} agent not found")
+
+result = import_profiles(target, profiles, apply="--dry-run" not in sys.argv)
+for change in result["plan"]:
+    if change["op"] == "update":
+        print(f"\n✏️ {change['role']}\n{format_change(change)}")
+summary = result["summary"]
+print(f"\n{summary['update']} updated, {summary['unchanged']} already up to date ({target.name})")
+
+if result["applied"]:
+    print("\n🎉 Agent profiles updated with Surgical Fix Mode!")
+    print("\n📝 Next Steps:")
+    print("1. Restart your Streamlit app (if running)")
+    print("2. Run a test build to see if agents now enter Surgical Fix Mode")
+    print("3. Implement Manus's Improvements #1 and #3 in app.py")
+
+if client is not None:
+    client.close()